@@ -0,0 +1,91 @@
+"""
+Benchmark of the text cleaning step of ingestion
+Compares the three separate re.sub passes that were used before with the combined text_cleaner.clean_text on the
+raw page texts of the document folders in DOC_DIR, and reports the throughput in MB/s
+Execution from the root folder of the project: python -m benchmarks.benchmark_cleaning
+"""
+import os
+import re
+import time
+from typing import Callable, Dict, List, Tuple
+from loguru import logger
+# local imports
+import settings
+import utils as ut
+from ingest.file_parser import FileParser
+from ingest import text_cleaner
+
+
+def clean_three_passes(text: str) -> str:
+    """
+    The cleaning as it was done before: three separate re.sub passes with patterns given as strings
+    """
+    text = re.sub(r"(\w)-\n(\w)", r"\1\2", text)
+    text = re.sub(r"(?<!\n)\n(?!\n)", " ", text)
+
+    return re.sub(r"\n{2,}", "\n", text)
+
+
+def load_raw_pages(content_folder_path: str) -> List[Tuple[int, str]]:
+    """
+    Parses all relevant files in a folder and returns their raw page texts
+    """
+    file_parser = FileParser()
+    raw_pages = []
+    for file in ut.get_relevant_files_in_folder(content_folder_path):
+        try:
+            pages, _ = file_parser.parse_file(os.path.join(content_folder_path, file))
+            raw_pages.extend(pages)
+        except Exception as error:
+            logger.info(f"Skipping {file}: {error}")
+
+    return raw_pages
+
+
+def measure_throughput(raw_pages: List[Tuple[int, str]], clean_function: Callable[[str], str],
+                       repeats: int) -> Tuple[float, List[str]]:
+    """
+    Returns the cleaning throughput in MB/s (best of repeats) and the cleaned texts
+    """
+    size_mb = sum(len(text.encode("utf-8")) for _, text in raw_pages) / 1e6
+    best_duration = float("inf")
+    cleaned_texts = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        cleaned_texts = [clean_function(text) for _, text in raw_pages]
+        best_duration = min(best_duration, time.perf_counter() - start)
+
+    return size_mb / best_duration if best_duration > 0 else float("inf"), cleaned_texts
+
+
+def main(repeats: int = 5) -> Dict[str, Dict[str, float]]:
+    """
+    Runs the cleaning benchmark on every folder in DOC_DIR and prints the throughput per folder
+    """
+    results = {}
+    for folder_name in sorted(os.listdir(settings.DOC_DIR)):
+        content_folder_path = os.path.join(settings.DOC_DIR, folder_name)
+        if not os.path.isdir(content_folder_path):
+            continue
+        raw_pages = load_raw_pages(content_folder_path)
+        if len(raw_pages) == 0:
+            continue
+        size_mb = sum(len(text.encode("utf-8")) for _, text in raw_pages) / 1e6
+        old_throughput, old_texts = measure_throughput(raw_pages, clean_three_passes, repeats)
+        new_throughput, new_texts = measure_throughput(raw_pages, text_cleaner.clean_text, repeats)
+        if old_texts != new_texts:
+            raise AssertionError(f"combined cleaning gives a different result for folder {folder_name}")
+        results[folder_name] = {"size_mb": size_mb,
+                                "three_passes_mb_per_s": old_throughput,
+                                "combined_mb_per_s": new_throughput}
+    print(f"{'folder':<40}{'size (MB)':>12}{'3 passes (MB/s)':>18}{'combined (MB/s)':>16}{'speedup':>10}")
+    for folder_name, result in results.items():
+        print(f"{folder_name:<40}{result['size_mb']:>12.2f}{result['three_passes_mb_per_s']:>18.1f}"
+              f"{result['combined_mb_per_s']:>16.1f}"
+              f"{result['combined_mb_per_s'] / result['three_passes_mb_per_s']:>10.2f}")
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""
+Benchmark of ingestion throughput on synthetic corpora
+Generates a corpus of synthetic PDF, txt, html and docx files of configurable size and ingests it with
+Ingester.ingest, using a deterministic local fake embeddings provider instead of a networked one.
+Reports the time spent per stage (parse, clean, split, embed, store write), pages/sec, chunks/sec and peak RSS,
+and saves the results as JSON, so that results of different releases can be compared
+Execution from the root folder of the project, e.g.:
+python -m benchmarks.benchmark_ingest --files-per-type 5 --pages-per-file 20 --output benchmark_ingest.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import datetime as dt
+import functools
+import subprocess
+from collections import defaultdict
+from typing import Any, Callable, Dict, List
+import fitz
+from loguru import logger
+from langchain_core.embeddings import Embeddings
+from langchain_community.embeddings import DeterministicFakeEmbedding
+# local imports
+from ingest.ingester import Ingester
+from ingest.file_parser import FileParser
+from ingest.document_writer import DocumentWriter
+from ingest.document_catalog import DocumentCatalog
+import utils as ut
+
+FILE_TYPES = ["pdf", "txt", "html", "docx"]
+STAGES = ["parse", "clean", "split", "embed", "store write"]
+WORDS = ["energy", "transition", "policy", "climate", "agriculture", "nitrogen", "emission", "water", "soil",
+         "biodiversity", "municipality", "province", "infrastructure", "housing", "mobility", "aviation", "health",
+         "research", "analysis", "scenario", "model", "results", "measures", "government", "european", "national",
+         "regional", "development", "sustainable", "economic", "social", "impact", "assessment", "monitoring",
+         "the", "of", "and", "to", "in", "for", "with", "on", "by", "is", "are", "was", "this", "that", "an", "a"]
+
+
+class StageTimer:
+    """
+    Measures the exclusive time spent in functions per stage: when a timed function calls another timed function,
+    the time of the inner function only counts for the stage of the inner function
+    """
+    def __init__(self) -> None:
+        self.totals: Dict[str, float] = defaultdict(float)
+        # stack of [stage, start time of the current uninterrupted period]
+        self.stack: List[List[Any]] = []
+
+    def wrap(self, function: Callable, stage: str) -> Callable:
+        """
+        Returns a wrapper of function that adds the time spent in it to the given stage
+        """
+        @functools.wraps(function)
+        def timed_function(*args, **kwargs):
+            now = time.perf_counter()
+            if len(self.stack) > 0:
+                self.totals[self.stack[-1][0]] += now - self.stack[-1][1]
+            self.stack.append([stage, now])
+            try:
+                return function(*args, **kwargs)
+            finally:
+                now = time.perf_counter()
+                current_stage, start = self.stack.pop()
+                self.totals[current_stage] += now - start
+                if len(self.stack) > 0:
+                    self.stack[-1][1] = now
+
+        return timed_function
+
+
+class BenchmarkEmbeddings(Embeddings):
+    """
+    Deterministic local embeddings, with an optional simulated latency per request
+    """
+    def __init__(self, size: int, latency: float = 0.0) -> None:
+        self.embeddings = DeterministicFakeEmbedding(size=size)
+        self.latency = latency
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency)
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return self.embeddings.embed_query(text)
+
+
+def make_paragraphs(random_generator: random.Random, num_paragraphs: int, words_per_paragraph: int) -> List[str]:
+    """
+    Returns paragraphs of random words, with sentences and occasional hyphenated line breaks
+    """
+    paragraphs = []
+    for _ in range(num_paragraphs):
+        words = random_generator.choices(WORDS, k=words_per_paragraph)
+        text = ""
+        for i, word in enumerate(words):
+            if i % 12 == 0:
+                word = word.capitalize()
+            separator = " "
+            if i % 12 == 11:
+                separator = ". "
+            elif i % 9 == 8:
+                separator = "\n"
+            text += word + separator
+            if i % 40 == 39 and len(word) > 5:
+                # word split over two lines with a hyphen
+                text = text[:-len(word) - 1] + word[:3] + "-\n" + word[3:] + separator
+        paragraphs.append(text.strip() + ".")
+
+    return paragraphs
+
+
+def generate_corpus(folder: str, file_types: List[str], files_per_type: int, pages_per_file: int,
+                    seed: int = 42) -> int:
+    """
+    Writes a synthetic corpus to folder and returns the number of pages of the corpus
+    PDF files have pages_per_file pages, the other file types consist of a single page with the same amount of text
+    """
+    random_generator = random.Random(seed)
+    num_pages = 0
+    for file_type in file_types:
+        for file_num in range(files_per_type):
+            file_path = os.path.join(folder, f"synthetic_{file_type}_{file_num}.{file_type}")
+            pages = [make_paragraphs(random_generator, num_paragraphs=4, words_per_paragraph=80)
+                     for _ in range(pages_per_file)]
+            if file_type == "pdf":
+                doc = fitz.open()
+                for paragraphs in pages:
+                    page = doc.new_page()
+                    y = 50
+                    for paragraph in paragraphs:
+                        rect = fitz.Rect(50, y, page.rect.width - 50, y + 170)
+                        page.insert_textbox(rect, paragraph.replace("\n", " "), fontsize=9)
+                        y += 180
+                doc.set_metadata({"title": f"Synthetic document {file_num}", "author": "benchmark"})
+                doc.save(file_path)
+                num_pages += pages_per_file
+            else:
+                paragraphs = [paragraph for page_paragraphs in pages for paragraph in page_paragraphs]
+                if file_type == "txt":
+                    with open(file_path, "w", encoding="utf-8") as file:
+                        file.write("\n\n".join(paragraphs))
+                elif file_type == "html":
+                    body = "".join(f"<p>{paragraph}</p>\n" for paragraph in paragraphs)
+                    with open(file_path, "w", encoding="utf-8") as file:
+                        file.write(f"<html><head><title>Synthetic document {file_num}</title></head>"
+                                   f"<body>\n{body}</body></html>")
+                elif file_type == "docx":
+                    import docx
+                    document = docx.Document()
+                    for paragraph in paragraphs:
+                        document.add_paragraph(paragraph)
+                    document.save(file_path)
+                num_pages += 1
+
+    return num_pages
+
+
+def get_peak_rss_mb() -> Dict[str, float]:
+    """
+    Returns the peak resident set size in MB of this process and of its (finished) child processes
+    """
+    try:
+        import resource
+    except ImportError:
+        # not available on Windows
+        return {"self": None, "children": None}
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    unit = 1024 * 1024 if sys.platform == "darwin" else 1024
+
+    return {"self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit,
+            "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit}
+
+
+def get_git_commit() -> str:
+    """
+    Returns the current git commit hash, or an empty string if not available
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Generates the corpus, ingests it and returns the results
+    """
+    work_folder = tempfile.mkdtemp(prefix="benchmark_ingest_")
+    content_folder = os.path.join(work_folder, "corpus")
+    vecdb_folder = os.path.join(work_folder, "vector_store")
+    os.makedirs(content_folder)
+    file_types = args.types.split(",")
+    num_pages = generate_corpus(content_folder, file_types, args.files_per_type, args.pages_per_file)
+    corpus_size_mb = sum(os.path.getsize(os.path.join(content_folder, file))
+                         for file in os.listdir(content_folder)) / 1e6
+    logger.info(f"Generated {len(os.listdir(content_folder))} files with {num_pages} pages in {content_folder}")
+    ut.warm_up()
+
+    # instrument the stages, stages are only measured in this process
+    timer = StageTimer()
+    embeddings = BenchmarkEmbeddings(args.embedding_size, args.embedding_latency_ms / 1000)
+    instrumented = [(FileParser, "parse_file", "parse"),
+                    (FileParser, "iter_file", "parse"),
+                    (Ingester, "clean_texts", "clean"),
+                    (Ingester, "texts_to_docs", "split"),
+                    (BenchmarkEmbeddings, "embed_documents", "embed"),
+                    (DocumentWriter, "flush", "store write")]
+    originals = [(owner, name, getattr(owner, name)) for owner, name, _ in instrumented]
+    for owner, name, stage in instrumented:
+        setattr(owner, name, timer.wrap(getattr(owner, name), stage))
+    try:
+        ingester = Ingester(collection_name="benchmark",
+                            content_folder=content_folder,
+                            vecdb_folder=vecdb_folder,
+                            retriever_type=args.retriever_type,
+                            text_splitter_method=args.text_splitter_method,
+                            text_splitter_method_child=args.text_splitter_method,
+                            num_workers=args.workers,
+                            batch_size=args.batch_size,
+                            streaming=args.streaming,
+                            embeddings=embeddings,
+                            parse_cache=args.parse_cache)
+        start = time.perf_counter()
+        ingester.ingest()
+        total_time = time.perf_counter() - start
+    finally:
+        for owner, name, original in originals:
+            setattr(owner, name, original)
+
+    catalog = DocumentCatalog(vecdb_folder)
+    num_chunks = len(catalog.get_chunk_ids(catalog.get_files()))
+    catalog.connection.close()
+    stage_times = {stage: timer.totals.get(stage, 0.0) for stage in STAGES}
+    # with worker processes or streaming, parsing, cleaning and splitting are not (fully) measured as separate stages
+    stage_times["other"] = max(0.0, total_time - sum(stage_times.values()))
+    results = {
+        "timestamp": dt.datetime.now().isoformat(timespec="seconds"),
+        "git_commit": get_git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": vars(args),
+        "corpus": {"files": len(os.listdir(content_folder)), "pages": num_pages, "size_mb": corpus_size_mb},
+        "chunks": num_chunks,
+        "total_seconds": total_time,
+        "stage_seconds": stage_times,
+        "pages_per_second": num_pages / total_time,
+        "chunks_per_second": num_chunks / total_time,
+        "peak_rss_mb": get_peak_rss_mb(),
+    }
+    if not args.keep:
+        shutil.rmtree(work_folder, ignore_errors=True)
+
+    return results
+
+
+def print_results(results: Dict[str, Any]) -> None:
+    """
+    Prints a summary of the results
+    """
+    print(f"files: {results['corpus']['files']}, pages: {results['corpus']['pages']}, "
+          f"size: {results['corpus']['size_mb']:.1f} MB, chunks: {results['chunks']}")
+    print(f"{'stage':<14}{'seconds':>10}{'share':>8}")
+    for stage, seconds in results["stage_seconds"].items():
+        print(f"{stage:<14}{seconds:>10.2f}{seconds / results['total_seconds']:>8.0%}")
+    print(f"{'total':<14}{results['total_seconds']:>10.2f}")
+    print(f"pages/sec: {results['pages_per_second']:.1f}, chunks/sec: {results['chunks_per_second']:.1f}, "
+          f"peak RSS: {results['peak_rss_mb']['self']} MB")
+
+
+def main() -> None:
+    """
+    Parses the command line arguments, runs the benchmark and saves the results as JSON
+    """
+    parser = argparse.ArgumentParser(description="Ingest throughput benchmark on a synthetic corpus")
+    parser.add_argument("--types", default=",".join(FILE_TYPES),
+                        help=f"comma separated file types of the corpus, from {FILE_TYPES}")
+    parser.add_argument("--files-per-type", type=int, default=5)
+    parser.add_argument("--pages-per-file", type=int, default=20)
+    parser.add_argument("--retriever-type", default="vectorstore", choices=["vectorstore", "hybrid", "parent"])
+    parser.add_argument("--text-splitter-method", default="RecursiveCharacterTextSplitter",
+                        choices=["RecursiveCharacterTextSplitter", "NLTKTextSplitter"])
+    parser.add_argument("--workers", type=int, default=1, help="ingest worker processes")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--streaming", action="store_true")
+    parser.add_argument("--parse-cache", action="store_true",
+                        help="use the parse cache, parsing is then only measured when the corpus is not in the cache")
+    parser.add_argument("--embedding-size", type=int, default=1536)
+    parser.add_argument("--embedding-latency-ms", type=float, default=0.0,
+                        help="simulated latency per embeddings request")
+    parser.add_argument("--output", default="benchmark_ingest.json", help="path of the JSON results file")
+    parser.add_argument("--keep", action="store_true", help="keep the generated corpus and vector store")
+    args = parser.parse_args()
+    unknown_types = set(args.types.split(",")) - set(FILE_TYPES)
+    if len(unknown_types) > 0:
+        parser.error(f"unknown file types: {unknown_types}")
+
+    results = run_benchmark(args)
+    print_results(results)
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+    logger.info(f"Saved benchmark results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark of the quantized search of the numpy vector store
+Reports, for int8 and binary quantization and a range of re-score factors, the recall@k against exact search, the
+mean query time and the memory per vector that the first search pass reads, so that VECDB_QUANTIZATION and
+VECDB_RESCORE_FACTOR can be chosen for a collection.
+The vectors are either those of an existing numpy vector store, or synthetic clustered vectors. The queries are
+stored vectors with added noise, as real questions would need a (networked) embeddings provider
+Execution from the root folder of the project, e.g.:
+python -m benchmarks.benchmark_quantization --num-vectors 100000 --dim 1536
+python -m benchmarks.benchmark_quantization --vecdb-folder ./vector_stores/my_folder_text-embedding-ada-002 \
+    --collection my_folder
+"""
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from typing import Any, Dict, List
+import numpy as np
+from loguru import logger
+# local imports
+from ingest.numpy_vectorstore import NumpyVectorStore
+
+
+def generate_vectors(num_vectors: int, dim: int, num_clusters: int, seed: int) -> np.ndarray:
+    """
+    Returns clustered random vectors, real embeddings are not uniformly spread either
+    """
+    random_generator = np.random.default_rng(seed)
+    centers = random_generator.standard_normal((num_clusters, dim)).astype(np.float32)
+    labels = random_generator.integers(0, num_clusters, size=num_vectors)
+
+    return centers[labels] + random_generator.standard_normal((num_vectors, dim)).astype(np.float32)
+
+
+def measure(vector_store: NumpyVectorStore, queries: np.ndarray, k: int, quantization: str, rescore_factor: int,
+            exact_rows: List[np.ndarray] = None) -> Dict[str, Any]:
+    """
+    Runs all queries with the given quantization and returns the recall@k against the exact rows and the mean query
+    time
+    """
+    vector_store.quantization = quantization
+    vector_store.rescore_factor = rescore_factor
+    recalls, rows_per_query = [], []
+    start = time.perf_counter()
+    for query in queries:
+        rows, _ = vector_store._search(query, k)
+        rows_per_query.append(rows)
+    seconds = time.perf_counter() - start
+    if exact_rows is not None:
+        recalls = [len(np.intersect1d(rows, exact)) / len(exact) for rows, exact in zip(rows_per_query, exact_rows)]
+
+    return {"quantization": quantization,
+            "rescore_factor": rescore_factor if quantization != "none" else None,
+            f"recall@{k}": float(np.mean(recalls)) if len(recalls) > 0 else 1.0,
+            "ms_per_query": 1000 * seconds / len(queries),
+            "rows": rows_per_query}
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Searches the vectors exactly and with all quantization settings and returns the results
+    """
+    temporary_folder = None
+    if args.vecdb_folder is None:
+        temporary_folder = tempfile.mkdtemp(prefix="benchmark_quantization_")
+        vector_store = NumpyVectorStore("benchmark", None, temporary_folder, quantization="none")
+        vectors = generate_vectors(args.num_vectors, args.dim, args.clusters, args.seed)
+        for start in range(0, len(vectors), 10000):
+            batch_ids = [str(i) for i in range(start, min(start + 10000, len(vectors)))]
+            vector_store.add_vectors(vectors[start:start + 10000], batch_ids, None, batch_ids)
+        logger.info(f"Generated {len(vectors)} vectors of dimension {args.dim}")
+    else:
+        vector_store = NumpyVectorStore(args.collection, None, args.vecdb_folder, quantization="none")
+        vector_store._refresh()
+    try:
+        stored_vectors = vector_store.vectors
+        random_generator = np.random.default_rng(args.seed + 1)
+        query_rows = random_generator.choice(np.flatnonzero(vector_store.valid), size=args.num_queries, replace=False)
+        queries = np.asarray(stored_vectors[np.sort(query_rows)])
+        queries = queries + args.noise * random_generator.standard_normal(queries.shape).astype(np.float32) / \
+            np.sqrt(queries.shape[1])
+        exact = measure(vector_store, queries, args.k, "none", 1)
+        results = [exact]
+        for quantization in ["int8", "binary"]:
+            for rescore_factor in args.rescore_factors:
+                results.append(measure(vector_store, queries, args.k, quantization, rescore_factor, exact["rows"]))
+    finally:
+        vector_store.connection.close()
+        if temporary_folder is not None:
+            shutil.rmtree(temporary_folder, ignore_errors=True)
+    bytes_per_vector = {"none": 4 * stored_vectors.shape[1], "int8": stored_vectors.shape[1] + 4,
+                        "binary": (stored_vectors.shape[1] + 7) // 8}
+    for result in results:
+        result.pop("rows")
+        result["first_pass_bytes_per_vector"] = bytes_per_vector[result["quantization"]]
+
+    return {"num_vectors": int(np.count_nonzero(vector_store.valid)), "dim": int(stored_vectors.shape[1]),
+            "num_queries": args.num_queries, "k": args.k, "noise": args.noise, "results": results}
+
+
+def print_results(results: Dict[str, Any]) -> None:
+    """
+    Prints a table with the recall, query time and memory per setting
+    """
+    print(f"vectors: {results['num_vectors']}, dimension: {results['dim']}, queries: {results['num_queries']}")
+    print(f"{'quantization':<14}{'rescore':>8}{'recall@' + str(results['k']):>11}{'ms/query':>10}{'bytes/vec':>11}")
+    for result in results["results"]:
+        rescore_factor = "-" if result["rescore_factor"] is None else result["rescore_factor"]
+        print(f"{result['quantization']:<14}{rescore_factor:>8}{result['recall@' + str(results['k'])]:>11.3f}"
+              f"{result['ms_per_query']:>10.2f}{result['first_pass_bytes_per_vector']:>11}")
+
+
+def main() -> None:
+    """
+    Parses the command line arguments, runs the benchmark and saves the results as JSON
+    """
+    parser = argparse.ArgumentParser(description="Recall and speed of quantized search in the numpy vector store")
+    parser.add_argument("--vecdb-folder", default=None,
+                        help="folder of an existing numpy vector store, synthetic vectors are used if not given")
+    parser.add_argument("--collection", default=None, help="collection name of the existing vector store")
+    parser.add_argument("--num-vectors", type=int, default=100000, help="number of synthetic vectors")
+    parser.add_argument("--dim", type=int, default=1536, help="dimension of the synthetic vectors")
+    parser.add_argument("--clusters", type=int, default=1000, help="number of clusters of the synthetic vectors")
+    parser.add_argument("--num-queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=4, help="number of chunks to retrieve, as CHUNK_K")
+    parser.add_argument("--noise", type=float, default=1.0, help="relative noise added to the query vectors")
+    parser.add_argument("--rescore-factors", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_quantization.json", help="path of the JSON results file")
+    args = parser.parse_args()
+    if args.vecdb_folder is not None and args.collection is None:
+        parser.error("--collection is required with --vecdb-folder")
+
+    results = run_benchmark(args)
+    print_results(results)
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+    logger.info(f"Saved benchmark results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
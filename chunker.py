@@ -1,5 +1,4 @@
 import os
-import re
 from typing import Callable, List, Tuple
 from loguru import logger
 import langchain.text_splitter as splitter
@@ -8,27 +7,7 @@ import pandas as pd
 import settings
 import utils as ut
 from ingest.file_parser import FileParser
-
-
-def merge_hyphenated_words(text: str) -> str:
-    """
-    Merge words in the text that have been split with a hyphen.
-    """
-    return re.sub(r"(\w)-\n(\w)", r"\1\2", text)
-
-
-def fix_newlines(text: str) -> str:
-    """
-    Replace single newline characters in the text with spaces.
-    """
-    return re.sub(r"(?<!\n)\n(?!\n)", " ", text)
-
-
-def remove_multiple_newlines(text: str) -> str:
-    """
-    Reduce multiple newline characters in the text to a single newline.
-    """
-    return re.sub(r"\n{2,}", "\n", text)
+from ingest import text_cleaner
 
 
 def clean_text(pages: List[Tuple[int, str]], cleaning_functions: List[Callable[[str], str]]) -> List[Tuple[int, str]]:
@@ -45,11 +24,8 @@ def clean_text(pages: List[Tuple[int, str]], cleaning_functions: List[Callable[[
 
 
 def clean_pages(raw_pages: List[str]) -> List[Tuple[int, str]]:
-    cleaning_functions: List = [
-        merge_hyphenated_words,
-        fix_newlines,
-        remove_multiple_newlines
-    ]
+    # single pass equivalent of merge_hyphenated_words, fix_newlines and remove_multiple_newlines
+    cleaning_functions: List = [text_cleaner.clean_text]
     cleaned_pages = clean_text(raw_pages, cleaning_functions)
     return cleaned_pages
 
@@ -1,6 +1,22 @@
+"""
+Ingests documents from one folder (interactive) or from multiple folders (bulk) into persistent vector databases
+Interactive: python ingest.py
+Bulk: python ingest.py --folders "CAP_*" other_folder --workers 4
+      python ingest.py --all
+"""
+import os
+import sys
+import time
+import fnmatch
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
 from loguru import logger
+from langchain_core.embeddings import Embeddings
 # local imports
 from ingest.ingester import Ingester
+from ingest.embeddings_creator import EmbeddingsCreator
+import settings
 import utils as ut
 
 
@@ -20,6 +36,8 @@ def main():
                                                                      embeddings_model=embeddings_model)
     # create subfolder for storage of vector databases if not existing
     ut.create_vectordb_folder()
+    # load language detection and sentence tokenizer models once, before ingesting the files
+    ut.warm_up()
     # store documents in vector database if necessary
     ingester = Ingester(collection_name=content_folder_name,
                         content_folder=content_folder_path,
@@ -30,5 +48,102 @@ def main():
     logger.info(f"finished ingesting documents for folder {content_folder_name}")
 
 
+def select_folders(patterns: List[str]) -> List[str]:
+    """
+    Returns the names of the folders in DOC_DIR that match any of the given folder names or glob patterns
+    """
+    available_folders = sorted(folder for folder in os.listdir(settings.DOC_DIR)
+                               if os.path.isdir(os.path.join(settings.DOC_DIR, folder)))
+    selected_folders = []
+    for pattern in patterns:
+        matches = fnmatch.filter(available_folders, pattern)
+        if len(matches) == 0:
+            logger.warning(f"No folder in {settings.DOC_DIR} matches {pattern}")
+        selected_folders.extend(folder for folder in matches if folder not in selected_folders)
+
+    return selected_folders
+
+
+def ingest_folder(content_folder_name: str, embeddings: Embeddings, embeddings_provider: str,
+                  embeddings_model: str, num_workers: int) -> Dict[str, Any]:
+    """
+    Ingests one folder with the shared embeddings object and returns the statistics of the ingest run
+    """
+    start = time.perf_counter()
+    content_folder_path, vecdb_folder_path = ut.create_vectordb_name(content_folder_name=content_folder_name,
+                                                                     embeddings_model=embeddings_model)
+    try:
+        ingester = Ingester(collection_name=content_folder_name,
+                            content_folder=content_folder_path,
+                            vecdb_folder=vecdb_folder_path,
+                            embeddings_provider=embeddings_provider,
+                            embeddings_model=embeddings_model,
+                            num_workers=num_workers,
+                            embeddings=embeddings)
+        stats = ingester.ingest()
+        stats["status"] = "ok"
+    except Exception as error:
+        logger.exception(f"Ingesting folder {content_folder_name} failed")
+        stats = {"status": f"failed: {type(error).__name__}"}
+    stats["folder"] = content_folder_name
+    stats["seconds"] = time.perf_counter() - start
+    logger.info(f"finished ingesting documents for folder {content_folder_name}")
+
+    return stats
+
+
+def print_summary(results: List[Dict[str, Any]]) -> None:
+    """
+    Prints a table with the duration and the number of files and chunks per folder
+    """
+    print(f"{'folder':<40}{'status':<24}{'seconds':>9}{'added':>7}{'modified':>10}{'deleted':>9}{'chunks':>9}")
+    for result in results:
+        print(f"{result['folder'][:39]:<40}{result['status'][:23]:<24}{result['seconds']:>9.1f}"
+              f"{result.get('files_added', '-'):>7}{result.get('files_modified', '-'):>10}"
+              f"{result.get('files_deleted', '-'):>9}{result.get('chunks_written', '-'):>9}")
+    print(f"{len(results)} folders, {sum(result['status'] != 'ok' for result in results)} failed, "
+          f"{sum(result.get('chunks_written', 0) for result in results)} chunks written")
+
+
+def bulk_main(args: argparse.Namespace) -> int:
+    """
+    Ingests multiple folders non-interactively. The models are loaded once and the embeddings object is shared by
+    all folders, the folders are scheduled over a pool of threads
+
+    Returns
+    -------
+    int
+        exit code, 1 if any folder failed
+    """
+    folders = select_folders(["*"] if args.all else args.folders)
+    if len(folders) == 0:
+        logger.error("No folders to ingest")
+        return 1
+    _, _, embeddings_provider, embeddings_model = ut.get_relevant_models(args.confidential)
+    ut.create_vectordb_folder()
+    ut.warm_up()
+    embeddings = EmbeddingsCreator(embeddings_provider, embeddings_model).get_embeddings()
+    # processes should not be forked from multiple threads, so with multiple folder threads, each folder is
+    # ingested in its own thread without a process pool
+    num_workers = 1 if args.workers > 1 else None
+    logger.info(f"Ingesting {len(folders)} folders with {args.workers} threads")
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        results = list(executor.map(lambda folder: ingest_folder(folder, embeddings, embeddings_provider,
+                                                                 embeddings_model, num_workers), folders))
+    print_summary(results)
+
+    return 1 if any(result["status"] != "ok" for result in results) else 0
+
+
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) == 1:
+        main()
+    else:
+        parser = argparse.ArgumentParser(description="Ingest multiple document folders from DOC_DIR")
+        folder_group = parser.add_mutually_exclusive_group(required=True)
+        folder_group.add_argument("--folders", nargs="+", help="folder names or glob patterns, e.g. \"CAP_*\"")
+        folder_group.add_argument("--all", action="store_true", help="ingest all folders in DOC_DIR")
+        parser.add_argument("--confidential", action="store_true",
+                            help="use the private models, for folders with confidential documents")
+        parser.add_argument("--workers", type=int, default=1, help="number of folders that are ingested concurrently")
+        sys.exit(bulk_main(parser.parse_args()))
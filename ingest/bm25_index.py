@@ -0,0 +1,301 @@
+"""
+BM25Index class
+Persistent inverted index (postings and document frequencies) of the chunks in a vector store, stored next to the
+vector store, for the keyword search of the hybrid retriever
+"""
+import os
+import re
+import json
+import math
+import sqlite3
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from loguru import logger
+from langchain_core.documents import Document
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# file name of the index in the vector store folder
+INDEX_NAME = "bm25_index.sqlite"
+# maximum number of variables in one SQLite query
+SQLITE_BATCH_SIZE = 10000
+
+# process-wide registry of BM25 indexes, keyed by vector store folder, so that an index is loaded once per process
+_BM25_INDEXES: Dict[str, "BM25Index"] = {}
+_BM25_INDEXES_LOCK = threading.Lock()
+
+
+def get_bm25_index(vecdb_folder: str) -> "BM25Index":
+    """
+    Returns the BM25 index of a vector store folder, the index is opened once per process
+    """
+    with _BM25_INDEXES_LOCK:
+        if vecdb_folder not in _BM25_INDEXES:
+            _BM25_INDEXES[vecdb_folder] = BM25Index(vecdb_folder)
+
+        return _BM25_INDEXES[vecdb_folder]
+
+
+def has_bm25_index(vecdb_folder: str) -> bool:
+    """
+    Returns True if the vector store folder has a BM25 index, without creating one
+    """
+    return os.path.exists(os.path.join(vecdb_folder, INDEX_NAME))
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Returns the lowercase words of a text
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def get_filenames_from_filter(search_filter: Optional[Dict[str, Any]]) -> Optional[List[str]]:
+    """
+    Returns the filenames of a search filter of the form {"filename": name} or {"filename": {"$in": [names]}},
+    or None if there is no filter. The filename filter may be widened with stored chunk ids, see
+    get_chunk_ids_from_filter
+    """
+    if search_filter is None:
+        return None
+    if set(search_filter.keys()) == {"$or"} and len(search_filter["$or"]) == 2:
+        search_filter = search_filter["$or"][0]
+    if set(search_filter.keys()) != {"filename"}:
+        raise ValueError(f"The BM25 index only supports filters on filename, not {search_filter}")
+    condition = search_filter["filename"]
+    if isinstance(condition, dict):
+        if set(condition.keys()) == {"$in"}:
+            return list(condition["$in"])
+        if set(condition.keys()) == {"$eq"}:
+            return [condition["$eq"]]
+        raise ValueError(f"The BM25 index only supports filters on filename with $eq or $in, not {search_filter}")
+
+    return [condition]
+
+
+def get_chunk_ids_from_filter(search_filter: Optional[Dict[str, Any]]) -> Optional[List[str]]:
+    """
+    Returns the chunk ids of a filename filter that is widened with the stored chunks of near-duplicates, of the form
+    {"$or": [filename filter, {"chunk_id": {"$in": [ids]}}]}, or None if the filter is not widened
+    """
+    if search_filter is None or set(search_filter.keys()) != {"$or"} or len(search_filter["$or"]) != 2:
+        return None
+    condition = search_filter["$or"][1]
+    if set(condition.keys()) != {"chunk_id"} or set(condition["chunk_id"].keys()) != {"$in"}:
+        raise ValueError(f"The BM25 index only supports filters on filename and chunk_id, not {search_filter}")
+
+    return list(condition["chunk_id"]["$in"])
+
+
+class BM25Index:
+    """
+    Inverted index with Okapi BM25 scoring. The postings (term frequency per chunk) are stored per term, so a query
+    only reads the postings of its terms. The chunk lengths and filenames are loaded once (per change of the index)
+    and the postings of a term are cached after first use, so a query takes milliseconds whatever the corpus size.
+    Filename filters are applied as a mask on the chunks of the given files.
+    The index is kept up to date by the Ingester, next to the vector store
+    """
+    def __init__(self, vecdb_folder: str, index_name: str = INDEX_NAME, k1: float = 1.5,
+                 b: float = 0.75) -> None:
+        os.makedirs(vecdb_folder, exist_ok=True)
+        self.index_path = os.path.join(vecdb_folder, index_name)
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.index_path, timeout=60, check_same_thread=False)
+        with self.lock:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS chunks (doc_row INTEGER PRIMARY KEY, "
+                                    "chunk_id TEXT UNIQUE NOT NULL, filename TEXT, length INTEGER, document TEXT, "
+                                    "metadata TEXT)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_chunks_filename ON chunks (filename)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS terms (term_id INTEGER PRIMARY KEY, term TEXT UNIQUE)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS postings (term_id INTEGER, doc_row INTEGER, "
+                                    "tf INTEGER, PRIMARY KEY (term_id, doc_row)) WITHOUT ROWID")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_postings_doc_row ON postings (doc_row)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)")
+            self.connection.commit()
+        # state of the index that the loaded arrays belong to
+        self.data_version = None
+        self.lengths = np.zeros(0, dtype=np.float32)
+        self.file_codes = np.zeros(0, dtype=np.int32)
+        self.file_code_of: Dict[str, int] = {}
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def is_initialized(self) -> bool:
+        """
+        Returns True if the index reflects the contents of the vector store
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM info WHERE key = 'initialized'").fetchone()
+
+        return row is not None
+
+    def initialize(self, collection: Dict[str, List[Any]] = None) -> None:
+        """
+        Fills the index from the chunks of a vector store collection and marks it as initialized
+        Only needed once, for vector stores that were created before the index existed
+
+        Parameters
+        ----------
+        collection : Dict[str, List[Any]], optional
+            result of vector_store.get(), with keys 'ids', 'documents' and 'metadatas'. None for a new, empty vector
+            store
+        """
+        if collection is not None:
+            logger.info("Building BM25 index from the vector store")
+            documents = [Document(page_content=text, metadata=metadata)
+                         for text, metadata in zip(collection['documents'], collection['metadatas'])]
+            self.add_documents(documents, collection['ids'])
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO info (key, value) VALUES ('initialized', '1')")
+            self.connection.commit()
+
+    def add_documents(self, documents: List[Document], ids: List[str]) -> None:
+        """
+        Adds chunks to the index
+
+        Parameters
+        ----------
+        documents : List[Document]
+            the chunks, with metadata 'filename'
+        ids : List[str]
+            the ids of the chunks in the vector store
+        """
+        term_counts = [Counter(tokenize(document.page_content)) for document in documents]
+        with self.lock:
+            # chunks that are added again replace the indexed chunk
+            for start in range(0, len(ids), SQLITE_BATCH_SIZE):
+                batch = list(ids[start:start + SQLITE_BATCH_SIZE])
+                self.connection.execute(f"DELETE FROM postings WHERE doc_row IN (SELECT doc_row FROM chunks "
+                                        f"WHERE chunk_id IN ({','.join('?' * len(batch))}))", batch)
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO chunks (chunk_id, filename, length, document, metadata) VALUES (?, ?, ?, ?, ?)",
+                [(chunk_id, document.metadata.get('filename'), sum(counts.values()), document.page_content,
+                  json.dumps(document.metadata))
+                 for chunk_id, document, counts in zip(ids, documents, term_counts)])
+            doc_rows = self._select_column("SELECT chunk_id, doc_row FROM chunks WHERE chunk_id IN ({})", ids)
+            terms = list({term for counts in term_counts for term in counts})
+            self.connection.executemany("INSERT OR IGNORE INTO terms (term) VALUES (?)", [(term,) for term in terms])
+            term_ids = self._select_column("SELECT term, term_id FROM terms WHERE term IN ({})", terms)
+            self.connection.executemany("INSERT OR REPLACE INTO postings (term_id, doc_row, tf) VALUES (?, ?, ?)",
+                                        [(term_ids[term], doc_rows[chunk_id], tf)
+                                         for chunk_id, counts in zip(ids, term_counts)
+                                         for term, tf in counts.items()])
+            self.connection.commit()
+            self.data_version = None
+
+    def _select_column(self, query: str, keys: List[str]) -> Dict[str, Any]:
+        """
+        returns the key-value pairs of a query with an IN clause on the keys, in batches of keys
+        """
+        result = {}
+        for start in range(0, len(keys), SQLITE_BATCH_SIZE):
+            batch = keys[start:start + SQLITE_BATCH_SIZE]
+            result.update(self.connection.execute(query.format(",".join("?" * len(batch))), batch).fetchall())
+
+        return result
+
+    def remove_files(self, filenames: List[str]) -> None:
+        """
+        Removes the chunks of the given files from the index
+        """
+        with self.lock:
+            for filename in filenames:
+                self.connection.execute("DELETE FROM postings WHERE doc_row IN "
+                                        "(SELECT doc_row FROM chunks WHERE filename = ?)", (filename,))
+                self.connection.execute("DELETE FROM chunks WHERE filename = ?", (filename,))
+            self.connection.commit()
+            self.data_version = None
+
+    def _refresh(self) -> None:
+        """
+        (re)loads the chunk lengths and filenames if the index has changed since they were loaded
+        """
+        with self.lock:
+            data_version = self.connection.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self.data_version:
+                return
+            rows = self.connection.execute("SELECT doc_row, length, filename FROM chunks").fetchall()
+            num_rows = max((row[0] for row in rows), default=-1) + 1
+            self.lengths = np.zeros(num_rows, dtype=np.float32)
+            self.file_codes = np.full(num_rows, -1, dtype=np.int32)
+            self.file_code_of = {}
+            for doc_row, length, filename in rows:
+                self.lengths[doc_row] = length
+                self.file_codes[doc_row] = self.file_code_of.setdefault(filename, len(self.file_code_of))
+            self.postings = {}
+            self.data_version = data_version
+
+    def _get_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        returns the rows of the chunks that contain a term and the term frequencies, cached per term
+        """
+        with self.lock:
+            if term not in self.postings:
+                rows = self.connection.execute("SELECT postings.doc_row, postings.tf FROM postings JOIN terms "
+                                               "ON postings.term_id = terms.term_id WHERE terms.term = ?",
+                                               (term,)).fetchall()
+                self.postings[term] = (np.array([row[0] for row in rows], dtype=np.int64),
+                                       np.array([row[1] for row in rows], dtype=np.float32))
+
+            return self.postings[term]
+
+    def search(self, query: str, k: int, filenames: Optional[List[str]] = None,
+               chunk_ids: Optional[List[str]] = None) -> List[Tuple[Document, float]]:
+        """
+        Returns the k chunks with the highest BM25 score for the query, with their score. Chunks without any of the
+        query terms are not returned
+
+        Parameters
+        ----------
+        query : str
+            the query
+        k : int
+            maximum number of chunks to return
+        filenames : Optional[List[str]]
+            if given, only chunks of these files are returned
+        chunk_ids : Optional[List[str]]
+            if given with filenames, the chunks with these ids are returned as well
+
+        Returns
+        -------
+        List[Tuple[Document, float]]
+            the chunks and their BM25 scores, highest score first
+        """
+        self._refresh()
+        lengths, file_codes, file_code_of = self.lengths, self.file_codes, self.file_code_of
+        valid = lengths > 0
+        num_chunks = int(np.count_nonzero(valid))
+        if num_chunks == 0:
+            return []
+        average_length = float(lengths[valid].mean())
+        scores = np.zeros(len(lengths), dtype=np.float32)
+        for term in set(tokenize(query)):
+            rows, term_frequencies = self._get_postings(term)
+            if len(rows) == 0:
+                continue
+            # the Lucene variant of the inverse document frequency, which is never negative
+            idf = math.log(1 + (num_chunks - len(rows) + 0.5) / (len(rows) + 0.5))
+            scores[rows] += idf * term_frequencies * (self.k1 + 1) / \
+                (term_frequencies + self.k1 * (1 - self.b + self.b * lengths[rows] / average_length))
+        scores[~valid] = 0
+        if filenames is not None:
+            allowed = np.isin(file_codes, [file_code_of[name] for name in filenames if name in file_code_of])
+            if chunk_ids:
+                with self.lock:
+                    doc_rows = self._select_column("SELECT chunk_id, doc_row FROM chunks WHERE chunk_id IN ({})",
+                                                   chunk_ids)
+                allowed[[row for row in doc_rows.values() if row < len(allowed)]] = True
+            scores[~allowed] = 0
+        candidate_rows = np.flatnonzero(scores > 0)
+        if len(candidate_rows) > k:
+            candidate_rows = candidate_rows[np.argpartition(-scores[candidate_rows], k - 1)[:k]]
+        top_rows = candidate_rows[np.argsort(-scores[candidate_rows], kind="stable")].tolist()
+        with self.lock:
+            chunks = {row[0]: row[1:] for row in self.connection.execute(
+                f"SELECT doc_row, document, metadata FROM chunks WHERE doc_row IN ({','.join('?' * len(top_rows))})",
+                top_rows).fetchall()}
+
+        return [(Document(page_content=chunks[row][0], metadata=json.loads(chunks[row][1])), float(scores[row]))
+                for row in top_rows if row in chunks]
@@ -0,0 +1,250 @@
+"""
+ChunkDeduplicator class
+Detects near-duplicate chunks with MinHash signatures, so that a duplicate chunk is stored only once in the
+vector store. The signatures and the sources of the duplicates are stored next to the vector store
+"""
+import os
+import re
+import zlib
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from loguru import logger
+import langchain.docstore.document as docstore
+# local imports
+from ingest.bm25_index import get_filenames_from_filter
+
+# number of hash functions of a MinHash signature
+NUM_PERMUTATIONS = 128
+# number of consecutive words of a shingle
+SHINGLE_SIZE = 5
+# the hash functions (a * x + b) mod p, fixed so that signatures are comparable between runs
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_random_generator = np.random.default_rng(seed=1)
+PERMUTATION_A = _random_generator.integers(1, MERSENNE_PRIME, size=NUM_PERMUTATIONS, dtype=np.uint64)
+PERMUTATION_B = _random_generator.integers(0, MERSENNE_PRIME, size=NUM_PERMUTATIONS, dtype=np.uint64)
+WORD_PATTERN = re.compile(r"\w+")
+# file name of the index in the vector store folder
+INDEX_NAME = "dedup_index.sqlite"
+
+
+def get_minhash_signature(text: str) -> np.ndarray:
+    """
+    Returns the MinHash signature of the set of word shingles of a text
+    The fraction of equal values in the signatures of two texts estimates the Jaccard similarity of their shingles
+    """
+    words = WORD_PATTERN.findall(text.lower())
+    shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(max(1, len(words) - SHINGLE_SIZE + 1))}
+    hashes = np.array([zlib.crc32(shingle.encode("utf-8")) for shingle in shingles], dtype=np.uint64)
+    # a * hash wraps around at 2^64, which keeps the hash functions well mixed
+    permuted = (np.outer(hashes, PERMUTATION_A) + PERMUTATION_B) % MERSENNE_PRIME
+
+    return permuted.min(axis=0)
+
+
+def get_lsh_bands(threshold: float) -> Tuple[int, int]:
+    """
+    Returns the number of bands and rows per band for locality sensitive hashing of the signatures, such that
+    chunks with a similarity of at least threshold are almost certainly compared. The band with the most rows is
+    chosen for which the similarity at which chunks become candidates, (1 / bands) ^ (1 / rows), is well below the
+    threshold
+    """
+    rows = 1
+    for candidate_rows in [2, 4, 8, 16, 32]:
+        if (candidate_rows / NUM_PERMUTATIONS) ** (1 / candidate_rows) <= threshold - 0.1:
+            rows = candidate_rows
+
+    return NUM_PERMUTATIONS // rows, rows
+
+
+def has_dedup_index(vecdb_folder: str) -> bool:
+    """
+    Returns True if the vector store folder has an index of near-duplicate chunks, without creating one
+    """
+    return os.path.exists(os.path.join(vecdb_folder, INDEX_NAME))
+
+
+class ChunkDeduplicator:
+    """
+    Removes chunks that are near-duplicates of chunks that are already stored in the vector store (or earlier in the
+    same batch). Two chunks are near-duplicates when the estimated Jaccard similarity of their word shingles is at
+    least the threshold. Candidate chunks are found with locality sensitive hashing of the MinHash signatures.
+    For each removed chunk, its source (filename, page number and source) is recorded with the id of the stored chunk,
+    so that retrieved chunks can point back to all their sources and a selection of files finds the stored chunks
+    of their near-duplicates
+    """
+    def __init__(self, vecdb_folder: str, threshold: float = 0.9, index_name: str = INDEX_NAME) -> None:
+        os.makedirs(vecdb_folder, exist_ok=True)
+        self.index_path = os.path.join(vecdb_folder, index_name)
+        self.threshold = threshold
+        self.num_bands, self.rows_per_band = get_lsh_bands(threshold)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.index_path, timeout=60, check_same_thread=False)
+        with self.lock:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS signatures "
+                                    "(chunk_id TEXT PRIMARY KEY, filename TEXT NOT NULL, signature BLOB NOT NULL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_signatures_filename ON signatures (filename)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS bands "
+                                    "(rows_per_band INTEGER, band INTEGER, key BLOB, chunk_id TEXT)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_bands_key ON bands (rows_per_band, band, key)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_bands_chunk_id ON bands (chunk_id)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS duplicates "
+                                    "(filename TEXT, page_number INTEGER, source TEXT, chunk_id TEXT)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_duplicates_chunk_id ON duplicates (chunk_id)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_duplicates_filename ON duplicates (filename)")
+            self.connection.commit()
+
+    def get_band_keys(self, signature: np.ndarray) -> List[Tuple[int, int, bytes]]:
+        """
+        returns the (rows per band, band number, band key) of each band of a signature
+        """
+        return [(self.rows_per_band, band,
+                 signature[band * self.rows_per_band:(band + 1) * self.rows_per_band].tobytes())
+                for band in range(self.num_bands)]
+
+    def find_duplicate(self, signature: np.ndarray) -> str | None:
+        """
+        returns the id of a stored chunk that is a near-duplicate of the chunk with the given signature, if any
+        """
+        band_keys = self.get_band_keys(signature)
+        placeholders = ",".join(["(?, ?, ?)"] * len(band_keys))
+        candidate_ids = [row[0] for row in self.connection.execute(
+            f"SELECT DISTINCT chunk_id FROM bands WHERE (rows_per_band, band, key) IN (VALUES {placeholders})",
+            [value for band_key in band_keys for value in band_key]).fetchall()]
+        if len(candidate_ids) == 0:
+            return None
+        placeholders = ",".join("?" * len(candidate_ids))
+        best_chunk_id, best_similarity = None, 0.0
+        for chunk_id, candidate_signature in self.connection.execute(
+                f"SELECT chunk_id, signature FROM signatures WHERE chunk_id IN ({placeholders})",
+                candidate_ids).fetchall():
+            similarity = float(np.mean(np.frombuffer(candidate_signature, dtype=np.uint64) == signature))
+            if similarity >= self.threshold and similarity > best_similarity:
+                best_chunk_id, best_similarity = chunk_id, similarity
+
+        return best_chunk_id
+
+    def filter(self, documents: List[docstore.Document],
+               ids: List[str]) -> Tuple[List[docstore.Document], List[str]]:
+        """
+        Removes the near-duplicates from a batch of chunks that are about to be added to the vector store, records the
+        sources of the removed chunks and registers the signatures of the remaining chunks
+
+        Parameters
+        ----------
+        documents : List[docstore.Document]
+            the chunks to add to the vector store
+        ids : List[str]
+            the ids of the chunks
+
+        Returns
+        -------
+        Tuple[List[docstore.Document], List[str]]
+            the chunks that are not a near-duplicate and their ids
+        """
+        kept_documents, kept_ids, duplicates = [], [], []
+        with self.lock:
+            for document, chunk_id in zip(documents, ids):
+                signature = get_minhash_signature(document.page_content)
+                duplicate_of = self.find_duplicate(signature)
+                if duplicate_of is not None:
+                    duplicates.append((document.metadata['filename'], document.metadata.get('page_number'),
+                                       document.metadata.get('source'), duplicate_of))
+                    continue
+                kept_documents.append(document)
+                kept_ids.append(chunk_id)
+                self.connection.execute("INSERT OR REPLACE INTO signatures (chunk_id, filename, signature) "
+                                        "VALUES (?, ?, ?)",
+                                        (chunk_id, document.metadata['filename'], signature.tobytes()))
+                self.connection.executemany("INSERT INTO bands (rows_per_band, band, key, chunk_id) "
+                                            "VALUES (?, ?, ?, ?)",
+                                            [(*band_key, chunk_id) for band_key in self.get_band_keys(signature)])
+            self.connection.executemany("INSERT INTO duplicates (filename, page_number, source, chunk_id) "
+                                        "VALUES (?, ?, ?, ?)", duplicates)
+            self.connection.commit()
+        if len(duplicates) > 0:
+            logger.info(f"Removed {len(duplicates)} near-duplicate chunks from batch of {len(documents)} chunks")
+
+        return kept_documents, kept_ids
+
+    def get_dependent_files(self, filenames: List[str]) -> List[str]:
+        """
+        Returns the other files that have duplicates of chunks of the given files, directly or through other
+        dependent files. When the given files are removed from the vector store, these files need to be ingested
+        again, as their duplicate chunks are not in the vector store themselves
+        """
+        dependent_files: List[str] = []
+        to_check = list(filenames)
+        checked = set(filenames)
+        with self.lock:
+            while len(to_check) > 0:
+                filename = to_check.pop()
+                rows = self.connection.execute(
+                    "SELECT DISTINCT duplicates.filename FROM duplicates JOIN signatures "
+                    "ON duplicates.chunk_id = signatures.chunk_id WHERE signatures.filename = ?",
+                    (filename,)).fetchall()
+                for (dependent_file,) in rows:
+                    if dependent_file not in checked:
+                        checked.add(dependent_file)
+                        dependent_files.append(dependent_file)
+                        to_check.append(dependent_file)
+
+        return dependent_files
+
+    def remove_files(self, filenames: List[str]) -> None:
+        """
+        Removes the signatures of the chunks of the given files and the duplicates in the given files
+        """
+        with self.lock:
+            for filename in filenames:
+                self.connection.execute("DELETE FROM bands WHERE chunk_id IN "
+                                        "(SELECT chunk_id FROM signatures WHERE filename = ?)", (filename,))
+                self.connection.execute("DELETE FROM duplicates WHERE chunk_id IN "
+                                        "(SELECT chunk_id FROM signatures WHERE filename = ?)", (filename,))
+                self.connection.execute("DELETE FROM signatures WHERE filename = ?", (filename,))
+                self.connection.execute("DELETE FROM duplicates WHERE filename = ?", (filename,))
+            self.connection.commit()
+
+    def get_stored_chunk_ids(self, filenames: List[str]) -> List[str]:
+        """
+        Returns the ids of the stored chunks of which the given files have near-duplicates
+        """
+        # a dictionary keeps the order of the ids without duplicates
+        chunk_ids: Dict[str, None] = {}
+        with self.lock:
+            for filename in filenames:
+                rows = self.connection.execute("SELECT DISTINCT chunk_id FROM duplicates WHERE filename = ?",
+                                               (filename,)).fetchall()
+                chunk_ids.update((row[0], None) for row in rows)
+
+        return list(chunk_ids)
+
+    def widen_search_filter(self, search_filter: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Returns a filename filter extended with the stored chunks of which the selected files have near-duplicates,
+        as these chunks are not stored under the selected files themselves. Stored chunks have their id in the
+        metadata as chunk_id. Other filters are returned unchanged
+        """
+        if search_filter is None or set(search_filter.keys()) != {"filename"}:
+            return search_filter
+        chunk_ids = self.get_stored_chunk_ids(get_filenames_from_filter(search_filter))
+        if len(chunk_ids) == 0:
+            return search_filter
+
+        return {"$or": [search_filter, {"chunk_id": {"$in": chunk_ids}}]}
+
+    def get_sources(self, chunk_ids: List[str]) -> Dict[str, List[Dict[str, str]]]:
+        """
+        Returns, for each of the given chunk ids that has near-duplicates, the sources of the near-duplicates
+        """
+        result: Dict[str, List[Dict[str, str]]] = {}
+        with self.lock:
+            for chunk_id in chunk_ids:
+                rows = self.connection.execute("SELECT filename, page_number, source FROM duplicates "
+                                               "WHERE chunk_id = ?", (chunk_id,)).fetchall()
+                if len(rows) > 0:
+                    result[chunk_id] = [{"filename": filename, "page_number": page_number, "source": source}
+                                        for filename, page_number, source in rows]
+
+        return result
@@ -0,0 +1,162 @@
+"""
+ConcurrentEmbeddings class
+Wraps an embeddings object so that document embeddings are requested with multiple concurrent requests,
+within a requests-per-minute and tokens-per-minute budget
+"""
+import time
+import random
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from loguru import logger
+from langchain_core.embeddings import Embeddings
+
+
+class TokenBucket:
+    """
+    Token bucket that allows at most rate_per_minute units per minute, with bursts up to one minute of budget.
+    A rate of 0 means no limit. The state is guarded by a thread lock, so one bucket limits the combined rate of all
+    calls and threads (each with their own event loop) that use it
+    """
+    def __init__(self, rate_per_minute: int) -> None:
+        self.capacity = float(rate_per_minute)
+        self.tokens = float(rate_per_minute)
+        self.rate_per_second = rate_per_minute / 60.0
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """
+        Takes the requested amount from the bucket, possibly in advance, and returns the number of seconds to wait
+        before the amount is actually available
+        """
+        if self.capacity <= 0:
+            return 0.0
+        # a single request can never need more than the complete budget
+        amount = min(amount, self.capacity)
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate_per_second)
+            self.last_refill = now
+            self.tokens -= amount
+
+            return max(0.0, -self.tokens / self.rate_per_second)
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        """
+        Waits until the requested amount is available and takes it from the bucket
+        """
+        delay = self.reserve(amount)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """
+    Determines whether an exception raised by an embeddings provider represents a rate limit (HTTP 429) response
+    """
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+
+    return status_code == 429 or type(error).__name__ == "RateLimitError"
+
+
+def get_retry_after(error: Exception) -> float:
+    """
+    Returns the number of seconds to wait according to the Retry-After header of a rate limit response, if present
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class ConcurrentEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that splits the texts to embed in batches and keeps up to max_concurrency embedding requests
+    in flight, limited by a requests-per-minute and tokens-per-minute budget. Requests that are rate limited (429)
+    are retried with exponential backoff. The budget is shared by all calls and threads that use this object
+    """
+    def __init__(self, embeddings: Embeddings, max_concurrency: int, batch_size: int,
+                 requests_per_minute: int = 0, tokens_per_minute: int = 0, max_retries: int = 6) -> None:
+        self.embeddings = embeddings
+        self.max_concurrency = max(1, max_concurrency)
+        self.batch_size = max(1, batch_size)
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+
+    @staticmethod
+    def estimate_tokens(texts: List[str]) -> int:
+        """
+        Estimates the number of tokens of the texts, assuming 4 characters per token on average
+        """
+        return sum(len(text) // 4 + 1 for text in texts)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds a list of texts with concurrent requests
+        When called from a thread with a running event loop (e.g. Streamlit), the requests run in a separate thread
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.aembed_documents(texts))
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, self.aembed_documents(texts)).result()
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embeds a query text with a single request
+        """
+        return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """
+        Embeds a query text with a single asynchronous request
+        """
+        return await self.embeddings.aembed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds a list of texts in batches, with at most max_concurrency requests in flight
+
+        Parameters
+        ----------
+        texts : List[str]
+            the texts to embed
+
+        Returns
+        -------
+        List[List[float]]
+            the embeddings of the texts, in the same order as the texts
+        """
+        # the semaphore is bound to the event loop of this call, the rate budget is shared by all calls
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        batches = [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+        logger.info(f"Embedding {len(texts)} texts in {len(batches)} requests, "
+                    f"at most {self.max_concurrency} concurrently")
+
+        async def embed_batch(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                for attempt in range(self.max_retries + 1):
+                    await self.request_bucket.acquire(1)
+                    await self.token_bucket.acquire(self.estimate_tokens(batch))
+                    try:
+                        return await self.embeddings.aembed_documents(batch)
+                    except Exception as error:
+                        if not is_rate_limit_error(error) or attempt == self.max_retries:
+                            raise
+                        # exponential backoff with jitter, unless the provider indicates how long to wait
+                        delay = get_retry_after(error) or min(60.0, 2 ** attempt) * (0.5 + random.random())
+                        logger.info(f"Embedding request rate limited, retrying in {delay:.1f} seconds")
+                        await asyncio.sleep(delay)
+
+        results = await asyncio.gather(*(embed_batch(batch) for batch in batches))
+
+        return [vector for batch_vectors in results for vector in batch_vectors]
@@ -0,0 +1,176 @@
+"""
+DocumentCatalog class
+Lightweight catalog of the files in a vector store, stored next to the vector store
+"""
+import os
+import json
+import sqlite3
+import threading
+from typing import Any, Dict, List
+from loguru import logger
+
+CATALOG_NAME = "document_catalog.sqlite"
+
+
+def has_document_catalog(vecdb_folder: str) -> bool:
+    """
+    Returns True if the vector store folder has a document catalog, without creating one
+    """
+    return os.path.exists(os.path.join(vecdb_folder, CATALOG_NAME))
+
+
+class DocumentCatalog:
+    """
+    Per-collection catalog that answers "which files are stored", "chunk ids of file X" and "metadata of file X"
+    with an index lookup instead of a scan of the complete vector store.
+    The catalog is kept up to date by the Ingester when chunks are added to or deleted from the vector store
+    Each file has an ingest state: "pending" (to be ingested), "embedding" (chunks are being added to the vector
+    store) or "committed" (all chunks are in the vector store). The chunk ids of a file are registered before the
+    chunks are added, so files that were not committed when an ingest run was interrupted can be rolled back
+    """
+    def __init__(self, vecdb_folder: str, catalog_name: str = CATALOG_NAME) -> None:
+        os.makedirs(vecdb_folder, exist_ok=True)
+        self.catalog_path = os.path.join(vecdb_folder, catalog_name)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.catalog_path, timeout=60, check_same_thread=False)
+        with self.lock:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS files (filename TEXT PRIMARY KEY, metadata TEXT, "
+                                    "state TEXT NOT NULL DEFAULT 'committed')")
+            # catalogs created before the ingest state existed only contain committed files
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(files)").fetchall()]
+            if "state" not in columns:
+                self.connection.execute("ALTER TABLE files ADD COLUMN state TEXT NOT NULL DEFAULT 'committed'")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, filename TEXT)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_chunks_filename ON chunks (filename)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)")
+            self.connection.commit()
+
+    def is_initialized(self) -> bool:
+        """
+        Returns True if the catalog reflects the contents of the vector store
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM info WHERE key = 'initialized'").fetchone()
+
+        return row is not None
+
+    def initialize(self, collection: Dict[str, List[Any]] = None) -> None:
+        """
+        Fills the catalog from the ids and metadatas of a vector store collection and marks it as initialized
+        Only needed once, for vector stores that were created before the catalog existed
+
+        Parameters
+        ----------
+        collection : Dict[str, List[Any]], optional
+            result of vector_store.get(), with keys 'ids' and 'metadatas'. None for a new, empty vector store
+        """
+        if collection is not None:
+            logger.info("Building document catalog from the vector store")
+            files: Dict[str, Dict[str, Any]] = {}
+            for chunk_metadata in collection['metadatas']:
+                files.setdefault(chunk_metadata['filename'], chunk_metadata)
+            with self.lock:
+                self.connection.executemany("INSERT OR REPLACE INTO files (filename, metadata) VALUES (?, ?)",
+                                            [(filename, json.dumps(file_metadata))
+                                             for filename, file_metadata in files.items()])
+                self.connection.executemany("INSERT OR REPLACE INTO chunks (id, filename) VALUES (?, ?)",
+                                            [(chunk_id, chunk_metadata['filename'])
+                                             for chunk_id, chunk_metadata in zip(collection['ids'],
+                                                                                 collection['metadatas'])])
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO info (key, value) VALUES ('initialized', '1')")
+            self.connection.commit()
+
+    def set_pending(self, filenames: List[str]) -> None:
+        """
+        Registers files that are going to be ingested
+        """
+        with self.lock:
+            self.connection.executemany("INSERT OR REPLACE INTO files (filename, metadata, state) "
+                                        "VALUES (?, NULL, 'pending')", [(f,) for f in filenames])
+            self.connection.commit()
+
+    def add_chunks(self, file_ids: Dict[str, List[str]]) -> None:
+        """
+        Registers the chunk ids of files before the chunks are added to the vector store
+
+        Parameters
+        ----------
+        file_ids : Dict[str, List[str]]
+            for each file, the ids of the chunks that are about to be added to the vector store
+        """
+        with self.lock:
+            self.connection.executemany("INSERT OR IGNORE INTO files (filename, metadata, state) "
+                                        "VALUES (?, NULL, 'embedding')", [(f,) for f in file_ids])
+            self.connection.executemany("UPDATE files SET state = 'embedding' WHERE filename = ? "
+                                        "AND state = 'pending'", [(f,) for f in file_ids])
+            self.connection.executemany("INSERT OR REPLACE INTO chunks (id, filename) VALUES (?, ?)",
+                                        [(chunk_id, filename) for filename, ids in file_ids.items()
+                                         for chunk_id in ids])
+            self.connection.commit()
+
+    def commit_file(self, filename: str, metadata: Dict[str, Any]) -> None:
+        """
+        Marks a file as committed, after all of its chunks have been added to the vector store
+
+        Parameters
+        ----------
+        filename : str
+            name of the file
+        metadata : Dict[str, Any]
+            metadata of the first chunk of the file
+        """
+        with self.lock:
+            self.connection.execute("UPDATE files SET metadata = ?, state = 'committed' WHERE filename = ?",
+                                    (json.dumps(metadata), filename))
+            self.connection.commit()
+
+    def remove_files(self, filenames: List[str]) -> None:
+        """
+        Removes files and their chunk ids from the catalog
+        """
+        with self.lock:
+            self.connection.executemany("DELETE FROM files WHERE filename = ?", [(f,) for f in filenames])
+            self.connection.executemany("DELETE FROM chunks WHERE filename = ?", [(f,) for f in filenames])
+            self.connection.commit()
+
+    def get_files(self) -> List[str]:
+        """
+        Returns the names of the files of which all chunks are in the vector store
+        """
+        with self.lock:
+            rows = self.connection.execute("SELECT filename FROM files WHERE state = 'committed'").fetchall()
+
+        return [row[0] for row in rows]
+
+    def get_uncommitted_files(self) -> List[str]:
+        """
+        Returns the names of the files of which the ingest was not completed, these may have part of their chunks
+        in the vector store
+        """
+        with self.lock:
+            rows = self.connection.execute("SELECT filename FROM files WHERE state != 'committed'").fetchall()
+
+        return [row[0] for row in rows]
+
+    def get_chunk_ids(self, filenames: List[str]) -> List[str]:
+        """
+        Returns the ids of the chunks of the given files
+        """
+        with self.lock:
+            chunk_ids = []
+            for filename in filenames:
+                rows = self.connection.execute("SELECT id FROM chunks WHERE filename = ?", (filename,)).fetchall()
+                chunk_ids.extend(row[0] for row in rows)
+
+        return chunk_ids
+
+    def get_metadata(self, filename: str) -> Dict[str, Any] | None:
+        """
+        Returns the metadata of the first chunk of a file, or None if the file is not in the catalog
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT metadata FROM files WHERE filename = ? AND state = 'committed'",
+                                          (filename,)).fetchone()
+
+        return None if row is None else json.loads(row[0])
@@ -0,0 +1,150 @@
+"""
+DocumentWriter class
+Collects the chunks of one or more files and adds them to the vector store in batches
+"""
+from typing import Any, Callable, Dict, Iterable, List, Set, Tuple
+import uuid
+from loguru import logger
+import langchain.docstore.document as docstore
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+# local imports
+from ingest.document_catalog import DocumentCatalog
+from ingest.parent_store import ParentStore
+from ingest.chunk_deduplicator import ChunkDeduplicator
+from ingest.bm25_index import BM25Index
+
+
+class DocumentWriter:
+    """
+    Single writer that buffers chunks and adds them to the vector store with batched add_documents calls
+    A file only counts as written when all of its chunks have been added to the vector store. The chunk ids are
+    registered in the catalog before the chunks are added, and the file is committed in the catalog when all of its
+    chunks are added, so that an interrupted ingest run can be rolled back
+    In case of the parent retriever, the parent chunks of the buffered child chunks are moved from the metadata of
+    the child chunks to the parent store. The new parent chunks of all buffered child chunks are embedded in one batch,
+    so the buffer acts as the window (across files) for parent chunk embedding
+    """
+    def __init__(self, vector_store: VectorStore, batch_size: int, parent_store: ParentStore = None,
+                 parent_embeddings: Embeddings = None, catalog: DocumentCatalog = None,
+                 on_files_committed: Callable[[List[str]], None] = None,
+                 deduplicator: ChunkDeduplicator = None, bm25_index: BM25Index = None) -> None:
+        self.vector_store = vector_store
+        self.batch_size = max(1, batch_size)
+        self.parent_store = parent_store
+        self.parent_embeddings = parent_embeddings
+        self.catalog = catalog
+        # called with the names of the files that are committed in each flush
+        self.on_files_committed = on_files_committed
+        # removes near-duplicate chunks before they are embedded, if set
+        self.deduplicator = deduplicator
+        # keyword index of the chunks in the vector store, updated with each batch if set
+        self.bm25_index = bm25_index
+        # ids of the parent chunks stored by this writer, the child chunks of a parent chunk can be in multiple batches
+        self.stored_parent_ids: Set[str] = set()
+        self.buffer: List[docstore.Document] = []
+        # files of which all chunks are in the buffer, but not yet added to the vector store
+        self.pending_files: List[str] = []
+        # metadata of the first chunk of files that are not completely written yet
+        self.file_metadata: Dict[str, Dict[str, Any]] = {}
+        self.num_chunks_written = 0
+        self.num_files_written = 0
+
+    def write(self, file: str, documents: Iterable[docstore.Document]) -> int:
+        """
+        Adds the chunks of a file to the buffer and flushes the buffer each time it is full
+
+        Parameters
+        ----------
+        file : str
+            name of the file the chunks belong to
+        documents : Iterable[docstore.Document]
+            the chunks of the file
+
+        Returns
+        -------
+        int
+            the number of chunks of the file
+        """
+        num_chunks = 0
+        for document in documents:
+            self.buffer.append(document)
+            num_chunks += 1
+            if len(self.buffer) >= self.batch_size:
+                self.flush()
+        self.pending_files.append(file)
+        logger.info(f"Extracted {num_chunks} chunks from {file}")
+
+        return num_chunks
+
+    def flush(self) -> None:
+        """
+        Adds all buffered chunks to the vector store in one call
+        """
+        if len(self.buffer) > 0:
+            ids = [str(uuid.uuid4()) for _ in self.buffer]
+            for document in self.buffer:
+                if document.metadata['filename'] not in self.file_metadata:
+                    self.file_metadata[document.metadata['filename']] = {
+                        key: value for key, value in document.metadata.items() if key != 'parent_chunk'}
+            documents = self.buffer
+            if self.deduplicator is not None:
+                # the id in the metadata links a stored chunk to the sources of its near-duplicates at query time
+                for chunk_id, document in zip(ids, documents):
+                    document.metadata['chunk_id'] = chunk_id
+                documents, ids = self.deduplicator.filter(documents, ids)
+            if self.parent_store is not None:
+                self.store_parent_chunks(documents)
+            file_ids: Dict[str, List[str]] = {}
+            for chunk_id, document in zip(ids, documents):
+                file_ids.setdefault(document.metadata['filename'], []).append(chunk_id)
+            if self.catalog is not None:
+                self.catalog.add_chunks(file_ids)
+            if len(documents) > 0:
+                self.vector_store.add_documents(documents=documents, ids=ids)
+                if self.bm25_index is not None:
+                    self.bm25_index.add_documents(documents, ids)
+            self.num_chunks_written += len(documents)
+            logger.info(f"Added batch of {len(documents)} chunks to vectorstore")
+            self.buffer = []
+        # all chunks of the pending files are now in the vector store
+        for file in self.pending_files:
+            metadata = self.file_metadata.pop(file, None)
+            if self.catalog is not None:
+                if metadata is not None:
+                    self.catalog.commit_file(file, metadata)
+                else:
+                    # files without chunks are not in the vector store
+                    self.catalog.remove_files([file])
+        if self.on_files_committed is not None and len(self.pending_files) > 0:
+            self.on_files_committed(self.pending_files)
+        self.num_files_written += len(self.pending_files)
+        self.pending_files = []
+
+    def store_parent_chunks(self, documents: List[docstore.Document]) -> None:
+        """
+        Removes the parent chunk text from the metadata of the given child chunks and adds the parent chunks that
+        were not stored before to the parent store, embedded with one embed_documents call
+
+        Parameters
+        ----------
+        documents : List[docstore.Document]
+            the child chunks, with metadata "parent_chunk_id" and "parent_chunk"
+        """
+        parent_chunks: Dict[str, Tuple[str, str]] = {}
+        for document in documents:
+            parent_chunk = document.metadata.pop('parent_chunk')
+            parent_chunk_id = document.metadata['parent_chunk_id']
+            if parent_chunk_id not in self.stored_parent_ids:
+                parent_chunks.setdefault(parent_chunk_id, (document.metadata['filename'], parent_chunk))
+        if len(parent_chunks) == 0:
+            return
+        parent_chunk_ids = list(parent_chunks.keys())
+        texts = [parent_chunks[chunk_id][1] for chunk_id in parent_chunk_ids]
+        vectors = None
+        if self.parent_embeddings is not None:
+            vectors = self.parent_embeddings.embed_documents(texts)
+            logger.info(f"Embedded {len(parent_chunk_ids)} parent chunks in one batch")
+        self.parent_store.add_parents(parent_chunk_ids, [parent_chunks[chunk_id][0] for chunk_id in parent_chunk_ids],
+                                      texts, vectors)
+        self.stored_parent_ids.update(parent_chunk_ids)
@@ -0,0 +1,127 @@
+"""
+CachedEmbeddings class
+Wraps an embeddings object with a persistent on-disk cache of document embeddings
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, List
+import numpy as np
+from loguru import logger
+from langchain_core.embeddings import Embeddings
+# local imports
+import utils as ut
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that stores document embeddings as float32 vectors in a SQLite file, keyed by
+    (provider, model, sha256 of the text). When the cache exceeds its maximum size, the least recently used
+    vectors are evicted. Query embeddings are not cached, as some providers embed queries differently
+    """
+    def __init__(self, embeddings: Embeddings, embeddings_provider: str, embeddings_model: str,
+                 cache_path: str, max_size_mb: int) -> None:
+        self.embeddings = embeddings
+        self.embeddings_provider = embeddings_provider
+        self.embeddings_model = embeddings_model
+        self.cache_path = cache_path
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        self.connection = sqlite3.connect(cache_path, timeout=60, check_same_thread=False)
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS embeddings (
+                                       provider TEXT NOT NULL,
+                                       model TEXT NOT NULL,
+                                       text_hash TEXT NOT NULL,
+                                       vector BLOB NOT NULL,
+                                       last_used REAL NOT NULL,
+                                       PRIMARY KEY (provider, model, text_hash))""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings (last_used)")
+        self.connection.commit()
+
+    @staticmethod
+    def get_text_hash(text: str) -> str:
+        """
+        returns the sha256 hash of a text
+        """
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds a list of texts, only texts that are not in the cache are sent to the embeddings provider
+
+        Parameters
+        ----------
+        texts : List[str]
+            the texts to embed
+
+        Returns
+        -------
+        List[List[float]]
+            the embeddings of the texts
+        """
+        text_hashes = [self.get_text_hash(text) for text in texts]
+        cached = self._lookup(list(set(text_hashes)))
+        num_hits = sum(1 for text_hash in text_hashes if text_hash in cached)
+        # embed each missing text only once, even if it occurs multiple times in texts
+        missing: Dict[str, str] = {}
+        for text, text_hash in zip(texts, text_hashes):
+            if text_hash not in cached:
+                missing.setdefault(text_hash, text)
+        logger.info(f"Embeddings cache: {num_hits} hits, {len(texts) - num_hits} misses")
+        if len(missing) > 0:
+            missing_hashes = list(missing.keys())
+            vectors = self.embeddings.embed_documents([missing[text_hash] for text_hash in missing_hashes])
+            self._store(missing_hashes, vectors)
+            cached.update(dict(zip(missing_hashes, vectors)))
+
+        return [list(cached[text_hash]) for text_hash in text_hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embeds a query text, without using the cache
+        """
+        return self.embeddings.embed_query(text)
+
+    def _lookup(self, text_hashes: List[str]) -> Dict[str, List[float]]:
+        """
+        returns the cached vectors of the given text hashes and marks them as recently used
+        """
+        result = {}
+        now = time.time()
+        with self.lock:
+            # stay below the SQLite limit on the number of query parameters
+            for start in range(0, len(text_hashes), 500):
+                batch = text_hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.connection.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE provider = ? AND model = ? "
+                    f"AND text_hash IN ({placeholders})",
+                    [self.embeddings_provider, self.embeddings_model, *batch]).fetchall()
+                for text_hash, vector in rows:
+                    result[text_hash] = np.frombuffer(vector, dtype=np.float32).tolist()
+            self.connection.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE provider = ? AND model = ? AND text_hash = ?",
+                [(now, self.embeddings_provider, self.embeddings_model, text_hash) for text_hash in result])
+            self.connection.commit()
+
+        return result
+
+    def _store(self, text_hashes: List[str], vectors: List[List[float]]) -> None:
+        """
+        stores vectors in the cache as float32 and evicts least recently used vectors if the cache is too large
+        """
+        now = time.time()
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (provider, model, text_hash, vector, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(self.embeddings_provider, self.embeddings_model, text_hash,
+                  np.asarray(vector, dtype=np.float32).tobytes(), now)
+                 for text_hash, vector in zip(text_hashes, vectors)])
+            self.connection.commit()
+            num_evicted = ut.evict_least_recently_used(self.connection, "embeddings", "vector", self.max_size_bytes)
+        if num_evicted > 0:
+            logger.info(f"Embeddings cache: evicted {num_evicted} least recently used vectors")
@@ -5,15 +5,19 @@ from langchain_community.embeddings import OllamaEmbeddings
 from langchain_openai import OpenAIEmbeddings, AzureOpenAIEmbeddings
 # local imports
 import settings
+from ingest.embeddings_cache import CachedEmbeddings
+from ingest.concurrent_embeddings import ConcurrentEmbeddings
 
 
 class EmbeddingsCreator():
     """
     EmbeddingsCreator class to import into other modules
     """
-    def __init__(self, embeddings_provider: str = None, embeddings_model: str = None) -> None:
+    def __init__(self, embeddings_provider: str = None, embeddings_model: str = None,
+                 embeddings_cache: bool = None) -> None:
         self.embeddings_provider = settings.EMBEDDINGS_PROVIDER if embeddings_provider is None else embeddings_provider
         self.embeddings_model = settings.EMBEDDINGS_MODEL if embeddings_model is None else embeddings_model
+        self.embeddings_cache = settings.EMBEDDINGS_CACHE if embeddings_cache is None else embeddings_cache
 
     def get_embeddings(self):
         """
@@ -36,4 +40,22 @@ class EmbeddingsCreator():
                                                client=None)
             logger.info(f"Loaded Azure OpenAI embeddings model {self.embeddings_model}")
 
+        # wrap embeddings object to embed documents with concurrent, rate limited requests
+        if settings.EMBEDDINGS_MAX_CONCURRENT_REQUESTS > 1:
+            embeddings = ConcurrentEmbeddings(embeddings=embeddings,
+                                              max_concurrency=settings.EMBEDDINGS_MAX_CONCURRENT_REQUESTS,
+                                              batch_size=settings.EMBEDDINGS_REQUEST_BATCH_SIZE,
+                                              requests_per_minute=settings.EMBEDDINGS_REQUESTS_PER_MINUTE,
+                                              tokens_per_minute=settings.EMBEDDINGS_TOKENS_PER_MINUTE)
+            logger.info(f"Using {settings.EMBEDDINGS_MAX_CONCURRENT_REQUESTS} concurrent embedding requests")
+
+        # wrap embeddings object with persistent cache of document embeddings
+        if self.embeddings_cache:
+            embeddings = CachedEmbeddings(embeddings=embeddings,
+                                          embeddings_provider=self.embeddings_provider,
+                                          embeddings_model=self.embeddings_model,
+                                          cache_path=settings.EMBEDDINGS_CACHE_PATH,
+                                          max_size_mb=settings.EMBEDDINGS_CACHE_MAX_SIZE_MB)
+            logger.info(f"Using embeddings cache {settings.EMBEDDINGS_CACHE_PATH}")
+
         return embeddings
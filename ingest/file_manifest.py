@@ -0,0 +1,124 @@
+"""
+FileManifest class
+Keeps track of size, modification time and content hash of every ingested file, stored next to the vector store
+"""
+import os
+import json
+from typing import Dict, List
+from loguru import logger
+# local imports
+import utils as ut
+
+
+class FileManifest:
+    """
+    Per-file manifest that is used to detect files that were modified since they were ingested
+    Files of which size and modification time are unchanged are considered unchanged without opening them
+    """
+    def __init__(self, vecdb_folder: str, manifest_name: str = "file_manifest.json") -> None:
+        self.manifest_path = os.path.join(vecdb_folder, manifest_name)
+        # entries = {filename: {"size": , "mtime": , "hash": }}
+        self.entries: Dict[str, Dict] = {}
+        if os.path.isfile(self.manifest_path):
+            with open(file=self.manifest_path, mode="r", encoding="utf8") as f:
+                self.entries = json.load(f)
+
+    @staticmethod
+    def get_file_state(file_path: str, file_hash: str = None) -> Dict:
+        """
+        Returns the current size, modification time and content hash of a file
+        The size and modification time are determined first, so that a file that is modified after its content was
+        read is detected as modified in the next ingest run
+
+        Parameters
+        ----------
+        file_path : str
+            path of the file
+        file_hash : str, optional
+            content hash of the file, determined from the file content when None
+
+        Returns
+        -------
+        Dict
+            the manifest entry of the file, with keys "size", "mtime" and "hash"
+        """
+        stat = os.stat(file_path)
+
+        return {"size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "hash": ut.get_file_hash(file_path) if file_hash is None else file_hash}
+
+    def update(self, content_folder: str, file: str, file_hash: str = None, file_state: Dict = None) -> None:
+        """
+        Records the size, modification time and content hash of a file
+
+        Parameters
+        ----------
+        content_folder : str
+            the content folder (including path)
+        file : str
+            name of the file (without path)
+        file_hash : str, optional
+            content hash of the file, determined from the file content when None
+        file_state : Dict, optional
+            the state of the file as returned by get_file_state when its content was read for ingestion, the current
+            state of the file when None
+        """
+        if file_state is None:
+            file_state = self.get_file_state(os.path.join(content_folder, file), file_hash)
+        self.entries[file] = dict(file_state)
+
+    def remove(self, files: List[str]) -> None:
+        """
+        Removes files from the manifest
+        """
+        for file in files:
+            self.entries.pop(file, None)
+
+    def get_modified_files(self, content_folder: str, files: List[str]) -> List[str]:
+        """
+        Determines which of the given (already ingested) files have a different content than when they were ingested
+        Only files with a changed size or modification time are opened to determine their content hash.
+        Files without manifest entry (ingested before the manifest existed) are recorded as they are now
+
+        Parameters
+        ----------
+        content_folder : str
+            the content folder (including path)
+        files : List[str]
+            names of the files that are present in both the content folder and the vector store
+
+        Returns
+        -------
+        List[str]
+            names of the files of which the content has changed
+        """
+        modified_files = []
+        for file in files:
+            entry = self.entries.get(file)
+            if entry is None:
+                self.update(content_folder, file)
+                continue
+            stat = os.stat(os.path.join(content_folder, file))
+            if stat.st_size == entry["size"] and stat.st_mtime == entry["mtime"]:
+                continue
+            file_hash = ut.get_file_hash(os.path.join(content_folder, file))
+            if file_hash == entry["hash"]:
+                # file was only touched, record the new modification time
+                logger.info(f"File {file} was touched but its content is unchanged")
+                self.update(content_folder, file, file_hash)
+            else:
+                logger.info(f"File {file} was modified since it was ingested")
+                modified_files.append(file)
+
+        return modified_files
+
+    def save(self) -> None:
+        """
+        Writes the manifest to disk
+        """
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(file=tmp_path, mode="w", encoding="utf8") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
@@ -1,20 +1,47 @@
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Tuple
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from loguru import logger
 from langchain_community.document_loaders import BSHTMLLoader
 from langchain_community.document_loaders import TextLoader
 from langchain_community.document_loaders import UnstructuredWordDocumentLoader
 import fitz
 # local imports
+import settings
 import utils as ut
 
+# block text represents a page header or footer
+PAGENR_PATTERN = re.compile(r'^\s*(\d+)([.\s]*)$|^\s*(\d+)([.\s]*)$')
+# block text represents a page header or footer containing a pipe character and some text
+PAGENR_PIPE_PATTERN = re.compile(r'^\s*(\d+)\s*\|\s*([\w\s]+)$|^\s*([\w\s]+)\s*\|\s*(\d+)$')
+# block text represents any form of paragraph title
+PARAGRAPH_PATTERN = re.compile(r'^\d+(\.\d+)*\s*.+$')
+
+
+def _parse_pymupdf_page_range(file_path: str, start: int, end: int) -> List[List[Tuple[int, str]]]:
+    """
+    Extracts the page blocks of pages start up to end of a PDF file inside a worker process, the file is opened
+    by the worker itself
+
+    Returns
+    -------
+    List[List[Tuple[int, str]]]
+        for each page in the range, the list of tuples of page number and text of the (merged) blocks of the page
+    """
+    file_parser = FileParser(page_workers=1)
+    with fitz.open(file_path) as doc:
+        return [file_parser.parse_pymupdf_page(i, doc.load_page(i)) for i in range(start, end)]
+
 
 class FileParser:
     """
     A class with functionality to parse various kinds of files
     """
-    def __init__(self) -> None:
-        pass
+    def __init__(self, page_workers: int = None, page_workers_min_pages: int = None) -> None:
+        self.page_workers = settings.PDF_PAGE_WORKERS if page_workers is None else page_workers
+        self.page_workers_min_pages = settings.PDF_PAGE_WORKERS_MIN_PAGES if page_workers_min_pages is None \
+            else page_workers_min_pages
 
     def parse_file(self, file_path: str):
         if file_path.endswith(".pdf"):
@@ -29,6 +56,17 @@ class FileParser:
         # return raw text from pages and metadata
         return raw_pages, metadata
 
+    def iter_file(self, file_path: str) -> Tuple[Iterator[Tuple[int, str]], Dict[str, str]]:
+        """
+        Streaming variant of parse_file: returns a generator of the raw text pages and the metadata
+        Only PDF files are extracted page by page, other file types consist of a single page
+        """
+        if file_path.endswith(".pdf"):
+            return self.iter_pymupdf(file_path)
+        raw_pages, metadata = self.parse_file(file_path)
+
+        return iter(raw_pages), metadata
+
     def get_metadata(self, file_path: str, doc_metadata: str):
         """
         Extracts the following metadata from the pdf document:
@@ -41,7 +79,7 @@ class FileParser:
                 "indicator_url": doc_metadata.get('keywords', '').strip(),
                 "indicator_closed": doc_metadata.get('trapped', '').strip(),
                 # add filename to metadata
-                "filename": file_path.split('\\')[-1]
+                "filename": os.path.basename(file_path)
                 }
 
     def parse_html(self, file_path: str) -> Tuple[List[Tuple[int, str]], Dict[str, str]]:
@@ -76,115 +114,197 @@ class FileParser:
         metadata = self.get_metadata(file_path, doc.metadata)
         # print(f"parse_pymupdf: metadata = {metadata}")
         pages = []
-        page_with_max_text = -1
-        max_page_text_length = -1
+        page_with_max_text = ""
 
         # for each page in pdf file
         logger.info("Extracting text from pdf file")
-        for i, page in enumerate(doc.pages()):
-            first_block_of_page = True
-            prv_block_text = ""
-            prv_block_is_valid = True
-            prv_block_is_paragraph = False
-            # obtain the blocks
-            blocks = page.get_text("blocks")
-
-            # for each block
-            for block in blocks:
-                # only consider text blocks
-                # if block["type"] == 0:
-                if block[6] == 0:
-                    block_is_valid = True
-                    block_is_pagenr = False
-                    block_is_paragraph = False
-                    # block_tag = pdf_analyzer.get_block_tag(doc_tags, i, block_id)
-                    # block_text = pdf_analyzer.get_block_text(doc_tags, i, block_id)
-                    block_text = block[4]
-
-                    # block text should not represent a page header or footer
-                    pattern_pagenr = r'^\s*(\d+)([.\s]*)$|^\s*(\d+)([.\s]*)$'
-                    if bool(re.match(pattern_pagenr, block_text)):
-                        block_is_pagenr = True
-                        block_is_valid = False
-                        # print(f"block {block[5]}: {block_text} is a page number")
-
-                    # block text should not represent a page header or footer containing a pipe character
-                    # and some text
-                    pattern_pagenr = r'^\s*(\d+)\s*\|\s*([\w\s]+)$|^\s*([\w\s]+)\s*\|\s*(\d+)$'
-                    if bool(re.match(pattern_pagenr, block_text)):
-                        block_is_pagenr = True
-                        block_is_valid = False
-                        # print(f"block {block[5]}: {block_text} is a page number")
-
-                    # block text should not represent any form of paragraph title
-                    pattern_paragraph = r'^\d+(\.\d+)*\s*.+$'
-                    if bool(re.match(pattern_paragraph, block_text)):
-                        if not block_is_pagenr:
-                            block_is_paragraph = True
-                            # print(f"block {block[5]}: {block_text} is a paragraph")
-
-                    # if current block is content
-                    if block_is_valid and (not block_is_paragraph):
-                        # print(f"block {block[5]} is valid and not a paragraph: {block_text} ")
-                        # and the previous block was a paragraph
-                        if prv_block_is_paragraph:
-                            # extend the paragraph block text with a newline character and the current block text
-                            block_text = prv_block_text + "\n" + block_text
-                        # but if the previous block was a content block
-                        else:
-                            if prv_block_is_valid and block_is_valid:
-                                # extend the content block text with a whitespace character and the current block text
-                                block_text = prv_block_text + " " + block_text
-                        # in both cases, set the previous block text to the current block text
-                        prv_block_text = block_text
-                    # else if current block text is not content
-                    else:
-                        # and the current block is not the very first block of the page
-                        if not first_block_of_page:
-                            # if previous block was content
-                            if prv_block_is_valid and (not prv_block_is_paragraph):
-                                # add text of previous block to pages together with page number
-                                pages.append((i, prv_block_text))
-                                # print(f"added to page {i}: {prv_block_text}")
-                                # and empty the previous block text
-                                prv_block_text = ""
-                            # if previous block was not relevant
-                            else:
-                                # just set the set the previous block text to the current block text
-                                prv_block_text = block_text
-
-                    # set previous block validity indicators to current block validity indicators
-                    prv_block_is_valid = block_is_valid
-                    # prv_block_is_pagenr = block_is_pagenr
-                    prv_block_is_paragraph = block_is_paragraph
-                    prv_block_text = block_text
+        if self.page_workers > 1 and doc.page_count >= self.page_workers_min_pages:
+            blocks_per_page = self.parse_pymupdf_pages_parallel(file_path, doc.page_count)
+        else:
+            blocks_per_page = (self.parse_pymupdf_page(i, page) for i, page in enumerate(doc.pages()))
+        for page_blocks in blocks_per_page:
+            pages.extend(page_blocks)
+            # store page with maximum amount of characters for language detection of document
+            page_with_max_text = self.get_longest_page_text(page_with_max_text, page_blocks)
 
-                    # set first_block_of_page to False
-                    first_block_of_page = False
+        metadata['Language'] = metadata['Language'] if 'Language' in metadata.keys() else \
+            ut.detect_language(page_with_max_text)
+        logger.info(f"The language detected for this document is {metadata['Language']}")
 
-            # end of page:
-            # if previous block was content
-            if prv_block_is_valid and (not prv_block_is_paragraph):
-                # add text of previous block to pages together with page number
-                pages.append((i, prv_block_text))
-                # print(f"added to page {i}: {prv_block_text}")
+        return pages, metadata
 
-            # store pagenr with maximum amount of characters for language detection of document
-            page_text_length = len(pages[i][1])
-            if page_text_length > max_page_text_length:
-                page_with_max_text = i
-                max_page_text_length = page_text_length
+    def parse_pymupdf_pages_parallel(self, file_path: str, page_count: int) -> List[List[Tuple[int, str]]]:
+        """
+        Extracts the page blocks of all pages of a PDF file with page_workers worker processes, each worker
+        extracting a range of pages. The results are merged back in page order, so that the outcome is identical to
+        extraction of the pages one after another
 
-            # tabs = page.find_tables() # locate and extract any tables on page
-            # print(f"{len(tabs.tables)} table found on {page}") # display number of found tables
-            # if tabs.tables:  # at least one table found?
-            #     pprint.pprint(tabs[0].extract())  # print content of first table
+        Parameters
+        ----------
+        file_path : str
+            path of the PDF file
+        page_count : int
+            number of pages of the PDF file
 
-        metadata['Language'] = metadata['Language'] if 'Language' in metadata.keys() else \
-            ut.detect_language(pages[page_with_max_text][1])
+        Returns
+        -------
+        List[List[Tuple[int, str]]]
+            for each page, the list of tuples of page number and text of the (merged) blocks of the page
+        """
+        # several ranges per worker, so that workers that finish early can take over the remaining pages
+        num_ranges = min(page_count, self.page_workers * 4)
+        range_size = -(-page_count // num_ranges)
+        starts = list(range(0, page_count, range_size))
+        ends = [min(start + range_size, page_count) for start in starts]
+        logger.info(f"Extracting {page_count} pages in {len(starts)} page ranges with {self.page_workers} "
+                    "worker processes")
+        with ProcessPoolExecutor(max_workers=self.page_workers) as executor:
+            # executor.map returns the results in the order of the page ranges
+            results = executor.map(_parse_pymupdf_page_range, [file_path] * len(starts), starts, ends)
+            return [page_blocks for range_blocks in results for page_blocks in range_blocks]
+
+    def iter_pymupdf(self, file_path: str) -> Tuple[Iterator[Tuple[int, str]], Dict[str, str]]:
+        """
+        Streaming variant of parse_pymupdf: returns a generator of the page blocks and the metadata of the PDF file
+        The language of the document is determined in a first pass over the pages, in which only the text of the page
+        with the maximum amount of characters is kept in memory. The page blocks are extracted again, page by page,
+        while the generator is consumed
+        """
+        logger.info("Extracting pdf metadata")
+        with fitz.open(file_path) as doc:
+            metadata = self.get_metadata(file_path, doc.metadata)
+            if 'Language' not in metadata.keys():
+                page_with_max_text = ""
+                for i, page in enumerate(doc.pages()):
+                    page_with_max_text = self.get_longest_page_text(page_with_max_text,
+                                                                    self.parse_pymupdf_page(i, page))
+                metadata['Language'] = ut.detect_language(page_with_max_text)
         logger.info(f"The language detected for this document is {metadata['Language']}")
 
-        return pages, metadata
+        def page_blocks_generator() -> Iterator[Tuple[int, str]]:
+            logger.info("Extracting text from pdf file")
+            with fitz.open(file_path) as doc:
+                for i, page in enumerate(doc.pages()):
+                    yield from self.parse_pymupdf_page(i, page)
+
+        return page_blocks_generator(), metadata
+
+    def get_longest_page_text(self, longest_page_text: str, page_blocks: List[Tuple[int, str]]) -> str:
+        """
+        Returns the text of the given page blocks if it is longer than the longest page text so far,
+        otherwise the longest page text so far
+        """
+        page_text = " ".join(block_text for _, block_text in page_blocks)
+
+        return page_text if len(page_text) > len(longest_page_text) else longest_page_text
+
+    def parse_pymupdf_page(self, i: int, page: fitz.Page) -> List[Tuple[int, str]]:
+        """
+        Extracts the blocks of text of one page of a PDF file and merges paragraph headers with their content
+
+        Parameters
+        ----------
+        i : int
+            page number
+        page : fitz.Page
+            the page
+
+        Returns
+        -------
+        List[Tuple[int, str]]
+            list of tuples of page number and text of the (merged) blocks of the page
+        """
+        pages = []
+        first_block_of_page = True
+        prv_block_text = ""
+        prv_block_is_valid = True
+        prv_block_is_paragraph = False
+        # obtain the blocks
+        blocks = page.get_text("blocks")
+
+        # for each block
+        for block in blocks:
+            # only consider text blocks
+            # if block["type"] == 0:
+            if block[6] == 0:
+                block_is_valid = True
+                block_is_pagenr = False
+                block_is_paragraph = False
+                # block_tag = pdf_analyzer.get_block_tag(doc_tags, i, block_id)
+                # block_text = pdf_analyzer.get_block_text(doc_tags, i, block_id)
+                block_text = block[4]
+
+                # block text should not represent a page header or footer
+                if PAGENR_PATTERN.match(block_text):
+                    block_is_pagenr = True
+                    block_is_valid = False
+                    # print(f"block {block[5]}: {block_text} is a page number")
+
+                # block text should not represent a page header or footer containing a pipe character
+                # and some text
+                if PAGENR_PIPE_PATTERN.match(block_text):
+                    block_is_pagenr = True
+                    block_is_valid = False
+                    # print(f"block {block[5]}: {block_text} is a page number")
+
+                # block text should not represent any form of paragraph title
+                if PARAGRAPH_PATTERN.match(block_text):
+                    if not block_is_pagenr:
+                        block_is_paragraph = True
+                        # print(f"block {block[5]}: {block_text} is a paragraph")
+
+                # if current block is content
+                if block_is_valid and (not block_is_paragraph):
+                    # print(f"block {block[5]} is valid and not a paragraph: {block_text} ")
+                    # and the previous block was a paragraph
+                    if prv_block_is_paragraph:
+                        # extend the paragraph block text with a newline character and the current block text
+                        block_text = prv_block_text + "\n" + block_text
+                    # but if the previous block was a content block
+                    else:
+                        if prv_block_is_valid and block_is_valid:
+                            # extend the content block text with a whitespace character and the current block text
+                            block_text = prv_block_text + " " + block_text
+                    # in both cases, set the previous block text to the current block text
+                    prv_block_text = block_text
+                # else if current block text is not content
+                else:
+                    # and the current block is not the very first block of the page
+                    if not first_block_of_page:
+                        # if previous block was content
+                        if prv_block_is_valid and (not prv_block_is_paragraph):
+                            # add text of previous block to pages together with page number
+                            pages.append((i, prv_block_text))
+                            # print(f"added to page {i}: {prv_block_text}")
+                            # and empty the previous block text
+                            prv_block_text = ""
+                        # if previous block was not relevant
+                        else:
+                            # just set the set the previous block text to the current block text
+                            prv_block_text = block_text
+
+                # set previous block validity indicators to current block validity indicators
+                prv_block_is_valid = block_is_valid
+                # prv_block_is_pagenr = block_is_pagenr
+                prv_block_is_paragraph = block_is_paragraph
+                prv_block_text = block_text
+
+                # set first_block_of_page to False
+                first_block_of_page = False
+
+        # end of page:
+        # if previous block was content
+        if prv_block_is_valid and (not prv_block_is_paragraph):
+            # add text of previous block to pages together with page number
+            pages.append((i, prv_block_text))
+            # print(f"added to page {i}: {prv_block_text}")
+
+        # tabs = page.find_tables() # locate and extract any tables on page
+        # print(f"{len(tabs.tables)} table found on {page}") # display number of found tables
+        # if tabs.tables:  # at least one table found?
+        #     pprint.pprint(tabs[0].extract())  # print content of first table
+
+        return pages
 
     def parse_txt(self, file_path: str) -> Tuple[List[Tuple[int, str]], Dict[str, str]]:
         """
@@ -5,11 +5,13 @@ Also parses files, chunks the files and stores the chunks in vector store
 When instantiating without parameters, attributes get values from settings.py
 """
 import os
-import re
-from typing import Callable, Dict, List, Tuple, Any
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
 from loguru import logger
 import langchain.docstore.document as docstore
 from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
 # local imports
 import settings
 import utils as ut
@@ -17,6 +19,25 @@ from ingest.file_parser import FileParser
 from ingest.embeddings_creator import EmbeddingsCreator
 from ingest.vectorstore_creator import VectorStoreCreator
 from ingest.splitter_creator import SplitterCreator
+from ingest.document_writer import DocumentWriter
+from ingest.file_manifest import FileManifest
+from ingest.document_catalog import DocumentCatalog
+from ingest.parent_store import ParentStore
+from ingest.parse_cache import ParseCache
+from ingest.chunk_deduplicator import ChunkDeduplicator, has_dedup_index
+from ingest.bm25_index import get_bm25_index, has_bm25_index
+from ingest import text_cleaner
+
+
+def _file_to_docs_worker(ingester: "Ingester", file_path: str) -> Tuple[List[docstore.Document], Dict]:
+    """
+    Parses, cleans and splits one file inside a worker process of the ingest process pool
+    The files are already processed in parallel, so the pages of a PDF file are extracted one after another
+    Returns the chunks and the state of the file (size, modification time and content hash) before it was read
+    """
+    file_state = FileManifest.get_file_state(file_path)
+
+    return ingester.file_to_docs(FileParser(page_workers=1), file_path, file_state["hash"]), file_state
 
 
 class Ingester:
@@ -29,7 +50,10 @@ class Ingester:
                  retriever_type: str = None, vecdb_type: str = None,
                  text_splitter_method: str = None, text_splitter_method_child: str = None,
                  chunk_size: int = None, chunk_size_child: int = None,
-                 chunk_overlap: int = None, chunk_overlap_child: int = None) -> None:
+                 chunk_overlap: int = None, chunk_overlap_child: int = None,
+                 num_workers: int = None, batch_size: int = None, streaming: bool = None,
+                 embeddings: Embeddings = None, parse_cache: bool = None, dedup_chunks: bool = None,
+                 dedup_threshold: float = None) -> None:
         load_dotenv()
         self.collection_name = collection_name
         self.content_folder = content_folder
@@ -46,24 +70,46 @@ class Ingester:
             if text_splitter_method_child is None else text_splitter_method_child
         self.chunk_size_child = settings.CHUNK_SIZE_CHILD if chunk_size_child is None else chunk_size_child
         self.chunk_overlap_child = settings.CHUNK_OVERLAP_CHILD if chunk_overlap_child is None else chunk_overlap_child
+        self.num_workers = settings.INGEST_NUM_WORKERS if num_workers is None else num_workers
+        self.batch_size = settings.INGEST_BATCH_SIZE if batch_size is None else batch_size
+        self.streaming = settings.INGEST_STREAMING if streaming is None else streaming
+        # embeddings object to use instead of the one of embeddings_provider and embeddings_model, e.g. a shared one
+        self.embeddings = embeddings
+        self.use_parse_cache = settings.PARSE_CACHE if parse_cache is None else parse_cache
+        # the parse cache is opened on first use, in each process
+        self.parse_cache = None
+        self.dedup_chunks = settings.DEDUP_CHUNKS if dedup_chunks is None else dedup_chunks
+        self.dedup_threshold = settings.DEDUP_THRESHOLD if dedup_threshold is None else dedup_threshold
+
+    def __getstate__(self) -> Dict:
+        """
+        The Ingester is sent to the worker processes of the ingest process pool, which do not embed,
+        so the embeddings object (which is not necessarily picklable) is left out. The parse cache is opened again
+        in the worker process
+        """
+        state = self.__dict__.copy()
+        state["embeddings"] = None
+        state["parse_cache"] = None
+
+        return state
 
     def merge_hyphenated_words(self, text: str) -> str:
         """
         Merge words in the text that have been split with a hyphen.
         """
-        return re.sub(r"(\w)-\n(\w)", r"\1\2", text)
+        return text_cleaner.merge_hyphenated_words(text)
 
     def fix_newlines(self, text: str) -> str:
         """
         Replace single newline characters in the text with spaces.
         """
-        return re.sub(r"(?<!\n)\n(?!\n)", " ", text)
+        return text_cleaner.fix_newlines(text)
 
     def remove_multiple_newlines(self, text: str) -> str:
         """
         Reduce multiple newline characters in the text to a single newline.
         """
-        return re.sub(r"\n{2,}", "\n", text)
+        return text_cleaner.remove_multiple_newlines(text)
 
     def clean_texts(self,
                     texts: List[Tuple[int, str]],
@@ -73,22 +119,37 @@ class Ingester:
         Apply the cleaning functions to the text of each page.
         """
         logger.info("Cleaning texts")
-        cleaned_texts = []
+
+        return list(self.iter_clean_texts(texts, cleaning_functions))
+
+    def iter_clean_texts(self,
+                         texts: Iterable[Tuple[int, str]],
+                         cleaning_functions: List[Callable[[str], str]]
+                         ) -> Iterator[Tuple[int, str]]:
+        """
+        Apply the cleaning functions to the text of each page, one page at a time.
+        """
         for page_num, text in texts:
             for cleaning_function in cleaning_functions:
                 text = cleaning_function(text)
-            cleaned_texts.append((page_num, text))
-
-        return cleaned_texts
+            yield page_num, text
 
     def texts_to_docs(self,
                       texts: List[Tuple[int, str]],
-                      embeddings: Any,
                       metadata: Dict[str, str]) -> List[docstore.Document]:
         """
         Split the text into chunks and return them as Documents.
+        In case of the parent retriever, the parent chunk embeddings are added later on by the DocumentWriter,
+        in batches
+        """
+        return list(self.iter_texts_to_docs(texts, metadata))
+
+    def iter_texts_to_docs(self,
+                           texts: Iterable[Tuple[int, str]],
+                           metadata: Dict[str, str]) -> Iterator[docstore.Document]:
+        """
+        Split the text into chunks and yield them as Documents, one page at a time.
         """
-        docs: List[docstore.Document] = []
         splitter_language = ut.LANGUAGE_MAP.get(metadata['Language'], 'english')
         splitter = SplitterCreator(self.text_splitter_method,
                                    self.chunk_size,
@@ -108,8 +169,6 @@ class Ingester:
                 # in case of parent retriever, split the parent chunk texts again, into smaller child chunk texts
                 # and add parent chunk text as metadata to child chunk text
                 if self.retriever_type == "parent":
-                    # determine parent chunk embedding. It needs to be stored as a string in the vector database
-                    parent_chunk_embedding = ','.join(str(x) for x in embeddings.embed_documents([chunk_text])[0])
                     # determine child chunks
                     child_chunk_texts = splitter_child.split_text(chunk_text)
                     # determine child document to store in the vector database
@@ -121,7 +180,6 @@ class Ingester:
                             "parent_chunk_num": chunk_num,
                             "parent_chunk": chunk_text,
                             "parent_chunk_id": f"{metadata['filename']}_p{page_num}_c{chunk_num}",
-                            "parent_chunk_embedding": parent_chunk_embedding,
                             "source": f"p{page_num}-{chunk_num}",
                             **metadata,
                         }
@@ -129,11 +187,11 @@ class Ingester:
                             page_content=child_chunk_text,
                             # metadata_combined = {"title": , "author": , "indicator_url": , "indicator_closed": ,
                             #                      "filename": , "Language": , "page_number": , "chunk": ,
-                            #                      "parent_chunk": , "parent_chunk_id", "parent_chunk_embedding: ,
-                            #                      "source": }
+                            #                      "parent_chunk": , "parent_chunk_id", "source": }
+                            # parent_chunk is moved to the parent store when the child chunk is written
                             metadata=metadata_combined
                         )
-                        docs.append(doc)
+                        yield doc
                 else:
                     # metadata = {"title": , "author": , "indicator_url": , "indicator_closed": , "filename": ,
                     #             "Language": }
@@ -149,39 +207,167 @@ class Ingester:
                         # "filename": , "Language": , "page_number": , "chunk": , "source": }
                         metadata=metadata_combined
                     )
-                    docs.append(doc)
+                    yield doc
                 chunk_num += 1
                 prv_page_num = page_num
 
-        return docs
+    def get_cleaning_functions(self) -> List[Callable[[str], str]]:
+        """
+        Returns the cleaning functions that are applied to the text of each page
+        text_cleaner.clean_text gives the same result as merge_hyphenated_words, fix_newlines and
+        remove_multiple_newlines applied one after another, in a single pass over the text
+        """
+        return [text_cleaner.clean_text]
 
-    def clean_texts_to_docs(self, raw_texts, embeddings, metadata) -> List[docstore.Document]:
+    def clean_texts_to_docs(self, raw_texts, metadata) -> List[docstore.Document]:
         """"
         Combines the functions clean_text and text_to_docs
         """
-        cleaning_functions: List = [
-            self.merge_hyphenated_words,
-            self.fix_newlines,
-            self.remove_multiple_newlines
-        ]
-        cleaned_texts = self.clean_texts(raw_texts, cleaning_functions)
+        cleaned_texts = self.clean_texts(raw_texts, self.get_cleaning_functions())
         # for cleaned_text in cleaned_texts:
         #     cleaned_chunks = self.split_text_into_chunks(cleaned_text, metadata)
-        docs = self.texts_to_docs(cleaned_texts, embeddings, metadata)
+        docs = self.texts_to_docs(cleaned_texts, metadata)
 
         return docs
 
-    def ingest(self) -> None:
+    def iter_clean_texts_to_docs(self, raw_texts, metadata) -> Iterator[docstore.Document]:
+        """"
+        Streaming variant of clean_texts_to_docs: pages -> cleaned pages -> chunks
+        """
+        cleaned_texts = self.iter_clean_texts(raw_texts, self.get_cleaning_functions())
+
+        return self.iter_texts_to_docs(cleaned_texts, metadata)
+
+    def get_parse_cache(self) -> ParseCache | None:
+        """
+        Returns the parse cache, or None if the parse cache is not used
+        """
+        if self.use_parse_cache and self.parse_cache is None:
+            self.parse_cache = ParseCache(settings.PARSE_CACHE_PATH, settings.PARSE_CACHE_MAX_SIZE_MB)
+
+        return self.parse_cache
+
+    def file_to_docs(self, file_parser: FileParser, file_path: str, file_hash: str = None) -> List[docstore.Document]:
+        """
+        Parses, cleans and splits one file into chunks
+        The cleaned text of files that were parsed before (for any vector store) is taken from the parse cache
+        """
+        parse_cache = self.get_parse_cache()
+        if parse_cache is not None:
+            file_hash = ut.get_file_hash(file_path) if file_hash is None else file_hash
+            cached = parse_cache.get(file_path, file_hash)
+            if cached is not None:
+                cleaned_texts, metadata = cached
+                return self.texts_to_docs(cleaned_texts, metadata)
+        # extract raw text pages and metadata according to file type
+        raw_texts, metadata = file_parser.parse_file(file_path)
+        cleaned_texts = self.clean_texts(raw_texts, self.get_cleaning_functions())
+        if parse_cache is not None:
+            parse_cache.put(file_path, cleaned_texts, metadata, file_hash)
+
+        return self.texts_to_docs(cleaned_texts, metadata)
+
+    def iter_file_to_docs(self, file_parser: FileParser, file_path: str,
+                          file_hash: str = None) -> Iterator[docstore.Document]:
+        """
+        Streaming variant of file_to_docs, the chunks are created while the generator is consumed
+        Texts from the parse cache are used, but streamed files are not added to the parse cache, as that would
+        require the complete text of the file in memory
+        """
+        parse_cache = self.get_parse_cache()
+        if parse_cache is not None:
+            cached = parse_cache.get(file_path, file_hash)
+            if cached is not None:
+                cleaned_texts, metadata = cached
+                return self.iter_texts_to_docs(cleaned_texts, metadata)
+        # extract raw text pages and metadata according to file type
+        raw_texts, metadata = file_parser.iter_file(file_path)
+
+        return self.iter_clean_texts_to_docs(raw_texts, metadata)
+
+    def checkpoint(self, manifest: FileManifest, files: List[str], file_states: Dict[str, Dict] = None) -> None:
+        """
+        Records the state of files that are committed to the vector store in the file manifest and saves it, so that
+        an interrupted ingest run resumes after the last committed file
+        The state of a file is the one from before its content was read, if given in file_states, so that a file that
+        was modified during the ingest run is ingested again in the next run
+        """
+        file_states = {} if file_states is None else file_states
+        for file in files:
+            manifest.update(self.content_folder, file, file_state=file_states.pop(file, None))
+        manifest.save()
+
+    def remove_files_from_store(self, vector_store: VectorStore, catalog: DocumentCatalog,
+                                files: List[str]) -> List[str]:
+        """
+        Removes the chunks of the given files from the vector store and the stores next to it
+        Files with near-duplicates of chunks of the given files (which are not stored themselves) are removed as well
+
+        Parameters
+        ----------
+        vector_store : VectorStore
+            the vector store
+        catalog : DocumentCatalog
+            the document catalog of the vector store
+        files : List[str]
+            names of the files to remove
+
+        Returns
+        -------
+        List[str]
+            names of the other files that were removed because they depend on chunks of the given files
+        """
+        # the index of near-duplicates only exists if chunks were ingested with dedup_chunks
+        deduplicator = None
+        if self.dedup_chunks or has_dedup_index(self.vecdb_folder):
+            deduplicator = ChunkDeduplicator(self.vecdb_folder)
+        dependent_files = deduplicator.get_dependent_files(files) if deduplicator is not None else []
+        if len(dependent_files) > 0:
+            logger.info(f"Removing {len(dependent_files)} files with near-duplicates of chunks of the removed files")
+        files_to_remove = files + dependent_files
+        chunk_ids = catalog.get_chunk_ids(files_to_remove)
+        # in case of an interrupted ingest, only part of the registered chunks may have been added
+        idx_id_to_delete = []
+        for start in range(0, len(chunk_ids), 10000):
+            idx_id_to_delete.extend(vector_store.get(ids=chunk_ids[start:start + 10000], include=[])["ids"])
+        if len(idx_id_to_delete) > 0:
+            vector_store.delete(idx_id_to_delete)
+        ParentStore(self.vecdb_folder).remove_files(files_to_remove)
+        # the keyword index only exists if the vector store was ever ingested for the hybrid retriever
+        if has_bm25_index(self.vecdb_folder):
+            get_bm25_index(self.vecdb_folder).remove_files(files_to_remove)
+        if deduplicator is not None:
+            deduplicator.remove_files(files_to_remove)
+        catalog.remove_files(files_to_remove)
+
+        return dependent_files
+
+    def ingest(self) -> Dict[str, int]:
         """
         Ingests all relevant files in the folder
         Checks are done whether vector store needs to be synchronized with folder contents
+        Files that were added, removed or modified (according to the file manifest) are synchronized
+
+        Returns
+        -------
+        Dict[str, int]
+            statistics of the ingest run: the number of files added, modified, deleted and rolled back and the
+            number of chunks written to the vector store
         """
         # get embeddings
-        embeddings = EmbeddingsCreator(self.embeddings_provider,
-                                       self.embeddings_model).get_embeddings()
+        embeddings = self.embeddings
+        if embeddings is None:
+            embeddings = EmbeddingsCreator(self.embeddings_provider,
+                                           self.embeddings_model).get_embeddings()
 
-        # create empty list representing added files
+        # create empty lists representing added, deleted, modified and rolled back files
         new_files = []
+        files_deleted = []
+        files_modified = []
+        files_uncommitted = []
+        num_chunks_written = 0
+        # the file manifest is stored next to the vector store
+        manifest = FileManifest(self.vecdb_folder)
 
         # get all relevant files in the folder
         relevant_files_in_folder = ut.get_relevant_files_in_folder(self.content_folder)
@@ -192,24 +378,36 @@ class Ingester:
                                                                                self.collection_name,
                                                                                self.vecdb_folder)
             logger.info(f"Vector store already exists for specified settings and folder {self.content_folder}")
+            # the document catalog keeps track of the files in the vector store
+            catalog = DocumentCatalog(self.vecdb_folder)
+            if not catalog.is_initialized():
+                # vector store was created before the catalog existed, scan it once
+                catalog.initialize(vector_store.get(include=["metadatas"]))
+            # roll back files of which the ingest was interrupted, they are ingested again below
+            files_uncommitted = catalog.get_uncommitted_files()
+            if len(files_uncommitted) > 0:
+                logger.info(f"Rolling back {len(files_uncommitted)} files of an interrupted ingest")
+                self.remove_files_from_store(vector_store, catalog, files_uncommitted)
             # determine the files that are added or deleted
-            collection = vector_store.get()  # dict_keys(['ids', 'embeddings', 'documents', 'metadatas'])
-            files_in_store = [metadata['filename'] for metadata in collection['metadatas']]
-            files_in_store = list(set(files_in_store))
+            files_in_store = catalog.get_files()
             # check if files were added or removed
             new_files = [file for file in relevant_files_in_folder if file not in files_in_store]
             files_deleted = [file for file in files_in_store if file not in relevant_files_in_folder]
-            # delete all chunks from the vector store that belong to files removed from the folder
-            if len(files_deleted) > 0:
-                logger.info(f"Files are deleted, so vector store for {self.content_folder} needs to be updated")
-                idx_id_to_delete = []
-                for idx in range(len(collection['ids'])):
-                    idx_id = collection['ids'][idx]
-                    idx_metadata = collection['metadatas'][idx]
-                    if idx_metadata['filename'] in files_deleted:
-                        idx_id_to_delete.append(idx_id)
-                vector_store.delete(idx_id_to_delete)
+            # check if files in the vector store were modified since they were ingested
+            files_modified = manifest.get_modified_files(self.content_folder,
+                                                         [file for file in relevant_files_in_folder
+                                                          if file in files_in_store])
+            manifest.remove(files_deleted)
+            # delete all chunks from the vector store that belong to files removed from the folder or modified
+            if len(files_deleted) > 0 or len(files_modified) > 0:
+                logger.info(f"Files are deleted or modified, so vector store for {self.content_folder} needs to be "
+                            "updated")
+                dependent_files = self.remove_files_from_store(vector_store, catalog, files_deleted + files_modified)
+                # files that had near-duplicates of chunks of the removed files are ingested again
+                files_modified.extend(file for file in dependent_files if file in relevant_files_in_folder)
                 logger.info("Deleted files from vectorstore")
+            # modified files are ingested again
+            new_files.extend(files_modified)
         # else it needs to be created first
         else:
             logger.info(f"Vector store to be created for folder {self.content_folder}")
@@ -217,25 +415,68 @@ class Ingester:
             vector_store = VectorStoreCreator(self.vecdb_type).get_vectorstore(embeddings,
                                                                                self.collection_name,
                                                                                self.vecdb_folder)
+            catalog = DocumentCatalog(self.vecdb_folder)
+            catalog.initialize()
             # all relevant files in the folder are to be ingested into the vector store
             new_files = list(relevant_files_in_folder)
 
+        # the keyword index of the hybrid retriever is built once and then kept up to date with the vector store
+        bm25_index = None
+        if self.retriever_type == "hybrid" or has_bm25_index(self.vecdb_folder):
+            bm25_index = get_bm25_index(self.vecdb_folder)
+            if self.retriever_type == "hybrid" and not bm25_index.is_initialized():
+                bm25_index.initialize(vector_store.get(include=["documents", "metadatas"]))
+
         # If there are any files to be ingested into the vector store
         if len(new_files) > 0:
             logger.info(f"Files are added, so vector store for {self.content_folder} needs to be updated")
-            # create FileParser object
-            file_parser = FileParser()
-
-            for file in new_files:
-                file_path = os.path.join(self.content_folder, file)
-                # extract raw text pages and metadata according to file type
-                raw_texts, metadata = file_parser.parse_file(file_path)
-                documents = self.clean_texts_to_docs(raw_texts, embeddings, metadata)
-                logger.info(f"Extracted {len(documents)} chunks from {file}")
-                vector_store.add_documents(
-                    documents=documents,
-                    embedding=embeddings,
-                    collection_name=self.collection_name,
-                    persist_directory=self.vecdb_folder,
-                )
+            # register the files to ingest, so that an interrupted ingest run can be resumed
+            catalog.set_pending(new_files)
+            # state (size, modification time and content hash) of each file before it was read
+            file_states: Dict[str, Dict] = {}
+            # a single writer adds the chunks of all files to the vector store in batches
+            writer = DocumentWriter(vector_store, self.batch_size,
+                                    parent_store=ParentStore(self.vecdb_folder) if self.retriever_type == "parent"
+                                    else None,
+                                    parent_embeddings=embeddings if self.retriever_type == "parent" else None,
+                                    catalog=catalog,
+                                    on_files_committed=lambda files: self.checkpoint(manifest, files, file_states),
+                                    deduplicator=ChunkDeduplicator(self.vecdb_folder, self.dedup_threshold)
+                                    if self.dedup_chunks else None,
+                                    bm25_index=bm25_index if bm25_index is not None and bm25_index.is_initialized()
+                                    else None)
+            if self.num_workers > 1 and len(new_files) > 1:
+                # parse, clean and split files in a process pool, files finish in any order
+                logger.info(f"Ingesting {len(new_files)} files with {self.num_workers} worker processes")
+                # workers load the language models once, not for every file
+                with ProcessPoolExecutor(max_workers=self.num_workers, initializer=ut.warm_up) as executor:
+                    futures = {executor.submit(_file_to_docs_worker, self, os.path.join(self.content_folder, file)):
+                               file for file in new_files}
+                    for future in as_completed(futures):
+                        documents, file_states[futures[future]] = future.result()
+                        writer.write(futures[future], documents)
+            else:
+                # create FileParser object
+                file_parser = FileParser()
+                for file in new_files:
+                    file_path = os.path.join(self.content_folder, file)
+                    file_states[file] = FileManifest.get_file_state(file_path)
+                    if self.streaming:
+                        # pages -> cleaned pages -> chunks are generated while the writer consumes them,
+                        # so memory use is bounded by the batch size instead of the document size
+                        writer.write(file, self.iter_file_to_docs(file_parser, file_path, file_states[file]["hash"]))
+                    else:
+                        writer.write(file, self.file_to_docs(file_parser, file_path, file_states[file]["hash"]))
+            writer.flush()
+            num_chunks_written = writer.num_chunks_written
             logger.info("Added files to vectorstore")
+        manifest.save()
+        # queriers rebuild their cached chains when the generation of the vector store has changed
+        if len(new_files) > 0 or len(files_deleted) > 0 or len(files_uncommitted) > 0:
+            ut.bump_ingest_generation(self.vecdb_folder)
+
+        return {"files_added": len(new_files) - len(files_modified),
+                "files_modified": len(files_modified),
+                "files_deleted": len(files_deleted),
+                "files_rolled_back": len(files_uncommitted),
+                "chunks_written": num_chunks_written}
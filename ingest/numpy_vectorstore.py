@@ -0,0 +1,501 @@
+"""
+NumpyVectorStore class
+Vector store that keeps the normalized vectors of a collection in a memory-mapped .npy matrix and the ids, texts and
+metadata of the chunks in a SQLite sidecar. Queries are answered with an exact, brute-force search, or with a first
+pass over int8 or binary quantized vectors and exact re-scoring of the candidates
+"""
+import os
+import json
+import struct
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from loguru import logger
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+# local imports
+import settings
+
+# size of the .npy header, fixed so that the shape in the header can be updated in place when rows are appended
+NPY_HEADER_SIZE = 128
+# maximum number of variables in one SQLite query
+SQLITE_BATCH_SIZE = 10000
+# number of rows that is scored at once in the quantized search pass, small enough for the converted block to stay
+# in the CPU cache
+SEARCH_BLOCK_SIZE = 4096
+# the arrays stored per row: full precision vectors, int8 quantized vectors with their scales and binary signatures
+ARRAY_NAMES = ("vectors", "int8", "scales", "binary")
+# number of set bits of each byte value
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def _write_npy_header(file, shape: Tuple[int, ...], descr: str) -> None:
+    """
+    writes the header of an .npy file with the given shape and data type at the start of the file
+    """
+    header = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': {shape}, }}"
+    header = header.ljust(NPY_HEADER_SIZE - 11) + "\n"
+    file.seek(0)
+    file.write(b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1"))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """
+    returns the vectors scaled to unit length, so that the inner product is the cosine similarity
+    """
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+
+    return (vectors / norms).astype(np.float32)
+
+
+def quantize(vectors: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    returns the arrays that are stored for the given normalized vectors: the vectors themselves, the int8 scalar
+    quantization with one scale per vector (vector ~ scale * int8 vector) and the 1-bit signatures (the signs of the
+    components), packed in bytes
+    """
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+
+    return {"vectors": vectors,
+            "int8": np.round(vectors / scales[:, None]).astype(np.int8),
+            "scales": scales.astype(np.float32),
+            "binary": np.packbits(vectors > 0, axis=1)}
+
+
+# Chroma style where operators, applied to the distinct values of a metadata key
+_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "$eq": lambda value, operand: value == operand,
+    "$ne": lambda value, operand: value != operand,
+    "$gt": lambda value, operand: value > operand,
+    "$gte": lambda value, operand: value >= operand,
+    "$lt": lambda value, operand: value < operand,
+    "$lte": lambda value, operand: value <= operand,
+    "$in": lambda value, operand: value in operand,
+    "$nin": lambda value, operand: value not in operand,
+}
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    LangChain vector store with exact cosine similarity search over a memory-mapped float32 matrix
+    Row i of the matrix holds the normalized vector of the chunk with row i in the SQLite sidecar. Deleted rows are
+    masked out and removed from the matrix when they make up more than half of it. Metadata filters are evaluated on
+    columns of the metadata that are read once from the sidecar and kept as integer codes per distinct value.
+    Other processes see the changes of the (single) writing process: the matrix and the columns are reloaded when the
+    sidecar has changed. The same where filters as Chroma can be used, and scores are cosine distances like in a
+    Chroma collection with "hnsw:space" set to "cosine"
+    With quantization "int8" or "binary", the first search pass only reads the quantized vectors (a quarter and a
+    thirty-second of the size of the float32 vectors), and rescore_factor * k candidates are re-scored with their full
+    precision vectors, which are read from disk for the candidates only
+    """
+    def __init__(self, collection_name: str, embedding_function: Embeddings, vecdb_folder: str,
+                 quantization: str = None, rescore_factor: int = None) -> None:
+        if vecdb_folder is None:
+            raise ValueError("NumpyVectorStore needs a folder to store the vectors in")
+        os.makedirs(vecdb_folder, exist_ok=True)
+        self.collection_name = collection_name
+        self.embedding_function = embedding_function
+        self.vecdb_folder = vecdb_folder
+        self.quantization = settings.VECDB_QUANTIZATION if quantization is None else quantization
+        self.rescore_factor = settings.VECDB_RESCORE_FACTOR if rescore_factor is None else rescore_factor
+        if self.quantization not in ("none", "int8", "binary"):
+            raise ValueError(f"Unknown quantization {self.quantization}")
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(os.path.join(vecdb_folder, f"numpy_{collection_name}.sqlite"), timeout=60,
+                                          check_same_thread=False)
+        with self.lock:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS chunks "
+                                    "(row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, document TEXT, metadata TEXT)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS deleted_rows (row INTEGER PRIMARY KEY)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS store_info (key TEXT PRIMARY KEY, value)")
+            self.connection.execute("INSERT OR IGNORE INTO store_info VALUES ('num_rows', 0), ('dim', 0), "
+                                    "('generation', 0)")
+            self.connection.commit()
+        # state of the sidecar that the loaded matrix and columns belong to
+        self.data_version = None
+        self.num_rows = 0
+        self.dim = 0
+        self.generation = 0
+        self.arrays: Dict[str, np.ndarray] = {}
+        self.vectors = np.empty((0, 0), dtype=np.float32)
+        self.valid = np.zeros(0, dtype=bool)
+        # metadata key -> (codes per row, distinct values)
+        self.columns: Dict[str, Tuple[np.ndarray, List[Any]]] = {}
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding_function
+
+    def get_array_path(self, name: str, generation: int) -> str:
+        """
+        returns the path of the .npy file of an array, new files are written for each generation (when deleted rows
+        are removed)
+        """
+        return os.path.join(self.vecdb_folder, f"numpy_{self.collection_name}_{name}_{generation}.npy")
+
+    def _load(self) -> None:
+        """
+        (re)loads the matrix and the mask of valid rows, should be called with the lock held
+        """
+        info = dict(self.connection.execute("SELECT key, value FROM store_info").fetchall())
+        self.num_rows, self.dim, self.generation = int(info["num_rows"]), int(info["dim"]), int(info["generation"])
+        self.arrays = {}
+        for name in ARRAY_NAMES:
+            array_path = self.get_array_path(name, self.generation)
+            if self.num_rows > 0 and os.path.exists(array_path):
+                array = np.load(array_path, mmap_mode="r")
+                # arrays that do not cover all rows are not used
+                if len(array) >= self.num_rows:
+                    self.arrays[name] = array[:self.num_rows]
+        self.vectors = self.arrays.get("vectors", np.empty((0, self.dim), dtype=np.float32))
+        self.valid = np.zeros(self.num_rows, dtype=bool)
+        self.valid[:len(self.vectors)] = True
+        deleted_rows = np.array([row for (row,) in self.connection.execute("SELECT row FROM deleted_rows")],
+                                dtype=np.int64)
+        self.valid[deleted_rows[deleted_rows < self.num_rows]] = False
+        self.columns = {}
+        self.data_version = self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def _refresh(self) -> None:
+        """
+        reloads the matrix if the sidecar was changed by another connection since it was loaded
+        """
+        with self.lock:
+            if self.data_version != self.connection.execute("PRAGMA data_version").fetchone()[0]:
+                self._load()
+
+    def _get_column(self, key: str) -> Tuple[np.ndarray, List[Any]]:
+        """
+        returns the codes of the values of a metadata key for all rows and the distinct values the codes refer to
+        """
+        with self.lock:
+            if key not in self.columns:
+                distinct_values: Dict[Any, int] = {None: 0}
+                codes = np.zeros(self.num_rows, dtype=np.int32)
+                for row, value in self.connection.execute("SELECT row, json_extract(metadata, ?) FROM chunks "
+                                                          "WHERE row < ?", (f'$."{key}"', self.num_rows)):
+                    codes[row] = distinct_values.setdefault(value, len(distinct_values))
+                self.columns[key] = (codes, list(distinct_values.keys()))
+
+            return self.columns[key]
+
+    def _filter_mask(self, where: Dict[str, Any]) -> np.ndarray:
+        """
+        returns the mask of the rows that match a Chroma style where filter, e.g. {"filename": {"$in": [...]}}
+        """
+        mask = np.ones(self.num_rows, dtype=bool)
+        for key, condition in where.items():
+            if key in ("$and", "$or"):
+                masks = [self._filter_mask(sub_where) for sub_where in condition]
+                mask &= np.logical_and.reduce(masks) if key == "$and" else np.logical_or.reduce(masks)
+                continue
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            codes, distinct_values = self._get_column(key)
+            for operator, operand in condition.items():
+                if operator not in _OPERATORS:
+                    raise ValueError(f"Unsupported operator {operator} in filter {where}")
+                matching_codes = [code for code, value in enumerate(distinct_values)
+                                  if value is not None and _OPERATORS[operator](value, operand)]
+                mask &= np.isin(codes, matching_codes)
+
+        return mask
+
+    def _fetch(self, rows: Iterable[int]) -> Dict[int, Tuple[str, str, Dict[str, Any]]]:
+        """
+        returns the id, text and metadata of the given rows
+        """
+        rows = [int(row) for row in rows]
+        result = {}
+        for start in range(0, len(rows), SQLITE_BATCH_SIZE):
+            batch = rows[start:start + SQLITE_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            with self.lock:
+                for row, chunk_id, document, metadata in self.connection.execute(
+                        f"SELECT row, id, document, metadata FROM chunks WHERE row IN ({placeholders})", batch):
+                    result[row] = (chunk_id, document, json.loads(metadata))
+
+        return result
+
+    def _approximate_similarities(self, arrays: Dict[str, np.ndarray], query_vector: np.ndarray) -> np.ndarray:
+        """
+        returns the similarities of the query vector to all rows, computed from the quantized vectors
+        For binary signatures, the similarity is minus the Hamming distance of the signatures
+        """
+        if self.quantization == "int8":
+            quantized, scales = arrays["int8"], arrays["scales"]
+        else:
+            quantized, query_signature = arrays["binary"], np.packbits(query_vector > 0)
+        similarities = np.empty(len(quantized), dtype=np.float32)
+        for start in range(0, len(quantized), SEARCH_BLOCK_SIZE):
+            block = quantized[start:start + SEARCH_BLOCK_SIZE]
+            if self.quantization == "int8":
+                similarities[start:start + len(block)] = (block.astype(np.float32) @ query_vector) * \
+                    scales[start:start + len(block)]
+            else:
+                similarities[start:start + len(block)] = -POPCOUNT[block ^ query_signature].sum(axis=1,
+                                                                                               dtype=np.int32)
+
+        return similarities
+
+    def _search(self, query_vector: List[float], k: int,
+                where: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        returns the rows of the k most similar chunks and their cosine similarities, most similar first
+        """
+        self._refresh()
+        arrays, vectors, valid = self.arrays, self.vectors, self.valid
+        if len(vectors) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        mask = valid if where is None else valid & self._filter_mask(where)
+        k = min(k, int(np.count_nonzero(mask)))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query_vector = _normalize(np.asarray(query_vector, dtype=np.float32))
+        if self.quantization != "none" and all(name in arrays for name in ("int8", "scales", "binary")):
+            # first pass over the quantized vectors, then exact re-scoring of the candidates
+            similarities = self._approximate_similarities(arrays, query_vector)
+            similarities[~mask] = -np.inf
+            num_candidates = min(k * self.rescore_factor, int(np.count_nonzero(mask)))
+            # sorted, so that the full precision vectors are read from disk in file order
+            candidate_rows = np.sort(np.argpartition(-similarities, num_candidates - 1)[:num_candidates])
+            candidate_similarities = vectors[candidate_rows] @ query_vector
+            top = np.argsort(-candidate_similarities)[:k]
+
+            return candidate_rows[top], candidate_similarities[top]
+        similarities = vectors @ query_vector
+        similarities[~mask] = -np.inf
+        top_rows = np.argpartition(-similarities, k - 1)[:k]
+        top_rows = top_rows[np.argsort(-similarities[top_rows])]
+
+        return top_rows, similarities[top_rows]
+
+    def _rows_to_documents(self, rows: np.ndarray) -> List[Document]:
+        """
+        returns the chunks of the given rows as documents, in the same order
+        """
+        chunks = self._fetch(rows)
+
+        return [Document(page_content=chunks[row][1], metadata=chunks[row][2]) for row in rows.tolist()]
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        """
+        Embeds the texts and appends their vectors to the matrix and their texts and metadata to the sidecar
+        """
+        texts = list(texts)
+        if len(texts) == 0:
+            return []
+        if ids is None:
+            raise ValueError("NumpyVectorStore needs the ids of the chunks to add")
+        self.add_vectors(self.embedding_function.embed_documents(texts), texts, metadatas, ids)
+
+        return list(ids)
+
+    def add_vectors(self, vectors: List[List[float]] | np.ndarray, texts: List[str],
+                    metadatas: Optional[List[dict]], ids: List[str]) -> None:
+        """
+        Appends already embedded chunks, chunks with an id that is already in the store replace the stored chunk
+
+        Parameters
+        ----------
+        vectors : List[List[float]] | np.ndarray
+            the embeddings of the chunks
+        texts : List[str]
+            the texts of the chunks
+        metadatas : Optional[List[dict]]
+            the metadata of the chunks
+        ids : List[str]
+            the ids of the chunks
+        """
+        metadatas = [{} for _ in texts] if metadatas is None else metadatas
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        with self.lock:
+            self._load()
+            if self.dim not in (0, vectors.shape[1]):
+                raise ValueError(f"Vectors of dimension {vectors.shape[1]} cannot be added to a vector store with "
+                                 f"dimension {self.dim}")
+            for name, array in quantize(vectors).items():
+                # quantized arrays are not added to a store that was created without them
+                if self.num_rows == 0 or name in self.arrays:
+                    self._append_rows(name, array)
+            for start in range(0, len(ids), SQLITE_BATCH_SIZE):
+                batch = list(ids[start:start + SQLITE_BATCH_SIZE])
+                self.connection.execute(f"INSERT OR IGNORE INTO deleted_rows SELECT row FROM chunks "
+                                        f"WHERE id IN ({','.join('?' * len(batch))})", batch)
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO chunks (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                [(self.num_rows + i, chunk_id, text, json.dumps(metadata))
+                 for i, (chunk_id, text, metadata) in enumerate(zip(ids, texts, metadatas))])
+            self.connection.execute("UPDATE store_info SET value = ? WHERE key = 'num_rows'",
+                                    (self.num_rows + len(vectors),))
+            self.connection.execute("UPDATE store_info SET value = ? WHERE key = 'dim'", (vectors.shape[1],))
+            self.connection.commit()
+            self._load()
+
+    def _append_rows(self, name: str, array: np.ndarray) -> None:
+        """
+        appends rows to the .npy file of an array and updates the shape in its header, should be called with the
+        lock held
+        """
+        array_path = self.get_array_path(name, self.generation)
+        expected_size = NPY_HEADER_SIZE + self.num_rows * array[0].nbytes
+        with open(array_path, "r+b" if os.path.exists(array_path) else "w+b") as file:
+            # rows beyond num_rows belong to an interrupted add and are overwritten
+            if os.path.getsize(array_path) != expected_size:
+                file.truncate(expected_size)
+            file.seek(0, os.SEEK_END)
+            file.write(np.ascontiguousarray(array).tobytes())
+            _write_npy_header(file, (self.num_rows + len(array),) + array.shape[1:], array.dtype.str)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """
+        Deletes the chunks with the given ids, the rows are masked until the matrix is compacted
+        """
+        if ids is None:
+            return False
+        with self.lock:
+            for start in range(0, len(ids), SQLITE_BATCH_SIZE):
+                batch = list(ids[start:start + SQLITE_BATCH_SIZE])
+                placeholders = ",".join("?" * len(batch))
+                self.connection.execute(f"INSERT OR IGNORE INTO deleted_rows SELECT row FROM chunks "
+                                        f"WHERE id IN ({placeholders})", batch)
+                self.connection.execute(f"DELETE FROM chunks WHERE id IN ({placeholders})", batch)
+            self.connection.commit()
+            self._load()
+            num_deleted = self.connection.execute("SELECT COUNT(*) FROM deleted_rows").fetchone()[0]
+            if num_deleted > self.num_rows // 2:
+                self._compact()
+
+        return True
+
+    def _compact(self) -> None:
+        """
+        writes the valid rows to a new matrix and renumbers the rows in the sidecar, should be called with the lock held
+        """
+        rows = np.flatnonzero(self.valid)
+        old_array_paths = [self.get_array_path(name, self.generation) for name in self.arrays]
+        for name, array in self.arrays.items():
+            with open(self.get_array_path(name, self.generation + 1), "w+b") as file:
+                _write_npy_header(file, (len(rows),) + array.shape[1:], array.dtype.str)
+                for start in range(0, len(rows), SEARCH_BLOCK_SIZE):
+                    file.write(np.ascontiguousarray(array[rows[start:start + SEARCH_BLOCK_SIZE]]).tobytes())
+        self.arrays = {}
+        self.vectors = np.empty((0, self.dim), dtype=np.float32)
+        # rows are renumbered in ascending order, so a new row number is never taken by a row that is not moved yet
+        self.connection.executemany("UPDATE chunks SET row = ? WHERE row = ?",
+                                    [(new_row, int(old_row)) for new_row, old_row in enumerate(rows)])
+        self.connection.execute("DELETE FROM deleted_rows")
+        self.connection.execute("UPDATE store_info SET value = ? WHERE key = 'num_rows'", (len(rows),))
+        self.connection.execute("UPDATE store_info SET value = ? WHERE key = 'generation'", (self.generation + 1,))
+        self.connection.commit()
+        self._load()
+        for old_array_path in old_array_paths:
+            try:
+                os.remove(old_array_path)
+            except OSError:
+                # the old file can still be memory-mapped by another process
+                logger.warning(f"Could not remove {old_array_path}")
+        logger.info(f"Compacted vector store {self.collection_name} to {len(rows)} rows")
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            include: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Returns the chunks with the given ids and/or matching the where filter, in the same format as Chroma.get
+
+        Parameters
+        ----------
+        ids : Optional[List[str]]
+            ids of the chunks to return
+        where : Optional[Dict[str, Any]]
+            Chroma style metadata filter
+        limit : Optional[int]
+            maximum number of chunks to return
+        offset : Optional[int]
+            number of matching chunks to skip
+        include : Optional[List[str]]
+            which of "embeddings", "metadatas" and "documents" to return, by default metadatas and documents
+
+        Returns
+        -------
+        Dict[str, Any]
+            dictionary with keys 'ids', 'embeddings', 'metadatas' and 'documents'
+        """
+        include = ["metadatas", "documents"] if include is None else include
+        self._refresh()
+        if ids is not None:
+            rows = []
+            for start in range(0, len(ids), SQLITE_BATCH_SIZE):
+                batch = list(ids[start:start + SQLITE_BATCH_SIZE])
+                placeholders = ",".join("?" * len(batch))
+                with self.lock:
+                    rows.extend(row for (row,) in self.connection.execute(
+                        f"SELECT row FROM chunks WHERE id IN ({placeholders}) AND row < ?", batch + [self.num_rows]))
+            rows = np.sort(np.array(rows, dtype=np.int64))
+        else:
+            rows = np.flatnonzero(self.valid)
+        if where is not None:
+            rows = rows[self._filter_mask(where)[rows]]
+        start = 0 if offset is None else offset
+        rows = rows[start:] if limit is None else rows[start:start + limit]
+        chunks = self._fetch(rows)
+
+        return {"ids": [chunks[row][0] for row in rows.tolist()],
+                "embeddings": self.vectors[rows].tolist() if "embeddings" in include else None,
+                "metadatas": [chunks[row][2] for row in rows.tolist()] if "metadatas" in include else None,
+                "documents": [chunks[row][1] for row in rows.tolist()] if "documents" in include else None}
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None,
+                          **kwargs: Any) -> List[Document]:
+        return [document for document, _ in self.similarity_search_with_score(query, k, filter=filter)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4,
+                                    filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        rows, _ = self._search(embedding, k, filter)
+
+        return self._rows_to_documents(rows)
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        """
+        Returns the k most similar chunks with their cosine distance to the query
+        """
+        rows, similarities = self._search(self.embedding_function.embed_query(query), k, filter)
+
+        return list(zip(self._rows_to_documents(rows), (1.0 - similarities).tolist()))
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        return self._cosine_relevance_score_fn
+
+    def max_marginal_relevance_search(self, query: str, k: int = 4, fetch_k: int = 20, lambda_mult: float = 0.5,
+                                      filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(self.embedding_function.embed_query(query), k, fetch_k,
+                                                            lambda_mult, filter=filter)
+
+    def max_marginal_relevance_search_by_vector(self, embedding: List[float], k: int = 4, fetch_k: int = 20,
+                                                lambda_mult: float = 0.5, filter: Optional[Dict[str, Any]] = None,
+                                                **kwargs: Any) -> List[Document]:
+        rows, _ = self._search(embedding, fetch_k, filter)
+        if len(rows) == 0:
+            return []
+        selected = maximal_marginal_relevance(np.asarray(embedding, dtype=np.float32), np.asarray(self.vectors[rows]),
+                                              k=k, lambda_mult=lambda_mult)
+
+        return self._rows_to_documents(rows[selected])
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   collection_name: str = "langchain", vecdb_folder: str = None, ids: Optional[List[str]] = None,
+                   **kwargs: Any) -> "NumpyVectorStore":
+        vector_store = cls(collection_name, embedding, vecdb_folder)
+        if ids is None:
+            ids = [str(i) for i in range(len(texts))]
+        vector_store.add_texts(texts, metadatas, ids)
+
+        return vector_store
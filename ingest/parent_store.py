@@ -0,0 +1,94 @@
+"""
+ParentStore class
+Deduplicated store of the parent chunks of a vector store for the parent retriever, stored next to the vector store
+"""
+import os
+import zlib
+import sqlite3
+import threading
+from typing import Dict, List
+import numpy as np
+
+
+class ParentStore:
+    """
+    Stores each parent chunk once, keyed by parent_chunk_id, with its text zlib-compressed and its embedding as
+    float32 vector. The child chunks in the vector store only refer to their parent with the parent_chunk_id metadata
+    """
+    def __init__(self, vecdb_folder: str, store_name: str = "parent_store.sqlite") -> None:
+        os.makedirs(vecdb_folder, exist_ok=True)
+        self.store_path = os.path.join(vecdb_folder, store_name)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.store_path, timeout=60, check_same_thread=False)
+        with self.lock:
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS parents (
+                                           id TEXT PRIMARY KEY,
+                                           filename TEXT NOT NULL,
+                                           text BLOB NOT NULL,
+                                           vector BLOB)""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_parents_filename ON parents (filename)")
+            self.connection.commit()
+
+    def add_parents(self, ids: List[str], filenames: List[str], texts: List[str],
+                    vectors: List[List[float]] = None) -> None:
+        """
+        Adds parent chunks to the store, existing parent chunks with the same id are replaced
+
+        Parameters
+        ----------
+        ids : List[str]
+            the parent_chunk_id of each parent chunk
+        filenames : List[str]
+            the name of the file of each parent chunk
+        texts : List[str]
+            the text of each parent chunk
+        vectors : List[List[float]], optional
+            the embedding of each parent chunk
+        """
+        if vectors is None:
+            vectors = [None] * len(ids)
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO parents (id, filename, text, vector) VALUES (?, ?, ?, ?)",
+                [(parent_id, filename, zlib.compress(text.encode("utf-8")),
+                  None if vector is None else np.asarray(vector, dtype=np.float32).tobytes())
+                 for parent_id, filename, text, vector in zip(ids, filenames, texts, vectors)])
+            self.connection.commit()
+
+    def remove_files(self, filenames: List[str]) -> None:
+        """
+        Removes the parent chunks of the given files
+        """
+        with self.lock:
+            self.connection.executemany("DELETE FROM parents WHERE filename = ?", [(f,) for f in filenames])
+            self.connection.commit()
+
+    def _select(self, column: str, ids: List[str]) -> Dict[str, bytes]:
+        """
+        returns the raw value of the given column for the given parent chunk ids that are in the store
+        """
+        result = {}
+        with self.lock:
+            # stay below the SQLite limit on the number of query parameters
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.connection.execute(f"SELECT id, {column} FROM parents WHERE id IN ({placeholders})",
+                                               batch).fetchall()
+                result.update(rows)
+
+        return result
+
+    def get_texts(self, ids: List[str]) -> Dict[str, str]:
+        """
+        Returns the texts of the given parent chunk ids with one lookup, ids that are not in the store are left out
+        """
+        return {parent_id: zlib.decompress(text).decode("utf-8")
+                for parent_id, text in self._select("text", ids).items()}
+
+    def get_vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Returns the embeddings of the given parent chunk ids, ids without embedding are left out
+        """
+        return {parent_id: np.frombuffer(vector, dtype=np.float32)
+                for parent_id, vector in self._select("vector", ids).items() if vector is not None}
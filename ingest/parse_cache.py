@@ -0,0 +1,93 @@
+"""
+ParseCache class
+Persistent on-disk cache of the parsed and cleaned text of files, shared by all vector stores
+"""
+import os
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from typing import Any, Dict, List, Tuple
+from loguru import logger
+# local imports
+import utils as ut
+
+# version of the parsing and cleaning of files, increase when FileParser or text_cleaner output changes,
+# so that texts parsed by an older version are not used anymore
+PARSER_VERSION = "1"
+
+
+class ParseCache:
+    """
+    Content-addressed cache of the cleaned (page_num, text) pages and metadata (including the detected language) of
+    files, keyed by the sha256 hash of the file contents and the parser version. Vector stores with different chunking
+    settings for the same documents can then skip parsing. When the cache exceeds its maximum size, the least recently
+    used entries are evicted
+    """
+    def __init__(self, cache_path: str, max_size_mb: int) -> None:
+        self.cache_path = cache_path
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        self.connection = sqlite3.connect(cache_path, timeout=60, check_same_thread=False)
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS parsed_files (
+                                       file_hash TEXT NOT NULL,
+                                       parser_version TEXT NOT NULL,
+                                       pages BLOB NOT NULL,
+                                       metadata TEXT NOT NULL,
+                                       last_used REAL NOT NULL,
+                                       PRIMARY KEY (file_hash, parser_version))""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS idx_parsed_last_used ON parsed_files (last_used)")
+        self.connection.commit()
+
+    def get(self, file_path: str, file_hash: str = None) -> Tuple[List[Tuple[int, str]], Dict[str, Any]] | None:
+        """
+        Returns the cleaned pages and metadata of a file, or None if the file contents are not in the cache
+        The filename in the metadata is the name of the given file, files with identical contents share an entry
+
+        Parameters
+        ----------
+        file_path : str
+            path of the file
+        file_hash : str, optional
+            sha256 hash of the file contents, computed if not given
+
+        Returns
+        -------
+        Tuple[List[Tuple[int, str]], Dict[str, Any]] | None
+            the cleaned pages and the metadata of the file
+        """
+        file_hash = ut.get_file_hash(file_path) if file_hash is None else file_hash
+        with self.lock:
+            row = self.connection.execute("SELECT pages, metadata FROM parsed_files WHERE file_hash = ? "
+                                          "AND parser_version = ?", (file_hash, PARSER_VERSION)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute("UPDATE parsed_files SET last_used = ? WHERE file_hash = ? AND parser_version = ?",
+                                    (time.time(), file_hash, PARSER_VERSION))
+            self.connection.commit()
+        pages = [(page_num, text) for page_num, text in json.loads(zlib.decompress(row[0]).decode("utf-8"))]
+        metadata = json.loads(row[1])
+        metadata["filename"] = os.path.basename(file_path)
+        logger.info(f"Using parsed text of {metadata['filename']} from parse cache")
+
+        return pages, metadata
+
+    def put(self, file_path: str, pages: List[Tuple[int, str]], metadata: Dict[str, Any],
+            file_hash: str = None) -> None:
+        """
+        Stores the cleaned pages and metadata of a file and evicts least recently used entries if the cache is
+        too large
+        """
+        file_hash = ut.get_file_hash(file_path) if file_hash is None else file_hash
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO parsed_files (file_hash, parser_version, pages, metadata, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (file_hash, PARSER_VERSION, zlib.compress(json.dumps(pages).encode("utf-8")), json.dumps(metadata),
+                 time.time()))
+            self.connection.commit()
+            num_evicted = ut.evict_least_recently_used(self.connection, "parsed_files", "pages", self.max_size_bytes)
+        if num_evicted > 0:
+            logger.info(f"Parse cache: evicted {num_evicted} least recently used entries")
@@ -1,5 +1,4 @@
 import os
-import re
 # from datetime import date
 from typing import Callable, Dict, List, Tuple
 
@@ -9,6 +8,7 @@ from loguru import logger
 from pypdf import PdfReader
 
 from .utils import getattr_or_default
+from ingest import text_cleaner
 # from settings import CHUNK_SIZE, CHUNK_OVERLAP
 
 
@@ -28,11 +28,8 @@ class PdfParser:
     def clean_text_to_docs(self) -> List[docstore.Document]:
         raw_pages, metadata = self.parse_pdf()
 
-        cleaning_functions: List = [
-            self.merge_hyphenated_words,
-            self.fix_newlines,
-            self.remove_multiple_newlines,
-        ]
+        # single pass equivalent of merge_hyphenated_words, fix_newlines and remove_multiple_newlines
+        cleaning_functions: List = [text_cleaner.clean_text]
 
         cleaned_text_pdf = self.clean_text(raw_pages, cleaning_functions)
         return self.text_to_docs(cleaned_text_pdf, metadata)
@@ -84,15 +81,15 @@ class PdfParser:
 
     def merge_hyphenated_words(self, text: str) -> str:
         """Merge words in the text that have been split with a hyphen."""
-        return re.sub(r"(\w)-\n(\w)", r"\1\2", text)
+        return text_cleaner.merge_hyphenated_words(text)
 
     def fix_newlines(self, text: str) -> str:
         """Replace single newline characters in the text with spaces."""
-        return re.sub(r"(?<!\n)\n(?!\n)", " ", text)
+        return text_cleaner.fix_newlines(text)
 
     def remove_multiple_newlines(self, text: str) -> str:
         """Reduce multiple newline characters in the text to a single newline."""
-        return re.sub(r"\n{2,}", "\n", text)
+        return text_cleaner.remove_multiple_newlines(text)
 
     def text_to_docs(self, text: List[Tuple[int, str]],
                      metadata: Dict[str, str]) -> List[docstore.Document]:
@@ -1,11 +1,20 @@
+import threading
+from typing import Dict, Tuple
 import langchain.text_splitter as splitter
 # local imports
 import settings
 
+# process-wide registry of splitter objects, keyed by (method, chunk size, chunk overlap, language)
+# splitters do not keep state between split_text calls, so they can be shared by all files
+_SPLITTERS: Dict[Tuple[str, int, int, str], splitter.TextSplitter] = {}
+_SPLITTERS_LOCK = threading.Lock()
+
 
 class SplitterCreator():
     """
     Splitter class to import into other modules
+    Splitter objects are created once per process for each combination of method, chunk size, chunk overlap
+    and language
     """
     def __init__(self, text_splitter_method=None, chunk_size=None, chunk_overlap=None) -> None:
         self.text_splitter_method = settings.TEXT_SPLITTER_METHOD \
@@ -15,7 +24,18 @@ class SplitterCreator():
 
     def get_splitter(self, my_language="english"):
         """
-        Get the text splitter object
+        Get the text splitter object from the registry, creating it if necessary
+        """
+        key = (self.text_splitter_method, self.chunk_size, self.chunk_overlap, my_language)
+        with _SPLITTERS_LOCK:
+            if key not in _SPLITTERS:
+                _SPLITTERS[key] = self.create_splitter(my_language)
+
+            return _SPLITTERS[key]
+
+    def create_splitter(self, my_language="english"):
+        """
+        Create a new text splitter object
         """
         if self.text_splitter_method == "NLTKTextSplitter":
             text_splitter = splitter.NLTKTextSplitter(
@@ -0,0 +1,88 @@
+"""
+Text cleaning functions, shared by the Ingester, chunker.py and the PdfParser
+The regular expressions are compiled once, at import time, and clean_text combines the three cleaning steps
+"""
+import re
+
+HYPHENATED_WORD_PATTERN = re.compile(r"(\w)-\n(\w)")
+SINGLE_NEWLINE_PATTERN = re.compile(r"(?<!\n)\n(?!\n)")
+MULTIPLE_NEWLINES_PATTERN = re.compile(r"\n{2,}")
+# starts with a literal, so the regex engine can skip quickly to candidate hyphenated line breaks
+HYPHEN_CANDIDATE_PATTERN = re.compile(r"-\n(?=\w)")
+# placeholder for a sequence of newlines while single newlines are replaced
+PLACEHOLDER = "\x00"
+
+
+def merge_hyphenated_words(text: str) -> str:
+    """
+    Merge words in the text that have been split with a hyphen.
+    """
+    return HYPHENATED_WORD_PATTERN.sub(r"\1\2", text)
+
+
+def fix_newlines(text: str) -> str:
+    """
+    Replace single newline characters in the text with spaces.
+    """
+    return SINGLE_NEWLINE_PATTERN.sub(" ", text)
+
+
+def remove_multiple_newlines(text: str) -> str:
+    """
+    Reduce multiple newline characters in the text to a single newline.
+    """
+    return MULTIPLE_NEWLINES_PATTERN.sub("\n", text)
+
+
+def _is_word_character(character: str) -> bool:
+    """
+    Equivalent of the regular expression \\w for a single character
+    """
+    return character.isalnum() or character == "_"
+
+
+def _merge_hyphenated_words_fast(text: str) -> str:
+    """
+    Same result as merge_hyphenated_words, but only the (few) hyphenated line breaks followed by a word character are
+    inspected, instead of trying a match at every position of the text
+    """
+    parts = []
+    last = 0
+    # end of the previous match of (\w)-\n(\w), matches of the original pattern never overlap
+    previous_match_end = 0
+    for match in HYPHEN_CANDIDATE_PATTERN.finditer(text):
+        position = match.start()
+        if position - 1 >= previous_match_end and position >= 1 and _is_word_character(text[position - 1]):
+            parts.append(text[last:position])
+            last = position + 2
+            previous_match_end = position + 3
+    if last == 0:
+        return text
+    parts.append(text[last:])
+
+    return "".join(parts)
+
+
+def clean_text(text: str) -> str:
+    """
+    Applies merge_hyphenated_words, fix_newlines and remove_multiple_newlines to the text, with the same result as
+    applying them one after another, but without scanning the complete text with a regular expression three times:
+    hyphenated line breaks are located by a literal search and the newlines are handled with plain string
+    replacements. Merging a hyphenated word never changes which newlines are single and which are part of a
+    sequence of newlines, as a hyphenated line break is surrounded by word characters
+    """
+    if "\n" not in text:
+        return text
+    if PLACEHOLDER in text:
+        # the placeholder can not be used, fall back to the separate cleaning functions
+        return remove_multiple_newlines(fix_newlines(merge_hyphenated_words(text)))
+    if "-\n" in text:
+        text = _merge_hyphenated_words_fast(text)
+    if "\n\n" not in text:
+        return text.replace("\n", " ")
+    # replace each sequence of newlines by one placeholder, then the remaining single newlines by spaces
+    text = text.replace("\n\n", PLACEHOLDER).replace(PLACEHOLDER + "\n", PLACEHOLDER)
+    while PLACEHOLDER + PLACEHOLDER in text:
+        text = text.replace(PLACEHOLDER + PLACEHOLDER, PLACEHOLDER)
+
+    return text.replace("\n", " ").replace(PLACEHOLDER, "\n")
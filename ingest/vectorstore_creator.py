@@ -1,6 +1,27 @@
+import threading
+from typing import Dict
+import chromadb
 from langchain_community.vectorstores.chroma import Chroma
 # local imports
 import settings
+from ingest.numpy_vectorstore import NumpyVectorStore
+
+# process-wide registry of Chroma clients, keyed by persist directory, shared by all vector store objects
+_CHROMA_CLIENTS: Dict[str, chromadb.ClientAPI] = {}
+_CHROMA_CLIENTS_LOCK = threading.Lock()
+
+
+def get_chroma_client(vecdb_folder: str) -> chromadb.ClientAPI:
+    """
+    Returns the Chroma client of a persist directory, the client is created once per process
+    """
+    with _CHROMA_CLIENTS_LOCK:
+        if vecdb_folder not in _CHROMA_CLIENTS:
+            # same client settings as Chroma(persist_directory=vecdb_folder) uses
+            _CHROMA_CLIENTS[vecdb_folder] = chromadb.Client(
+                chromadb.config.Settings(is_persistent=True, persist_directory=vecdb_folder))
+
+        return _CHROMA_CLIENTS[vecdb_folder]
 
 
 class VectorStoreCreator():
@@ -24,15 +45,15 @@ class VectorStoreCreator():
 
         Returns
         -------
-        Chroma
-            Chroma vector database object
+        VectorStore
+            Chroma or NumpyVectorStore vector database object
         """
         if self.vecdb_type == "chromadb":
             if vecdb_folder is not None:
                 vectorstore = Chroma(
                     collection_name=content_folder,
                     embedding_function=embeddings,
-                    persist_directory=vecdb_folder,
+                    client=get_chroma_client(vecdb_folder),
                     collection_metadata={"hnsw:space": "cosine"}
                     )
             else:
@@ -41,5 +62,9 @@ class VectorStoreCreator():
                     embedding_function=embeddings,
                     collection_metadata={"hnsw:space": "cosine"}
                     )
+        elif self.vecdb_type == "numpy":
+            vectorstore = NumpyVectorStore(collection_name=content_folder,
+                                           embedding_function=embeddings,
+                                           vecdb_folder=vecdb_folder)
 
         return vectorstore
@@ -0,0 +1,47 @@
+from typing import List, Optional, Tuple
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+# local imports
+from ingest.bm25_index import BM25Index
+
+
+class PersistentBM25Retriever(BaseRetriever):
+    """
+    Keyword retriever on the persistent BM25 index of a vector store, which is built at ingest time, instead of an
+    in-memory BM25 index that is built from the complete collection for each chain
+    """
+    # The BM25 index of the vector store
+    index: BM25Index
+    # Number of chunks to retrieve
+    k: int = 4
+    # If set, only chunks of these files are retrieved
+    filenames: Optional[List[str]] = None
+    # If set with filenames, the chunks with these ids are retrieved as well
+    chunk_ids: Optional[List[str]] = None
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        """
+        Get the chunks with the highest BM25 score for a query
+
+        Parameters
+        ----------
+        query : str
+            String to find relevant documents for
+        run_manager : CallbackManagerForRetrieverRun
+            The callbacks handler to use
+
+        Returns
+        -------
+        List[Document]
+            List of relevant documents
+        """
+        return [document for document, _ in self.search_with_scores(query)]
+
+    def search_with_scores(self, query: str) -> List[Tuple[Document, float]]:
+        """
+        Returns the chunks with the highest BM25 score for a query, with their score
+        """
+        return self.index.search(query, self.k, self.filenames, self.chunk_ids)
@@ -0,0 +1,49 @@
+from typing import List
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+# local imports
+from ingest.chunk_deduplicator import ChunkDeduplicator
+
+
+class DuplicateSourcesRetriever(BaseRetriever):
+    """
+    Retriever wrapper for vector stores that were ingested with chunk deduplication. A chunk that has near-duplicates
+    is stored once, the sources of its near-duplicates (filename, page number and source) are added to the metadata
+    of the retrieved chunk as duplicate_sources, so that the chunk points back to all its sources
+    """
+    # The retriever whose chunks get the sources of their near-duplicates
+    retriever: BaseRetriever
+    # The index of near-duplicate chunks of the vector store
+    deduplicator: ChunkDeduplicator
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        """
+        Get the chunks of the wrapped retriever for a query, with the sources of their near-duplicates
+
+        Parameters
+        ----------
+        query : str
+            String to find relevant documents for
+        run_manager : CallbackManagerForRetrieverRun
+            The callbacks handler to use
+
+        Returns
+        -------
+        List[Document]
+            List of relevant documents
+        """
+        documents = self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        sources = self.deduplicator.get_sources([document.metadata['chunk_id'] for document in documents
+                                                 if 'chunk_id' in document.metadata])
+        result = []
+        for document in documents:
+            duplicate_sources = sources.get(document.metadata.get('chunk_id'))
+            if duplicate_sources is not None:
+                document = Document(page_content=document.page_content,
+                                    metadata={**document.metadata, 'duplicate_sources': duplicate_sources})
+            result.append(document)
+
+        return result
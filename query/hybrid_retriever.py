@@ -0,0 +1,131 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.pydantic_v1 import Field
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+# local imports
+from query.bm25_retriever import PersistentBM25Retriever
+
+# constant of reciprocal rank fusion, dampens the difference between the first ranks
+RRF_CONSTANT = 60
+# threads that run the keyword and vector searches of hybrid queries concurrently, shared by all retrievers
+_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hybrid_retriever")
+
+
+def fuse(results: List[List[Tuple[Document, Optional[float]]]], weights: List[float], fusion: str,
+         k: int) -> List[Document]:
+    """
+    Fuses the ranked results of multiple searches into one ranking and returns the k best chunks
+    Chunks are identified by their text and filename
+
+    Parameters
+    ----------
+    results : List[List[Tuple[Document, Optional[float]]]]
+        per search, the chunks with their scores (None if the search has no scores), best first
+    weights : List[float]
+        weight of each search
+    fusion : str
+        "rrf": weighted reciprocal rank fusion, sum of weight / (60 + rank)
+        "weighted": weighted sum of the scores, min-max normalized per search
+    k : int
+        number of chunks to return
+
+    Returns
+    -------
+    List[Document]
+        the k chunks with the highest fused score
+    """
+    position_of: Dict[Tuple[str, str], int] = {}
+    documents: List[Document] = []
+    # per search, the positions of its chunks among all chunks and their rank or score
+    positions, values = [], []
+    for search_results in results:
+        search_positions = []
+        for document, _ in search_results:
+            key = (document.page_content, document.metadata.get("filename"))
+            if key not in position_of:
+                position_of[key] = len(documents)
+                documents.append(document)
+            search_positions.append(position_of[key])
+        positions.append(np.array(search_positions, dtype=np.int64))
+        if fusion == "rrf":
+            values.append(1.0 / (RRF_CONSTANT + np.arange(1, len(search_results) + 1, dtype=np.float64)))
+        elif fusion == "weighted":
+            scores = np.array([score for _, score in search_results], dtype=np.float64)
+            if len(scores) > 0 and np.isnan(scores).any():
+                # searches without scores, e.g. mmr, get scores from their ranks
+                scores = 1.0 - np.arange(len(search_results), dtype=np.float64) / len(search_results)
+            if len(scores) > 0 and scores.max() > scores.min():
+                scores = (scores - scores.min()) / (scores.max() - scores.min())
+            else:
+                scores = np.ones(len(scores), dtype=np.float64)
+            values.append(scores)
+        else:
+            raise ValueError(f"Unknown fusion {fusion}, expected 'rrf' or 'weighted'")
+    fused_scores = np.zeros(len(documents), dtype=np.float64)
+    for weight, search_positions, search_values in zip(weights, positions, values):
+        np.add.at(fused_scores, search_positions, weight * search_values)
+    best = np.argsort(-fused_scores, kind="stable")[:k]
+
+    return [documents[position] for position in best]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Hybrid retriever that runs the keyword (BM25) search and the vector search concurrently, so the latency is that
+    of the slowest of the two, and fuses both rankings with reciprocal rank fusion or a weighted sum of the scores
+    """
+    # The keyword retriever, its k is the number of keyword candidates
+    keyword_retriever: PersistentBM25Retriever
+    # The vector store
+    vectorstore: VectorStore
+    # Type of vector search to perform (similarity / similarity_score_threshold / mmr)
+    search_type: str = "similarity"
+    # Keyword arguments for the vector search, besides k
+    search_kwargs: dict = Field(default_factory=dict)
+    # Fusion method, "rrf" or "weighted"
+    fusion: str = "rrf"
+    # Weights of the keyword search and the vector search
+    weights: List[float] = [0.3, 0.7]
+    # Number of candidates retrieved by the vector search
+    candidate_k: int = 20
+    # Number of chunks to return
+    k: int = 4
+
+    def _vector_search(self, query: str) -> List[Tuple[Document, Optional[float]]]:
+        """
+        returns the candidates of the vector store with their relevance scores
+        """
+        if self.search_type == "mmr":
+            documents = self.vectorstore.max_marginal_relevance_search(
+                query, k=self.candidate_k, fetch_k=max(20, 2 * self.candidate_k), **self.search_kwargs)
+            return [(document, None) for document in documents]
+
+        return self.vectorstore.similarity_search_with_relevance_scores(query, k=self.candidate_k,
+                                                                        **self.search_kwargs)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        """
+        Get the chunks with the highest fused score for a query
+
+        Parameters
+        ----------
+        query : str
+            String to find relevant documents for
+        run_manager : CallbackManagerForRetrieverRun
+            The callbacks handler to use
+
+        Returns
+        -------
+        List[Document]
+            List of relevant documents
+        """
+        keyword_future = _EXECUTOR.submit(self.keyword_retriever.search_with_scores, query)
+        vector_results = self._vector_search(query)
+
+        return fuse([keyword_future.result(), vector_results], self.weights, self.fusion, self.k)
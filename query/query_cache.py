@@ -0,0 +1,275 @@
+"""
+In-memory caches of the query path: question embeddings, retrieval results and answers
+Identical questions are very common (helpdesk questions, evaluation reruns), these caches answer them without calls
+to the embeddings provider and without searching the vector store again
+"""
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+# local imports
+import settings
+import utils as ut
+
+
+class LRUCache:
+    """
+    Thread-safe dictionary with a maximum number of entries, the least recently used entry is removed first
+    Counts the number of hits and misses
+    """
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Returns the value of a key and marks it as recently used, or None if the key is not in the cache
+        """
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+            return self.entries[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Stores the value of a key, removing the least recently used entries if the cache is full
+        """
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+
+def normalize_query(text: str) -> str:
+    """
+    Returns the text with unicode normalized and whitespace collapsed, texts that only differ in these respects get
+    the same embedding
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class QueryEmbeddingsCache(Embeddings):
+    """
+    Embeddings wrapper that keeps the embeddings of the most recent query texts in memory, keyed by (provider, model,
+    normalized text). Document embeddings are passed through, those are cached on disk by CachedEmbeddings
+    """
+    def __init__(self, embeddings: Embeddings, embeddings_provider: str, embeddings_model: str,
+                 max_size: int) -> None:
+        self.embeddings = embeddings
+        self.embeddings_provider = embeddings_provider
+        self.embeddings_model = embeddings_model
+        self.cache = LRUCache(max_size)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds a list of texts, without using the cache
+        """
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embeds a query text, the embeddings provider is only called for texts that are not in the cache
+        """
+        key = (self.embeddings_provider, self.embeddings_model, normalize_query(text))
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(key[2])
+            self.cache.put(key, vector)
+
+        return list(vector)
+
+
+# retrieval results of all CachedRetriever objects, keyed by retriever key, ingest generation and query vector hash
+_RETRIEVAL_CACHE = LRUCache(settings.RETRIEVAL_CACHE_SIZE)
+
+
+def get_vector_hash(vector: List[float]) -> str:
+    """
+    Returns the sha256 hash of the float32 representation of a vector
+    """
+    return hashlib.sha256(np.asarray(vector, dtype=np.float32).tobytes()).hexdigest()
+
+
+class CachedRetriever(BaseRetriever):
+    """
+    Retriever wrapper that keeps the results of recent queries in memory. The results are keyed by the retriever key
+    (collection, k, filter, search type and other retriever settings), the ingest generation of the vector store and
+    the hash of the query vector, so that results are never served after an ingest run changed the vector store
+    The query vector comes from the embeddings of the vector store, so it should be a QueryEmbeddingsCache, then the
+    retriever embeds the query without an extra call to the embeddings provider
+    """
+    # The retriever whose results are cached
+    retriever: BaseRetriever
+    # The embeddings of the vector store
+    embeddings: Embeddings
+    # Folder of the vector store, for its ingest generation
+    vecdb_folder: Optional[str] = None
+    # The settings of the retriever that determine its results, besides the query
+    retriever_key: Tuple = ()
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        """
+        Get the chunks of the wrapped retriever for a query, from the cache if possible
+
+        Parameters
+        ----------
+        query : str
+            String to find relevant documents for
+        run_manager : CallbackManagerForRetrieverRun
+            The callbacks handler to use
+
+        Returns
+        -------
+        List[Document]
+            List of relevant documents
+        """
+        generation = ut.get_ingest_generation(self.vecdb_folder) if self.vecdb_folder is not None else 0
+        key = (self.retriever_key, generation, get_vector_hash(self.embeddings.embed_query(query)))
+        documents = _RETRIEVAL_CACHE.get(key)
+        if documents is None:
+            documents = self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+            _RETRIEVAL_CACHE.put(key, documents)
+
+        return list(documents)
+
+
+# maximum number of cache keys of the semantic answer cache, the same as the number of cached chains of the
+# QueryEngine, as the cache key is the chain key
+ANSWER_CACHE_KEYS = 32
+
+
+class SemanticAnswerCache:
+    """
+    Cache of the answers to earlier questions, looked up by the cosine distance between the question embeddings
+    Answers are stored per cache key (the chain key: vector store, document selection and settings) and ingest
+    generation, the answers of older generations are dropped. Keeps track of the hit rate and the latency saved
+    """
+    def __init__(self, max_distance: float, max_size: int, max_keys: int = ANSWER_CACHE_KEYS) -> None:
+        self.max_distance = max_distance
+        self.max_size = max_size
+        # per cache key: (ingest generation, unit question vectors, answers with their source documents, seconds it
+        # took to answer). Only the answers and sources are stored, never the chat history of the asking session
+        # The answers of the least recently used cache key are removed first when there are more than max_keys keys
+        self.entries = LRUCache(max_keys)
+        self.lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.seconds_saved = 0.0
+
+    @staticmethod
+    def get_unit_vector(vector: List[float]) -> np.ndarray:
+        """
+        returns the vector scaled to length 1, as float32
+        """
+        unit_vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(unit_vector)
+
+        return unit_vector / norm if norm > 0 else unit_vector
+
+    def lookup(self, key: Hashable, generation: int, vector: List[float]) -> Optional[Tuple[str, List[Document]]]:
+        """
+        Returns the stored answer and a copy of the source documents of the nearest earlier question, if its cosine
+        distance to the question vector is at most max_distance, otherwise None
+
+        Parameters
+        ----------
+        key : Hashable
+            the cache key of the question
+        generation : int
+            the ingest generation of the vector store
+        vector : List[float]
+            the embedding of the question
+
+        Returns
+        -------
+        Optional[Tuple[str, List[Document]]]
+            the stored answer and source documents, or None if there is no earlier question that is close enough
+        """
+        start = time.perf_counter()
+        with self.lock:
+            self.lookups += 1
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != generation or len(entry[2]) == 0:
+                return None
+            _, vectors, answers, seconds = entry
+            similarities = vectors @ self.get_unit_vector(vector)
+            best = int(np.argmax(similarities))
+            if 1.0 - float(similarities[best]) > self.max_distance:
+                return None
+            self.hits += 1
+            self.seconds_saved += max(0.0, seconds[best] - (time.perf_counter() - start))
+
+            answer, source_documents = answers[best]
+
+            return answer, [document.copy(deep=True) for document in source_documents]
+
+    def store(self, key: Hashable, generation: int, vector: List[float], answer: str,
+              source_documents: List[Document], seconds: float) -> None:
+        """
+        Stores the answer to a question and a copy of its source documents
+
+        Parameters
+        ----------
+        key : Hashable
+            the cache key of the question
+        generation : int
+            the ingest generation of the vector store that the answer is based on
+        vector : List[float]
+            the embedding of the question
+        answer : str
+            the answer to the question
+        source_documents : List[Document]
+            the source documents of the answer
+        seconds : float
+            the time it took to answer the question
+        """
+        unit_vector = self.get_unit_vector(vector)[np.newaxis, :]
+        stored_answer = (answer, [document.copy(deep=True) for document in source_documents])
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != generation:
+                # the answers of an older generation may be based on removed or changed documents
+                entry = (generation, np.zeros((0, unit_vector.shape[1]), dtype=np.float32), [], [])
+            _, vectors, answers, latencies = entry
+            vectors = np.concatenate([vectors, unit_vector])[-self.max_size:]
+            answers = (answers + [stored_answer])[-self.max_size:]
+            latencies = (latencies + [seconds])[-self.max_size:]
+            self.entries.put(key, (generation, vectors, answers, latencies))
+
+    def get_metrics(self) -> Dict[str, float]:
+        """
+        Returns the number of lookups and hits, the hit rate and the total latency saved in seconds
+        """
+        with self.lock:
+            return {"lookups": self.lookups,
+                    "hits": self.hits,
+                    "hit_rate": self.hits / self.lookups if self.lookups > 0 else 0.0,
+                    "seconds_saved": self.seconds_saved}
+
+
+# answers of standalone questions, shared by all QueryEngine objects, used if SEMANTIC_CACHE is True
+_ANSWER_CACHE = SemanticAnswerCache(settings.SEMANTIC_CACHE_MAX_DISTANCE, settings.SEMANTIC_CACHE_SIZE)
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """
+    Returns the process-wide semantic answer cache
+    """
+    return _ANSWER_CACHE
@@ -0,0 +1,348 @@
+"""
+QueryEngine and Conversation classes
+The QueryEngine holds everything that can be shared by concurrent users: the LLM and embeddings objects and the
+cached chains per vector store and search filter. It has no per-user state, so one engine serves all sessions.
+A Conversation holds the state of one user: the selected chain and the chat history
+"""
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Tuple
+from dotenv import load_dotenv
+from langchain.chains.conversational_retrieval.base import ConversationalRetrievalChain
+from langchain.schema import AIMessage, BaseMessage, HumanMessage
+from langchain_core.prompts import PromptTemplate
+from langchain_core.vectorstores import VectorStore
+from loguru import logger
+# local imports
+import settings
+from ingest.vectorstore_creator import VectorStoreCreator
+from ingest.document_catalog import DocumentCatalog, has_document_catalog
+from ingest.parent_store import ParentStore
+from ingest.bm25_index import get_bm25_index
+from ingest.chunk_deduplicator import ChunkDeduplicator, has_dedup_index
+from query import resource_pool
+from query.retriever_creator import RetrieverCreator
+from query.duplicate_sources_retriever import DuplicateSourcesRetriever
+from query.query_cache import CachedRetriever, get_answer_cache
+import prompts.prompt_templates as pr
+import utils as ut
+
+# maximum number of chains kept in the chain cache, one per combination of folder, search filter and settings
+CHAIN_CACHE_SIZE = 32
+
+
+def normalize_search_filter(search_filter: Any) -> Any:
+    """
+    Returns a hashable form of a search filter in which the order of keys and of $in / $nin values does not matter,
+    so that equivalent document selections share a cached chain
+    """
+    if isinstance(search_filter, dict):
+        return tuple(sorted((key, tuple(sorted(value, key=repr)) if key in ("$in", "$nin") and
+                             isinstance(value, list) else normalize_search_filter(value))
+                            for key, value in search_filter.items()))
+    if isinstance(search_filter, list):
+        return tuple(normalize_search_filter(value) for value in search_filter)
+
+    return search_filter
+
+
+class QueryEngine:
+    """
+    Shared retrieval and LLM engine. The settings are fixed at creation and all state that changes afterwards, the
+    chain cache, is guarded by a lock, so one engine can be used by multiple threads at the same time
+    Chains are cached process-wide, so that follow-up questions and reruns of the app skip the creation of the vector
+    store client, retriever, prompt and chain. A cached chain is rebuilt when an ingest run changed the vector store
+    """
+    # chain cache shared by all engines, maps the chain key to (ingest generation, vector store, catalog, chain)
+    _chain_cache: "OrderedDict[Tuple, Tuple[int, VectorStore, DocumentCatalog, Any]]" = OrderedDict()
+    _chain_cache_lock = threading.Lock()
+
+    def __init__(self, llm_provider=None, llm_model=None, embeddings_provider=None, embeddings_model=None,
+                 vecdb_type=None, chain_name=None, chain_type=None, chain_verbosity=None, search_type=None,
+                 score_threshold=None, chunk_k=None):
+        load_dotenv()
+        self.llm_provider = settings.LLM_PROVIDER if llm_provider is None else llm_provider
+        self.llm_model = settings.LLM_MODEL if llm_model is None else llm_model
+        self.embeddings_provider = settings.EMBEDDINGS_PROVIDER if embeddings_provider is None else embeddings_provider
+        self.embeddings_model = settings.EMBEDDINGS_MODEL if embeddings_model is None else embeddings_model
+        self.vecdb_type = settings.VECDB_TYPE if vecdb_type is None else vecdb_type
+        self.chain_name = settings.CHAIN_NAME if chain_name is None else chain_name
+        self.chain_type = settings.CHAIN_TYPE if chain_type is None else chain_type
+        self.chain_verbosity = settings.CHAIN_VERBOSITY if chain_verbosity is None else chain_verbosity
+        self.search_type = settings.SEARCH_TYPE if search_type is None else search_type
+        self.score_threshold = settings.SCORE_THRESHOLD if score_threshold is None else score_threshold
+        self.chunk_k = settings.CHUNK_K if chunk_k is None else chunk_k
+
+        # define llm, shared by all engines with the same provider and model
+        self.llm = resource_pool.get_llm(self.llm_provider, self.llm_model)
+
+        # define embeddings, shared by all engines with the same provider and model
+        self.embeddings = resource_pool.get_embeddings(self.embeddings_provider, self.embeddings_model)
+
+    def get_chain(self,
+                  content_folder: str,
+                  vecdb_folder: str,
+                  search_filter: Dict = None) -> Tuple[VectorStore, DocumentCatalog, Any]:
+        """
+        Returns the chain that is used for question answering on a vector store, from the chain cache if possible
+
+        Parameters
+        ----------
+        content_folder : str
+            the content folder
+        vecdb_folder : str
+            the folder of the vector databse that is associated with the content folder
+        search_filter : Dict, optional
+            filter on the chunk metadata, e.g. the selected documents, by default None
+
+        Returns
+        -------
+        Tuple[VectorStore, DocumentCatalog, Any]
+            the vector store, its document catalog (None without vecdb_folder or catalog) and the chain
+        """
+        chain_key = self.get_chain_key(content_folder, vecdb_folder, search_filter)
+        generation = ut.get_ingest_generation(vecdb_folder) if vecdb_folder is not None else 0
+        with QueryEngine._chain_cache_lock:
+            cached = QueryEngine._chain_cache.get(chain_key)
+            if cached is not None and cached[0] == generation:
+                QueryEngine._chain_cache.move_to_end(chain_key)
+                logger.info("Reused cached chain")
+                return cached[1:]
+
+        # get vector store
+        vector_store = VectorStoreCreator(self.vecdb_type).get_vectorstore(embeddings=self.embeddings,
+                                                                           content_folder=content_folder,
+                                                                           vecdb_folder=vecdb_folder)
+        logger.info(f"Loaded vector store from folder {vecdb_folder}")
+        # get document catalog of the vector store, if it was ingested with one
+        catalog = None
+        if vecdb_folder is not None and has_document_catalog(vecdb_folder):
+            catalog = DocumentCatalog(vecdb_folder)
+        # get parent store of the vector store, in case of the parent retriever
+        parent_store = None
+        if settings.RETRIEVER_TYPE == "parent" and vecdb_folder is not None:
+            parent_store = ParentStore(vecdb_folder)
+        # get the persistent keyword index of the vector store, in case of the hybrid retriever
+        bm25_index = None
+        if settings.RETRIEVER_TYPE == "hybrid" and vecdb_folder is not None:
+            bm25_index = get_bm25_index(vecdb_folder)
+        # get the index of near-duplicate chunks, in case the vector store was ingested with chunk deduplication
+        deduplicator = None
+        if vecdb_folder is not None and has_dedup_index(vecdb_folder):
+            deduplicator = ChunkDeduplicator(vecdb_folder)
+
+        # get retriever with search_filter, selected files also find the stored copies of their duplicate chunks
+        retriever_filter = search_filter if deduplicator is None else deduplicator.widen_search_filter(search_filter)
+        retriever = RetrieverCreator(vectorstore=vector_store,
+                                     parent_store=parent_store,
+                                     bm25_index=bm25_index).get_retriever(search_filter=retriever_filter)
+        # retrieved chunks point back to the sources of their near-duplicates
+        if deduplicator is not None:
+            retriever = DuplicateSourcesRetriever(retriever=retriever, deduplicator=deduplicator)
+        # cache the results of repeated questions, the chain key contains all settings the results depend on
+        if settings.RETRIEVAL_CACHE_SIZE > 0 and settings.QUERY_EMBEDDINGS_CACHE_SIZE > 0:
+            retriever = CachedRetriever(retriever=retriever,
+                                        embeddings=self.embeddings,
+                                        vecdb_folder=vecdb_folder,
+                                        retriever_key=chain_key)
+
+        # get appropriate RAG prompt for querying
+        if settings.RETRIEVER_PROMPT_TEMPLATE == "openai_rag":
+            current_template = pr.OPENAI_RAG_TEMPLATE
+        elif settings.RETRIEVER_PROMPT_TEMPLATE == "openai_rag_concise":
+            current_template = pr.OPENAI_RAG_CONCISE_TEMPLATE
+        elif settings.RETRIEVER_PROMPT_TEMPLATE == "openai_rag_language":
+            current_template = pr.OPENAI_RAG_LANGUAGE_TEMPLATE
+        elif settings.RETRIEVER_PROMPT_TEMPLATE == "yesno":
+            current_template = pr.YES_NO_TEMPLATE
+        prompt = PromptTemplate.from_template(template=current_template)
+
+        # get chain
+        chain = None
+        if self.chain_name == "conversationalretrievalchain":
+            chain = ConversationalRetrievalChain.from_llm(
+                llm=self.llm,
+                retriever=retriever,
+                chain_type=self.chain_type,
+                verbose=self.chain_verbosity,
+                combine_docs_chain_kwargs={'prompt': prompt},
+                return_source_documents=True
+            )
+        with QueryEngine._chain_cache_lock:
+            QueryEngine._chain_cache[chain_key] = (generation, vector_store, catalog, chain)
+            QueryEngine._chain_cache.move_to_end(chain_key)
+            while len(QueryEngine._chain_cache) > CHAIN_CACHE_SIZE:
+                QueryEngine._chain_cache.popitem(last=False)
+        logger.info("Executed QueryEngine.get_chain")
+
+        return vector_store, catalog, chain
+
+    def get_chain_key(self, content_folder: str, vecdb_folder: str, search_filter: Dict = None) -> Tuple:
+        """
+        Returns the key of a chain in the chain cache: the folders, the normalized search filter and all settings
+        that the vector store, retriever, prompt and chain depend on
+        """
+        return (content_folder, vecdb_folder, self.vecdb_type, normalize_search_filter(search_filter),
+                self.llm_provider, self.llm_model, self.embeddings_provider, self.embeddings_model,
+                self.chain_name, self.chain_type, self.chain_verbosity, settings.RETRIEVER_TYPE,
+                settings.RETRIEVER_PROMPT_TEMPLATE, settings.SEARCH_TYPE, settings.SCORE_THRESHOLD, settings.CHUNK_K,
+                settings.CHUNK_K_CHILD, settings.MULTIQUERY, settings.HYBRID_FUSION, tuple(settings.HYBRID_WEIGHTS),
+                settings.HYBRID_CANDIDATE_K, settings.VECDB_QUANTIZATION, settings.VECDB_RESCORE_FACTOR)
+
+    def answer(self, chain: Any, question: str, chat_history: List[BaseMessage], chain_key: Hashable = None,
+               vecdb_folder: str = None) -> Dict[str, Any]:
+        """
+        Finds most similar docs to prompt in the vectorstore and determines the response
+        If the closest doc found is not similar enough to the prompt, any answer from the LLM is overruled by a message
+        If SEMANTIC_CACHE is True, a standalone question that is nearly identical to an earlier question on the same
+        chain and ingest generation gets the answer to the earlier question
+
+        Parameters
+        ----------
+        chain : Any
+            the chain of the conversation, as returned by get_chain
+        question : str
+            the question that was asked by the user
+        chat_history : List[BaseMessage]
+            the earlier questions and answers of the conversation, not changed
+        chain_key : Hashable, optional
+            the key of the chain, as returned by get_chain_key. Answers are only cached if given
+        vecdb_folder : str, optional
+            the folder of the vector store of the chain, for its ingest generation
+
+        Returns
+        -------
+        Dict[str, Any]
+            the response from the chain, containing the answer to the question and the sources used
+        """
+        # follow-up questions depend on the chat history, so only standalone questions use the answer cache
+        use_answer_cache = settings.SEMANTIC_CACHE and chain_key is not None and len(chat_history) == 0
+        if use_answer_cache:
+            generation = ut.get_ingest_generation(vecdb_folder) if vecdb_folder is not None else 0
+            question_vector = self.embeddings.embed_query(question)
+            cached_answer = get_answer_cache().lookup(chain_key, generation, question_vector)
+            if cached_answer is not None:
+                logger.info(f"Answered from semantic cache, metrics: {get_answer_cache().get_metrics()}")
+                # the response is rebuilt with the question and chat history of this conversation
+                return {"question": question,
+                        "chat_history": chat_history,
+                        "answer": cached_answer[0],
+                        "source_documents": cached_answer[1]}
+        start = time.perf_counter()
+        response = chain.invoke({"question": question, "chat_history": chat_history})
+        # if no chunk qualifies, overrule any answer generated by the LLM
+        if len(response["source_documents"]) == 0:
+            language = ut.detect_language(text=question)
+            if language == 'nl':
+                response["answer"] = "Ik weet het niet omdat er geen relevante context is die het antwoord bevat"
+            elif language == 'de':
+                response["answer"] = "Ich weiß es nicht, weil es keinen relevanten Kontext gibt, der die Antwort enthält"
+            else:
+                response["answer"] = "I don't know because there is no relevant context containing the answer"
+        if use_answer_cache:
+            get_answer_cache().store(chain_key, generation, question_vector, response["answer"],
+                                     response["source_documents"], time.perf_counter() - start)
+
+        return response
+
+    @staticmethod
+    def get_answer_cache_metrics() -> Dict[str, float]:
+        """
+        Returns the metrics of the semantic answer cache: lookups, hits, hit rate and seconds saved
+        """
+        return get_answer_cache().get_metrics()
+
+
+class Conversation:
+    """
+    Conversation of one user with a shared QueryEngine: the chain of the selected folder and documents and the chat
+    history. Creating a conversation is cheap, so every session has its own
+    """
+    def __init__(self, engine: QueryEngine) -> None:
+        self.engine = engine
+        self.chat_history = []
+        self.vector_store = None
+        self.catalog = None
+        self.chain = None
+        self.chain_key = None
+        self.vecdb_folder = None
+
+    def make_chain(self,
+                   content_folder: str,
+                   vecdb_folder: str,
+                   search_filter: Dict = None) -> None:
+        """
+        Selects the chain that is used for question answering
+
+        Parameters
+        ----------
+        content_folder : str
+            the content folder
+        vecdb_folder : str
+            the folder of the vector databse that is associated with the content folder
+        search_filter : Dict, optional
+            filter on the chunk metadata, e.g. the selected documents, by default None
+        """
+        self.vector_store, self.catalog, self.chain = self.engine.get_chain(content_folder, vecdb_folder,
+                                                                            search_filter)
+        self.chain_key = self.engine.get_chain_key(content_folder, vecdb_folder, search_filter)
+        self.vecdb_folder = vecdb_folder
+
+    def ask_question(self, question: str) -> Dict[str, Any]:
+        """
+        Answers a question in the context of the chat history and adds both to the chat history
+
+        Parameters
+        ----------
+        question : str
+            the question that was asked by the user
+
+        Returns
+        -------
+        Dict[str, Any]
+            the response from the chain, containing the answer to the question and the sources used
+        """
+        logger.info(f"current question: {question}")
+        logger.info(f"current chat history: {self.chat_history}")
+
+        response = self.engine.answer(self.chain, question, self.chat_history, self.chain_key, self.vecdb_folder)
+        self.chat_history.append(HumanMessage(content=question))
+        self.chat_history.append(AIMessage(content=response["answer"]))
+
+        return response
+
+    def clear_history(self) -> None:
+        """
+        Clears the chat history
+        Used by "Clear Conversation" button in streamlit_app.py
+        """
+        self.chat_history = []
+
+    def get_meta_data_by_file_name(self, filename: str) -> Dict[str, str]:
+        """
+        Returns the meta data of a specific file
+        Need to run make_chain first
+
+        Parameters
+        ----------
+        filename : str
+            the filename used to refer to get all chunk metadata
+
+        Returns
+        -------
+        Dict[str: str]
+            chunks metadata like filename, pagenumber, etc
+        """
+        # look up the metadata of the first chunk in the document catalog, as filename metadata is the same for
+        # all chunks
+        metadata = None
+        if self.catalog is not None and self.catalog.is_initialized():
+            metadata = self.catalog.get_metadata(filename)
+        if metadata is None:
+            # vector store without (complete) catalog: fetch just one chunk of the file from the vector store
+            # sources keys: ['ids', 'embeddings', 'metadatas', 'documents', 'uris', 'data']
+            sources = self.vector_store.get(where={"filename": filename}, limit=1, include=["metadatas"])
+            metadata = sources['metadatas'][0]
+
+        return metadata
@@ -0,0 +1,94 @@
+"""
+Process-wide pool of LLM and embeddings objects, keyed by (provider, model)
+Creating these objects is expensive (clients, HuggingFace model weights), so they are created once per process and
+shared by all Querier objects and all sessions of the Streamlit app. The objects only hold clients and model
+weights, no conversation state, so they can be used by multiple threads at the same time
+"""
+import threading
+from typing import Any, Callable, Dict, Tuple
+from langchain_core.embeddings import Embeddings
+# local imports
+import settings
+from ingest.embeddings_creator import EmbeddingsCreator
+from query.llm_creator import LLMCreator
+from query.query_cache import QueryEmbeddingsCache
+
+# the pooled objects, keyed by (kind, provider, model)
+_RESOURCES: Dict[Tuple[str, str, str], Any] = {}
+_RESOURCES_LOCK = threading.Lock()
+# one lock per key, so that an object is created once while other keys can be created or used meanwhile
+_CREATION_LOCKS: Dict[Tuple[str, str, str], threading.Lock] = {}
+
+
+def _get_resource(key: Tuple[str, str, str], create: Callable[[], Any]) -> Any:
+    """
+    Returns the pooled object of a key, created with create() by the first caller
+    """
+    with _RESOURCES_LOCK:
+        if key in _RESOURCES:
+            return _RESOURCES[key]
+        creation_lock = _CREATION_LOCKS.setdefault(key, threading.Lock())
+    with creation_lock:
+        # another thread may have created the object while this thread was waiting
+        with _RESOURCES_LOCK:
+            if key in _RESOURCES:
+                return _RESOURCES[key]
+        resource = create()
+        with _RESOURCES_LOCK:
+            _RESOURCES[key] = resource
+
+    return resource
+
+
+def get_llm(llm_provider: str = None, llm_model: str = None) -> Any:
+    """
+    Returns the shared LLM object of a provider and model
+
+    Parameters
+    ----------
+    llm_provider : str, optional
+        the LLM provider, by default settings.LLM_PROVIDER
+    llm_model : str, optional
+        the LLM model, by default settings.LLM_MODEL
+
+    Returns
+    -------
+    Any
+        the LLM object, as created by LLMCreator
+    """
+    llm_provider = settings.LLM_PROVIDER if llm_provider is None else llm_provider
+    llm_model = settings.LLM_MODEL if llm_model is None else llm_model
+
+    return _get_resource(("llm", llm_provider, llm_model), LLMCreator(llm_provider, llm_model).get_llm)
+
+
+def get_embeddings(embeddings_provider: str = None, embeddings_model: str = None) -> Embeddings:
+    """
+    Returns the shared embeddings object of a provider and model
+    The embeddings of questions are cached in memory, if QUERY_EMBEDDINGS_CACHE_SIZE is larger than 0
+
+    Parameters
+    ----------
+    embeddings_provider : str, optional
+        the embeddings provider, by default settings.EMBEDDINGS_PROVIDER
+    embeddings_model : str, optional
+        the embeddings model, by default settings.EMBEDDINGS_MODEL
+
+    Returns
+    -------
+    Embeddings
+        the embeddings object, as created by EmbeddingsCreator
+    """
+    embeddings_provider = settings.EMBEDDINGS_PROVIDER if embeddings_provider is None else embeddings_provider
+    embeddings_model = settings.EMBEDDINGS_MODEL if embeddings_model is None else embeddings_model
+
+    def create() -> Embeddings:
+        embeddings = EmbeddingsCreator(embeddings_provider, embeddings_model).get_embeddings()
+        if settings.QUERY_EMBEDDINGS_CACHE_SIZE > 0:
+            embeddings = QueryEmbeddingsCache(embeddings=embeddings,
+                                              embeddings_provider=embeddings_provider,
+                                              embeddings_model=embeddings_model,
+                                              max_size=settings.QUERY_EMBEDDINGS_CACHE_SIZE)
+        return embeddings
+
+    return _get_resource(("embeddings", embeddings_provider, embeddings_model), create)
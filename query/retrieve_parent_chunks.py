@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import List
+from typing import List, Optional
 import langchain.docstore.document as docstore
 from langchain_core.callbacks import CallbackManagerForRetrieverRun
 from langchain_core.documents import Document
@@ -8,6 +8,7 @@ from langchain_core.retrievers import BaseRetriever
 from langchain_core.vectorstores import VectorStore
 # local imports
 import settings
+from ingest.parent_store import ParentStore
 
 class SearchType(str, Enum):
     """
@@ -23,11 +24,14 @@ class SearchType(str, Enum):
 
 class ParentDocumentRetriever(BaseRetriever):
     """
-    Custom ParentDocumentRetriever using just the vectorstore, no file storage needed
-    Parent chunks are added to the child chunks as metadata
+    Custom ParentDocumentRetriever using the vectorstore and the parent store of the vectorstore
+    The parent chunks of the retrieved child chunks are looked up in the parent store, vector stores that were
+    created before the parent store existed have the parent chunks in the metadata of the child chunks
     """
     # The underlying vectorstore to use to store small chunks
     vectorstore: VectorStore
+    # The store of the parent chunks, keyed by parent_chunk_id
+    parent_store: Optional[ParentStore] = None
     # Keyword arguments to pass to the search function
     search_kwargs: dict = Field(default_factory=dict)
     # Type of search to perform (similarity / similarity_score_threshold / mmr)
@@ -75,19 +79,19 @@ class ParentDocumentRetriever(BaseRetriever):
                 "search_type to be 'similarity', 'similarity_score_threshold' or 'mmr'"
             )
 
-        # get unique parent docs from child docs metadata
-        parent_docs = []
-        parent_chunk_ids = []
+        # get unique parent chunk ids from child docs metadata, in order of relevance
+        child_docs_by_parent_id = {}
         for child_doc in child_docs:
-            parent_chunk = child_doc.metadata['parent_chunk']
-            parent_chunk_id = child_doc.metadata['parent_chunk_id']
-            parent_doc = docstore.Document(
-                 page_content=parent_chunk,
-                 metadata=child_doc.metadata,
-                 )
-            if parent_chunk_id not in parent_chunk_ids:
-                parent_chunk_ids.append(parent_chunk_id)
-                parent_docs.append(parent_doc)
+            child_docs_by_parent_id.setdefault(child_doc.metadata['parent_chunk_id'], child_doc)
+        # look up the parent chunks of all child docs at once
+        parent_chunks = {}
+        if self.parent_store is not None:
+            parent_chunks = self.parent_store.get_texts(list(child_docs_by_parent_id.keys()))
+        parent_docs = []
+        for parent_chunk_id, child_doc in child_docs_by_parent_id.items():
+            parent_chunk = parent_chunks.get(parent_chunk_id, child_doc.metadata.get('parent_chunk'))
+            if parent_chunk is not None:
+                parent_docs.append(docstore.Document(page_content=parent_chunk, metadata=child_doc.metadata))
 
         # return maximally chunk_k parent docs
         return [parent_doc for parent_doc in parent_docs if parent_doc is not None][:settings.CHUNK_K]
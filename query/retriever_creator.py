@@ -1,4 +1,5 @@
 # imports
+from typing import List
 from loguru import logger
 from langchain_core.vectorstores import VectorStore
 from langchain.retrievers.multi_query import MultiQueryRetriever
@@ -8,6 +9,10 @@ from langchain_openai import ChatOpenAI
 # local imports
 import settings
 from query.retrieve_parent_chunks import ParentDocumentRetriever
+from ingest.parent_store import ParentStore
+from ingest.bm25_index import BM25Index, get_chunk_ids_from_filter, get_filenames_from_filter
+from query.bm25_retriever import PersistentBM25Retriever
+from query.hybrid_retriever import HybridRetriever
 
 
 class RetrieverCreator():
@@ -16,14 +21,20 @@ class RetrieverCreator():
     """
     def __init__(self, vectorstore: VectorStore, retriever_type: str = None, chunk_k: int = None,
                  chunk_k_child: int = None, search_type: str = None, score_threshold: float = None,
-                 multiquery: bool = None) -> None:
+                 multiquery: bool = None, parent_store: ParentStore = None, bm25_index: BM25Index = None,
+                 hybrid_fusion: str = None, hybrid_weights: List[float] = None, hybrid_candidate_k: int = None) -> None:
         self.vectorstore = vectorstore
+        self.parent_store = parent_store
+        self.bm25_index = bm25_index
         self.retriever_type = settings.RETRIEVER_TYPE if retriever_type is None else retriever_type
         self.chunk_k = settings.CHUNK_K if chunk_k is None else chunk_k
         self.chunk_k_child = settings.CHUNK_K_CHILD if chunk_k_child is None else chunk_k_child
         self.search_type = settings.SEARCH_TYPE if search_type is None else search_type
         self.score_threshold = settings.SCORE_THRESHOLD if score_threshold is None else score_threshold
         self.multiquery = settings.MULTIQUERY if multiquery is None else multiquery
+        self.hybrid_fusion = settings.HYBRID_FUSION if hybrid_fusion is None else hybrid_fusion
+        self.hybrid_weights = settings.HYBRID_WEIGHTS if hybrid_weights is None else hybrid_weights
+        self.hybrid_candidate_k = settings.HYBRID_CANDIDATE_K if hybrid_candidate_k is None else hybrid_candidate_k
 
     def get_retriever(self, search_filter=None):
         """
@@ -40,6 +51,28 @@ class RetrieverCreator():
                 search_kwargs["score_threshold"] = self.score_threshold
             retriever = self.vectorstore.as_retriever(search_type=self.search_type,
                                                       search_kwargs=search_kwargs)
+        elif self.retriever_type == "hybrid" and self.bm25_index is not None:
+            # persistent BM25 index that is kept up to date at ingest, built once for older vector stores
+            if not self.bm25_index.is_initialized():
+                self.bm25_index.initialize(self.vectorstore.get(include=["documents", "metadatas"]))
+            # the keyword and vector searches each retrieve candidate_k candidates, run concurrently
+            candidate_k = max(self.hybrid_candidate_k, self.chunk_k)
+            keyword_retriever = PersistentBM25Retriever(index=self.bm25_index, k=candidate_k,
+                                                        filenames=get_filenames_from_filter(search_filter),
+                                                        chunk_ids=get_chunk_ids_from_filter(search_filter))
+            search_kwargs = {}
+            if search_filter is not None:
+                search_kwargs["filter"] = search_filter
+            if self.search_type == "similarity_score_threshold":
+                search_kwargs["score_threshold"] = self.score_threshold
+            retriever = HybridRetriever(keyword_retriever=keyword_retriever,
+                                        vectorstore=self.vectorstore,
+                                        search_type=self.search_type,
+                                        search_kwargs=search_kwargs,
+                                        fusion=self.hybrid_fusion,
+                                        weights=self.hybrid_weights,
+                                        candidate_k=candidate_k,
+                                        k=self.chunk_k)
         elif self.retriever_type == "hybrid":
             # For BM25 retriever, a search filter on filename cannot directly be used
             # So first create a temporary collection with chunks of just the one file in the searchfilter
@@ -70,7 +103,8 @@ class RetrieverCreator():
             vectorstore_retriever = self.vectorstore.as_retriever(search_type=self.search_type,
                                                                   search_kwargs=search_kwargs)
             # Now set EnsembleRetriever for hybrid search
-            retriever = EnsembleRetriever(retrievers=[bm25_retriever, vectorstore_retriever], weights=[0.3, 0.7])
+            retriever = EnsembleRetriever(retrievers=[bm25_retriever, vectorstore_retriever],
+                                          weights=self.hybrid_weights)
         elif self.retriever_type == "parent":
             # Use the custom ParentDocumentRetriever that returns the parent docs associated with the child docs
             # maximum number of chunks to retrieve
@@ -82,6 +116,7 @@ class RetrieverCreator():
             if self.search_type == "similarity_score_threshold":
                 search_kwargs["score_threshold"] = self.score_threshold
             retriever = ParentDocumentRetriever(vectorstore=self.vectorstore,
+                                                parent_store=self.parent_store,
                                                 search_type=self.search_type,
                                                 search_kwargs=search_kwargs)
 
@@ -21,6 +21,68 @@ EVAL_APP_HEADER = "ChatPBL: evaluation"
 EVAL_APP_INFO = "./info/evaluation_explanation.txt"
 # CHAIN_VERBOSITY must be boolean. When set to True, the standalone question that is conveyed to LLM is shown
 CHAIN_VERBOSITY = False
+# INGEST_NUM_WORKERS represents the number of worker processes that parse, clean and split files during ingestion
+# Value must be integer (>=1). When set to 1, all files are processed one after another in the main process
+INGEST_NUM_WORKERS = 1
+# INGEST_BATCH_SIZE represents the maximum number of chunks that is added to the vector store in one call
+# Value must be integer (>=1)
+INGEST_BATCH_SIZE = 500
+# INGEST_STREAMING must be boolean. When set to True, files are parsed, cleaned and split page by page while the chunks
+# are added to the vector store in batches of INGEST_BATCH_SIZE, so that memory use does not depend on the size of
+# the documents. PDF files are then read twice: once for language detection and once for extraction of the text
+# Only applies when INGEST_NUM_WORKERS is 1
+INGEST_STREAMING = False
+# EMBEDDINGS_CACHE must be boolean. When set to True, document embeddings are stored in a persistent cache, keyed by
+# embeddings provider, embeddings model and chunk text, so that rebuilding a vector store with (partly) identical
+# chunks does not call the embeddings provider again for those chunks
+EMBEDDINGS_CACHE = True
+# filepath of the embeddings cache file, e.g. "./vector_stores/embeddings_cache.sqlite"
+EMBEDDINGS_CACHE_PATH = "./vector_stores/embeddings_cache.sqlite"
+# EMBEDDINGS_CACHE_MAX_SIZE_MB represents the maximum size of the cached vectors in megabytes, value must be integer
+# When exceeded, the least recently used vectors are removed from the cache
+EMBEDDINGS_CACHE_MAX_SIZE_MB = 2048
+# QUERY_EMBEDDINGS_CACHE_SIZE represents the number of question embeddings that are kept in memory, keyed by
+# embeddings provider, embeddings model and question text, so that repeated questions are not embedded again
+# value must be integer, 0 means no cache
+QUERY_EMBEDDINGS_CACHE_SIZE = 1024
+# RETRIEVAL_CACHE_SIZE represents the number of retrieval results that are kept in memory, keyed by vector store,
+# ingest generation, question embedding and retriever settings, so that repeated questions are not searched again
+# value must be integer, 0 means no cache. Only used when QUERY_EMBEDDINGS_CACHE_SIZE is larger than 0
+RETRIEVAL_CACHE_SIZE = 256
+# EMBEDDINGS_MAX_CONCURRENT_REQUESTS represents the maximum number of embedding requests that are in flight at the same
+# time during ingestion, value must be integer (>=1). When set to 1, embedding requests are sent one after another
+EMBEDDINGS_MAX_CONCURRENT_REQUESTS = 1
+# EMBEDDINGS_REQUEST_BATCH_SIZE represents the number of chunks that is embedded in one (concurrent) request
+EMBEDDINGS_REQUEST_BATCH_SIZE = 100
+# EMBEDDINGS_REQUESTS_PER_MINUTE and EMBEDDINGS_TOKENS_PER_MINUTE represent the quota of the embeddings provider
+# Value must be integer, 0 means no limit. Requests that are rate limited anyway are retried with exponential backoff
+EMBEDDINGS_REQUESTS_PER_MINUTE = 0
+EMBEDDINGS_TOKENS_PER_MINUTE = 0
+# PDF_PAGE_WORKERS represents the number of worker processes that extract the text of the pages of one PDF file
+# Value must be integer (>=1). When set to 1, the pages of a PDF file are extracted one after another
+# Only applies when INGEST_NUM_WORKERS is 1, otherwise the files themselves are already processed in parallel
+PDF_PAGE_WORKERS = 1
+# PDF_PAGE_WORKERS_MIN_PAGES represents the minimum number of pages of a PDF file for extraction with PDF_PAGE_WORKERS
+# worker processes. Value must be integer. Smaller PDF files are extracted in the main process
+PDF_PAGE_WORKERS_MIN_PAGES = 200
+# PARSE_CACHE must be boolean. When set to True, the parsed and cleaned text of each file is stored in a persistent
+# cache, keyed by the contents of the file, so that vector stores with other chunking settings for the same documents
+# do not parse the documents again
+PARSE_CACHE = True
+# filepath of the parse cache file, e.g. "./vector_stores/parse_cache.sqlite"
+PARSE_CACHE_PATH = "./vector_stores/parse_cache.sqlite"
+# PARSE_CACHE_MAX_SIZE_MB represents the maximum size of the cached (compressed) texts in megabytes, value must be
+# integer. When exceeded, the least recently used texts are removed from the cache
+PARSE_CACHE_MAX_SIZE_MB = 1024
+# DEDUP_CHUNKS must be boolean. When set to True, chunks that are near-duplicates of chunks already in the vector store
+# (e.g. boilerplate disclaimers, repeated appendices or other versions of the same report) are not embedded and stored
+# again. The sources of the near-duplicates are kept in a separate index next to the vector store. A retrieved chunk
+# lists the sources of its near-duplicates in metadata "duplicate_sources", and a selection of documents also finds
+# the chunks of the selected documents that are stored under another document
+DEDUP_CHUNKS = False
+# DEDUP_THRESHOLD represents the minimum similarity (estimated Jaccard similarity of the 5-word shingles of the chunks)
+# for chunks to be considered near-duplicates. Value must be float between 0.5 and 1.0
+DEDUP_THRESHOLD = 0.9
 
 
 # ######### THE SETTINGS BELOW CAN BE USED FOR TESTING AND CUSTOMIZED TO YOUR PREFERENCE ##########
@@ -68,8 +130,22 @@ EMBEDDINGS_PROVIDER = "azureopenai"
 #   "text-embedding-3-large" (3072 dimensional, max 8191 tokens)
 EMBEDDINGS_MODEL = "text-embedding-ada-002"
 
-# VECDB_TYPE must be one of: "chromadb",
+# VECDB_TYPE must be one of:
+# - "chromadb": Chroma vector database with approximate (HNSW) search
+# - "numpy": memory-mapped matrix of vectors with exact (brute-force) search, starts instantly and is fast and
+#   predictable for collections up to a few million chunks
 VECDB_TYPE = "chromadb"
+# VECDB_QUANTIZATION is only used when VECDB_TYPE is "numpy" and must be one of:
+# - "none": exact search over the full precision (float32) vectors
+# - "int8": first search pass over int8 quantized vectors (4x smaller), candidates are re-scored with the full
+#   precision vectors
+# - "binary": first search pass over 1-bit signatures of the vectors (32x smaller), candidates are re-scored with the
+#   full precision vectors
+# Use python -m benchmarks.benchmark_quantization to measure the recall for your collection
+VECDB_QUANTIZATION = "none"
+# VECDB_RESCORE_FACTOR represents the number of candidates per requested chunk that are re-scored with the full
+# precision vectors when VECDB_QUANTIZATION is "int8" or "binary". Value must be integer >= 1
+VECDB_RESCORE_FACTOR = 4
 
 # RETRIEVER_TYPE represents the type of retriever that is used to extract chunks from the vectorstore
 # Value must be one of:
@@ -82,6 +158,16 @@ VECDB_TYPE = "chromadb"
 # CHUNK_K_CHILD and CHUNK_OVERLAP_CHILD
 RETRIEVER_TYPE = "vectorstore"
 
+# HYBRID_FUSION represents the way the keyword and vector search results of the hybrid retriever are combined
+# value must be one of "rrf" (reciprocal rank fusion) or "weighted" (weighted sum of normalized scores)
+HYBRID_FUSION = "rrf"
+# HYBRID_WEIGHTS represents the weights of the keyword search and the vector search in the hybrid retriever
+# value must be a list of two floats [keyword weight, vector weight], e.g. [0.3, 0.7]
+HYBRID_WEIGHTS = [0.3, 0.7]
+# HYBRID_CANDIDATE_K represents the number of candidates each search of the hybrid retriever retrieves before fusion
+# value must be an integer, at least CHUNK_K
+HYBRID_CANDIDATE_K = 20
+
 # TEXT_SPLITTER_METHOD represents the way in which raw text chunks are created, must be one of:
 # "RecursiveCharacterTextSplitter" (split text to fixed size chunks) or
 # "NLTKTextSplitter" (keep full sentences even if chunk size is exceeded)
@@ -153,3 +239,14 @@ CHAIN_TYPE = "stuff"
 # value must be one of "openai_rag", "openai_rag_concise", "openai_rag_language", "yesno"
 # see file prompt_templates.py for explanation
 RETRIEVER_PROMPT_TEMPLATE = "openai_rag"
+
+# SEMANTIC_CACHE must be boolean. When set to True, the answers to standalone questions (the first question of a
+# conversation) are cached in memory, and a question that is nearly identical to an earlier question on the same
+# vector store, document selection and ingest generation gets the stored answer and sources without an LLM call
+SEMANTIC_CACHE = False
+# SEMANTIC_CACHE_MAX_DISTANCE represents the maximum cosine distance between the embeddings of a question and an
+# earlier question for the stored answer to be used, value must be float (>= 0 and < 2), e.g. 0.05
+SEMANTIC_CACHE_MAX_DISTANCE = 0.05
+# SEMANTIC_CACHE_SIZE represents the maximum number of answers cached per vector store and document selection,
+# value must be integer. When exceeded, the oldest answers are removed
+SEMANTIC_CACHE_SIZE = 1000
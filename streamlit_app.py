@@ -6,7 +6,7 @@ from PIL import Image
 from loguru import logger
 # local imports
 from ingest.ingester import Ingester
-from query.querier import Querier
+from query.query_engine import Conversation, QueryEngine
 from summarize.summarizer import Summarizer
 import settings
 import utils as ut
@@ -92,6 +92,15 @@ def display_chat_history() -> None:
     logger.info("Executed display_chat_history()")
 
 
+@st.cache_resource
+def language_models_loader() -> None:
+    """
+    Loads language detection and sentence tokenizer models, executed only once per server process
+    """
+    ut.warm_up()
+    logger.info("Executed language_models_loader()")
+
+
 @st.cache_data
 def vectordb_folder_creator() -> None:
     """
@@ -195,7 +204,7 @@ def document_selector(documents: List[str]) -> List[str]:
     return my_document_name_selected
 
 
-def check_vectordb(my_querier: Querier,
+def check_vectordb(my_conversation: Conversation,
                    my_folder_name_selected: str,
                    my_folder_path_selected: str,
                    my_vecdb_folder_path_selected: str,
@@ -207,8 +216,8 @@ def check_vectordb(my_querier: Querier,
 
     Parameters
     ----------
-    my_querier : Querier
-        the querier object
+    my_conversation : Conversation
+        the conversation of the session
     my_folder_name_selected : str
         the name of the selected folder
     my_folder_path_selected : str
@@ -231,18 +240,19 @@ def check_vectordb(my_querier: Querier,
                             content_folder=my_folder_path_selected,
                             vecdb_folder=my_vecdb_folder_path_selected,
                             embeddings_provider=my_embeddings_provider,
-                            embeddings_model=my_embeddings_model)
+                            embeddings_model=my_embeddings_model,
+                            embeddings=my_conversation.engine.embeddings)
         ingester.ingest()
 
     # create a new chain based on the new source folder
-    my_querier.make_chain(my_folder_name_selected, my_vecdb_folder_path_selected)
+    my_conversation.make_chain(my_folder_name_selected, my_vecdb_folder_path_selected)
     # set session state of selected folder to new source folder
     st.session_state['folder_selected'] = my_folder_name_selected
     logger.info("Executed check_vectordb")
 
 
 def handle_query(my_folder_path_selected: str,
-                 my_querier: Querier,
+                 my_conversation: Conversation,
                  my_prompt: str,
                  my_document_selection: List[str],
                  my_folder_name_selected: str,
@@ -254,8 +264,8 @@ def handle_query(my_folder_path_selected: str,
     ----------
     my_folder_path_selected : str
         path of selected document folder
-    my_querier : Querier
-        querier object
+    my_conversation : Conversation
+        conversation of the session
     my_prompt : str
         user prompt
     my_document_selection : List[str]
@@ -278,10 +288,10 @@ def handle_query(my_folder_path_selected: str,
             # create a filter for the selected documents
             my_filter = {'filename': {'$in': my_document_selection}}
             logger.info(f'Document Selection filter: {my_filter}')
-            my_querier.make_chain(my_folder_name_selected, my_vecdb_folder_path_selected, search_filter=my_filter)
+            my_conversation.make_chain(my_folder_name_selected, my_vecdb_folder_path_selected, search_filter=my_filter)
         else:
-            my_querier.make_chain(my_folder_name_selected, my_vecdb_folder_path_selected)
-        response = my_querier.ask_question(my_prompt)
+            my_conversation.make_chain(my_folder_name_selected, my_vecdb_folder_path_selected)
+        response = my_conversation.ask_question(my_prompt)
     # Display the response in chat message container
     with st.chat_message("assistant"):
         st.markdown(response["answer"])
@@ -304,6 +314,9 @@ def handle_query(my_folder_path_selected: str,
                 with exp_textcol:
                     # add 1 to metadata page_number because that starts at 0
                     st.write(f"**file: {filename}, page {pagenr + 1}**")
+                    # near-duplicates of the paragraph in other places, in case of chunk deduplication
+                    for duplicate in document.metadata.get('duplicate_sources', []):
+                        st.write(f"*also in file: {duplicate['filename']}, page {duplicate['page_number'] + 1}*")
                     st.write(f"{document.page_content}")
                 if filename.endswith(".pdf"):
                     with exp_imgcol:
@@ -324,7 +337,7 @@ def handle_query(my_folder_path_selected: str,
                 st.divider()
     else:
         logger.info("No source documents found relating to the question")
-    logger.info("Executed handle_query(querier, prompt)")
+    logger.info("Executed handle_query(conversation, prompt)")
 
 
 @st.cache_data
@@ -381,26 +394,43 @@ def initialize_session_state() -> None:
         st.session_state['messages'] = []
 
 
-# @st.cache_resource
-def initialize_querier(my_llm_provider: str,
-                       my_llm_model: str,
-                       my_embeddings_provider: str,
-                       my_embeddings_model: str) -> Querier:
+@st.cache_resource
+def query_engine_loader(my_llm_provider: str,
+                        my_llm_model: str,
+                        my_embeddings_provider: str,
+                        my_embeddings_model: str) -> QueryEngine:
+    """
+    Creates the QueryEngine of the given models, executed once per server process and shared by all sessions
+
+    Returns
+    -------
+    QueryEngine
+        QueryEngine object
+    """
+    my_engine = QueryEngine(llm_provider=my_llm_provider,
+                            llm_model=my_llm_model,
+                            embeddings_provider=my_embeddings_provider,
+                            embeddings_model=my_embeddings_model)
+    logger.info("Executed query_engine_loader()")
+
+    return my_engine
+
+
+def initialize_conversation(my_engine: QueryEngine) -> Conversation:
     """
-    Create a Querier object
+    Returns the Conversation object of the session, created once per session and when the models change
+    The models and cached chains of the engine are shared by all sessions, the chat history is kept per session
 
     Returns
     -------
-    Querier
-        Querier object
+    Conversation
+        Conversation object
     """
-    my_querier = Querier(llm_provider=my_llm_provider,
-                         llm_model=my_llm_model,
-                         embeddings_provider=my_embeddings_provider,
-                         embeddings_model=my_embeddings_model)
-    logger.info("Executed initialize_querier()")
+    if 'conversation' not in st.session_state or st.session_state['conversation'].engine is not my_engine:
+        st.session_state['conversation'] = Conversation(my_engine)
+        logger.info("Executed initialize_conversation()")
 
-    return my_querier
+    return st.session_state['conversation']
 
 
 def set_page_config() -> None:
@@ -416,10 +446,10 @@ def set_page_config() -> None:
 
 def clear_history() -> None:
     """
-    clear the querier history and UI histiry and reset session state
+    clear the conversation history and UI histiry and reset session state
     """
     st.session_state['messages'] = []
-    querier.clear_history()
+    conversation.clear_history()
     st.session_state['is_GO_clicked'] = False
 
 
@@ -428,6 +458,8 @@ def clear_history() -> None:
 set_page_config()
 # initialize page, executed only once per session
 initialize_page()
+# load language models, shared by all sessions
+language_models_loader()
 # create subfolder for vector databases if necessary
 vectordb_folder_creator()
 # create list of content folders
@@ -446,16 +478,18 @@ llm_provider, llm_model, embeddings_provider, embeddings_model = ut.get_relevant
 # determine name of associated vector database
 _, vecdb_folder_path = ut.create_vectordb_name(content_folder_name=folder_name_selected,
                                                embeddings_model=embeddings_model)
-# creation of Querier object, executed only once per session
-querier = initialize_querier(my_llm_provider=llm_provider,
+# QueryEngine object of the models, shared by all sessions
+engine = query_engine_loader(my_llm_provider=llm_provider,
                              my_llm_model=llm_model,
                              my_embeddings_provider=embeddings_provider,
                              my_embeddings_model=embeddings_model)
-# clear querier history if a switch in confidentiality is made
+# Conversation object of the session, created once per session and when the models change
+conversation = initialize_conversation(engine)
+# clear conversation history if a switch in confidentiality is made
 if confidential != st.session_state['confidential']:
     clear_history()
 st.session_state['confidential'] = confidential
-# clear querier history if a different folder or (set of) document(s) is chosen
+# clear conversation history if a different folder or (set of) document(s) is chosen
 if (folder_name_selected != st.session_state['folder_selected']) or \
    (document_selection != st.session_state['document_selected']):
     clear_history()
@@ -467,7 +501,7 @@ st.sidebar.button("GO", type="primary", on_click=click_go_button)
 if st.session_state['is_GO_clicked']:
     logger.info("GO button is clicked")
     # create or update vector database if necessary
-    check_vectordb(my_querier=querier,
+    check_vectordb(my_conversation=conversation,
                    my_folder_name_selected=folder_name_selected,
                    my_folder_path_selected=folder_path_selected,
                    my_vecdb_folder_path_selected=vecdb_folder_path,
@@ -488,17 +522,17 @@ if st.session_state['is_GO_clicked']:
     clear_messages_button = st.button(label="Clear Conversation", key="clear")
     # if button "Clear Conversation" is clicked
     if clear_messages_button:
-        # clear all chat messages on screen and in Querier object
+        # clear all chat messages on screen and in Conversation object
         # NB: session state of "is_GO_clicked" and "folder_selected" remain unchanged
         st.session_state['messages'] = []
-        querier.clear_history()
+        conversation.clear_history()
         logger.info("Clear Conversation button clicked")
     # display chat messages from history
     display_chat_history()
     # react to user input if a question has been asked
     if prompt := st.chat_input("Your question"):
         handle_query(my_folder_path_selected=folder_path_selected,
-                     my_querier=querier,
+                     my_conversation=conversation,
                      my_prompt=prompt,
                      my_document_selection=document_selection,
                      my_folder_name_selected=folder_name_selected,
@@ -0,0 +1,65 @@
+'''Unit testing for the persistent BM25 index of the hybrid retriever'''
+
+# global imports
+import unittest
+import sys
+import tempfile
+from pathlib import Path
+from langchain_core.documents import Document
+
+# local imports
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from ingest.bm25_index import BM25Index, get_chunk_ids_from_filter, get_filenames_from_filter, has_bm25_index
+
+
+class BM25IndexTest(unittest.TestCase):
+    '''test scoring, filename filters and incremental updates'''
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.index = BM25Index(self.folder.name)
+        texts = {"a.pdf": ["Nitrogen emissions of agriculture", "Housing and mobility"],
+                 "b.pdf": ["Nitrogen deposition in nature areas, nitrogen policy", "Water quality"]}
+        documents = [Document(page_content=text, metadata={"filename": filename})
+                     for filename, file_texts in texts.items() for text in file_texts]
+        self.index.add_documents(documents, ["a1", "a2", "b1", "b2"])
+
+    def tearDown(self):
+        self.index.connection.close()
+        self.folder.cleanup()
+
+    def test_search(self):
+        '''only chunks with query terms are returned, best match first, restricted to the filtered files'''
+        results = self.index.search("NITROGEN policy", k=4)
+        self.assertEqual([document.page_content for document, _ in results],
+                         ["Nitrogen deposition in nature areas, nitrogen policy", "Nitrogen emissions of agriculture"])
+        results = self.index.search("nitrogen", k=4, filenames=get_filenames_from_filter({"filename": "a.pdf"}))
+        self.assertEqual([document.metadata["filename"] for document, _ in results], ["a.pdf"])
+
+    def test_widened_filter(self):
+        '''a filename filter widened with chunk ids also returns those chunks'''
+        search_filter = {"$or": [{"filename": "a.pdf"}, {"chunk_id": {"$in": ["b1"]}}]}
+        self.assertEqual(get_filenames_from_filter(search_filter), ["a.pdf"])
+        self.assertEqual(get_chunk_ids_from_filter(search_filter), ["b1"])
+        self.assertIsNone(get_chunk_ids_from_filter({"filename": "a.pdf"}))
+        results = self.index.search("nitrogen", k=4, filenames=["a.pdf"], chunk_ids=["b1"])
+        self.assertEqual(len(results), 2)
+
+    def test_has_bm25_index(self):
+        '''checking for an index does not create one'''
+        self.assertTrue(has_bm25_index(self.folder.name))
+        with tempfile.TemporaryDirectory() as other_folder:
+            self.assertFalse(has_bm25_index(other_folder))
+            self.assertFalse(has_bm25_index(other_folder))
+
+    def test_remove_files(self):
+        '''removed files are not found by a second index object on the same folder'''
+        self.index.remove_files(["b.pdf"])
+        other_index = BM25Index(self.folder.name)
+        self.assertEqual([document.page_content for document, _ in other_index.search("nitrogen water", k=4)],
+                         ["Nitrogen emissions of agriculture"])
+        other_index.connection.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+'''Unit testing for the chain cache of the QueryEngine and the per-session Conversation state'''
+
+# global imports
+import unittest
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+# local imports
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import settings
+import utils as ut
+from ingest.document_catalog import CATALOG_NAME
+from query.query_engine import Conversation, QueryEngine, normalize_search_filter
+
+
+class ChainCacheTest(unittest.TestCase):
+    '''test search filter normalization and the ingest generation of a vector store'''
+
+    def test_normalize_search_filter(self):
+        '''equivalent document selections have the same key, different selections do not'''
+        self.assertEqual(normalize_search_filter({"filename": {"$in": ["b.pdf", "a.pdf"]}}),
+                         normalize_search_filter({"filename": {"$in": ["a.pdf", "b.pdf"]}}))
+        self.assertNotEqual(normalize_search_filter({"filename": {"$in": ["a.pdf"]}}),
+                            normalize_search_filter({"filename": {"$in": ["a.pdf", "b.pdf"]}}))
+        self.assertIsNone(normalize_search_filter(None))
+
+    def test_ingest_generation(self):
+        '''a new vector store folder has generation 0, each bump increments it'''
+        with tempfile.TemporaryDirectory() as vecdb_folder:
+            self.assertEqual(ut.get_ingest_generation(vecdb_folder), 0)
+            self.assertEqual(ut.bump_ingest_generation(vecdb_folder), 1)
+            self.assertEqual(ut.bump_ingest_generation(vecdb_folder), 2)
+            self.assertEqual(ut.get_ingest_generation(vecdb_folder), 2)
+
+
+@mock.patch.object(settings, "RETRIEVER_TYPE", "vectorstore")
+@mock.patch.object(settings, "RETRIEVAL_CACHE_SIZE", 0)
+@mock.patch("query.query_engine.DocumentCatalog", mock.MagicMock())
+@mock.patch("query.query_engine.RetrieverCreator", mock.MagicMock())
+@mock.patch("query.query_engine.VectorStoreCreator", mock.MagicMock())
+@mock.patch("query.query_engine.resource_pool", mock.MagicMock())
+class GetChainTest(unittest.TestCase):
+    '''test reuse and invalidation of cached chains, with a stub chain factory'''
+
+    def setUp(self):
+        QueryEngine._chain_cache.clear()
+        self.folder = tempfile.TemporaryDirectory()
+        self.chain_factory = mock.patch("query.query_engine.ConversationalRetrievalChain.from_llm",
+                                        side_effect=lambda **kwargs: object()).start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+        QueryEngine._chain_cache.clear()
+        self.folder.cleanup()
+
+    def get_chain(self, search_filter=None, **engine_settings):
+        engine = QueryEngine(chain_name="conversationalretrievalchain", **engine_settings)
+        return engine.get_chain("content", self.folder.name, search_filter)[2]
+
+    def test_same_settings(self):
+        '''a second engine with the same settings, folder and filter reuses the cached chain'''
+        chain = self.get_chain({"filename": {"$in": ["a.pdf", "b.pdf"]}})
+        self.assertIs(self.get_chain({"filename": {"$in": ["b.pdf", "a.pdf"]}}), chain)
+        self.assertEqual(self.chain_factory.call_count, 1)
+
+    def test_changed_settings(self):
+        '''a different filter, engine setting or retriever setting builds a new chain'''
+        chain = self.get_chain()
+        self.assertIsNot(self.get_chain({"filename": "a.pdf"}), chain)
+        self.assertIsNot(self.get_chain(llm_model="other-model"), chain)
+        with mock.patch.object(settings, "SEARCH_TYPE", "mmr" if settings.SEARCH_TYPE != "mmr" else "similarity"):
+            self.assertIsNot(self.get_chain(), chain)
+        self.assertIs(self.get_chain(), chain)
+        self.assertEqual(self.chain_factory.call_count, 4)
+
+    def test_ingest_invalidates(self):
+        '''an ingest run that changed the vector store invalidates the cached chain'''
+        chain = self.get_chain()
+        ut.bump_ingest_generation(self.folder.name)
+        new_chain = self.get_chain()
+        self.assertIsNot(new_chain, chain)
+        self.assertIs(self.get_chain(), new_chain)
+        self.assertEqual(self.chain_factory.call_count, 2)
+
+    def test_catalog(self):
+        '''the document catalog is only opened when the vector store has one, it is not created'''
+        engine = QueryEngine(chain_name="conversationalretrievalchain")
+        self.assertIsNone(engine.get_chain("content", self.folder.name)[1])
+        self.assertFalse((Path(self.folder.name) / CATALOG_NAME).exists())
+        (Path(self.folder.name) / CATALOG_NAME).touch()
+        ut.bump_ingest_generation(self.folder.name)
+        self.assertIsNotNone(engine.get_chain("content", self.folder.name)[1])
+
+
+class EchoEngine:
+    '''engine that answers with the number of earlier messages in the chat history'''
+
+    def answer(self, chain, question, chat_history, chain_key=None, vecdb_folder=None):
+        return {"answer": f"{question} after {len(chat_history)} messages", "source_documents": []}
+
+
+class ConversationTest(unittest.TestCase):
+    '''test that conversations on a shared engine keep separate chat histories'''
+
+    def test_separate_histories(self):
+        engine = EchoEngine()
+        first, second = Conversation(engine), Conversation(engine)
+        first.ask_question("a")
+        first.ask_question("b")
+        self.assertEqual(second.ask_question("c")["answer"], "c after 0 messages")
+        self.assertEqual(len(first.chat_history), 4)
+        first.clear_history()
+        self.assertEqual(first.ask_question("d")["answer"], "d after 0 messages")
+
+
+if __name__ == "__main__":
+    unittest.main()
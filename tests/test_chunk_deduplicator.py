@@ -0,0 +1,114 @@
+'''Unit testing for the near-duplicate detection of chunks at ingest'''
+
+# global imports
+import unittest
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock
+from langchain.docstore.document import Document
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_community.llms.fake import FakeListLLM
+
+# local imports
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import settings
+from ingest.chunk_deduplicator import ChunkDeduplicator
+from ingest.ingester import Ingester
+from query.query_engine import QueryEngine
+
+
+DISCLAIMER = ("This report was prepared for internal use only. No rights can be derived from its contents and the "
+              "authors accept no liability for any damage resulting from decisions based on the information in it.")
+
+
+class ChunkDeduplicatorTest(unittest.TestCase):
+    '''test that near-duplicates are stored once and point back to their sources'''
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.deduplicator = ChunkDeduplicator(self.folder.name, threshold=0.8)
+
+    def tearDown(self):
+        self.deduplicator.connection.close()
+        self.folder.cleanup()
+
+    def test_filter(self):
+        '''a near-identical chunk is removed, a different chunk is kept'''
+        documents = [Document(page_content=DISCLAIMER, metadata={"filename": "a.pdf", "page_number": 1}),
+                     Document(page_content="Air traffic at the airport grew by five percent last year.",
+                              metadata={"filename": "a.pdf", "page_number": 2}),
+                     Document(page_content=DISCLAIMER + " Version 2.",
+                              metadata={"filename": "b.pdf", "page_number": 7})]
+        kept_documents, kept_ids = self.deduplicator.filter(documents, ["1", "2", "3"])
+        self.assertEqual(kept_ids, ["1", "2"])
+        self.assertEqual(kept_documents, documents[:2])
+        self.assertEqual(self.deduplicator.get_sources(kept_ids),
+                         {"1": [{"filename": "b.pdf", "page_number": 7, "source": None}]})
+        # b.pdf depends on chunk 1 of a.pdf, so it must be ingested again when a.pdf is removed
+        self.assertEqual(self.deduplicator.get_dependent_files(["a.pdf"]), ["b.pdf"])
+        self.assertEqual(self.deduplicator.get_dependent_files(["b.pdf"]), [])
+        self.deduplicator.remove_files(["a.pdf", "b.pdf"])
+        self.assertEqual(self.deduplicator.get_sources(kept_ids), {})
+        _, kept_ids = self.deduplicator.filter(documents[2:], ["4"])
+        self.assertEqual(kept_ids, ["4"])
+
+
+@mock.patch.object(settings, "SEARCH_TYPE", "similarity")
+@mock.patch.object(settings, "CHUNK_K", 10)
+@mock.patch.object(settings, "MULTIQUERY", False)
+@mock.patch.object(settings, "RETRIEVAL_CACHE_SIZE", 0)
+class DeduplicatedRetrievalTest(unittest.TestCase):
+    '''test that a retrieved deduplicated chunk points back to all its sources, also with a selection of files'''
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.content_folder = Path(self.folder.name) / "dedup_test"
+        self.content_folder.mkdir()
+        for filename, text in [("a.txt", "Air traffic at the airport grew by five percent last year."),
+                               ("b.txt", "The number of houses near the airport did not change."),
+                               ("c.txt", "Noise complaints were mostly about night flights.")]:
+            (self.content_folder / filename).write_text(f"{text}\n\n{DISCLAIMER}\n", encoding="utf-8")
+        self.embeddings = DeterministicFakeEmbedding(size=32)
+        resource_pool = mock.patch("query.query_engine.resource_pool").start()
+        resource_pool.get_llm.return_value = FakeListLLM(responses=["answer"])
+        resource_pool.get_embeddings.return_value = self.embeddings
+        QueryEngine._chain_cache.clear()
+
+    def tearDown(self):
+        mock.patch.stopall()
+        QueryEngine._chain_cache.clear()
+        self.folder.cleanup()
+
+    def retrieve(self, vecdb_folder, search_filter=None):
+        engine = QueryEngine(chain_name="conversationalretrievalchain")
+        _, _, chain = engine.get_chain("dedup_test", vecdb_folder, search_filter)
+        return {(document.metadata["filename"], document.page_content):
+                sorted(source["filename"] for source in document.metadata.get("duplicate_sources", []))
+                for document in chain.retriever.invoke(DISCLAIMER)}
+
+    def test_duplicate_sources(self):
+        '''with the vector store and the hybrid retriever'''
+        for retriever_type in ["vectorstore", "hybrid"]:
+            with self.subTest(retriever_type=retriever_type), \
+                    mock.patch.object(settings, "RETRIEVER_TYPE", retriever_type):
+                vecdb_folder = str(Path(self.folder.name) / f"vecdb_{retriever_type}")
+                Ingester("dedup_test", str(self.content_folder), vecdb_folder, retriever_type=retriever_type,
+                         vecdb_type="chromadb", text_splitter_method="RecursiveCharacterTextSplitter",
+                         chunk_size=220, chunk_overlap=0, num_workers=1, embeddings=self.embeddings,
+                         parse_cache=False, dedup_chunks=True).ingest()
+                # the disclaimer is stored once, with the other files as duplicate sources
+                chunks = self.retrieve(vecdb_folder)
+                self.assertEqual(len(chunks), 4)
+                stored_file = [filename for filename, text in chunks if text == DISCLAIMER][0]
+                self.assertEqual(chunks[(stored_file, DISCLAIMER)],
+                                 sorted({"a.txt", "b.txt", "c.txt"} - {stored_file}))
+                # a selected file also finds its chunk that is stored under another file
+                selected_file = "c.txt" if stored_file != "c.txt" else "b.txt"
+                chunks = self.retrieve(vecdb_folder, {"filename": {"$in": [selected_file]}})
+                self.assertEqual(len(chunks), 2)
+                self.assertIn((stored_file, DISCLAIMER), chunks)
+
+
+if __name__ == "__main__":
+    unittest.main()
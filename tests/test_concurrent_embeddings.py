@@ -0,0 +1,106 @@
+'''Unit testing for concurrent, rate limited embedding requests'''
+
+# global imports
+import unittest
+import sys
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from pathlib import Path
+from langchain_core.embeddings import Embeddings
+
+# local imports
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from ingest.concurrent_embeddings import ConcurrentEmbeddings, TokenBucket, is_rate_limit_error
+
+
+class RateLimitError(Exception):
+    '''stub of a 429 response from an embeddings provider'''
+    status_code = 429
+
+
+class StubEmbeddings(Embeddings):
+    '''local stub of an embeddings provider with latency, that rate limits the first requests'''
+
+    def __init__(self, latency: float = 0.05, rate_limited_requests: int = 0):
+        self.latency = latency
+        self.rate_limited_requests = rate_limited_requests
+        self.num_requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return [float(len(text)), 1.0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.num_requests += 1
+        if self.num_requests <= self.rate_limited_requests:
+            raise RateLimitError("Error code: 429 - rate limit reached")
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.latency)
+        self.in_flight -= 1
+        return self.embed_documents(texts)
+
+
+class TestConcurrentEmbeddings(unittest.TestCase):
+    '''test concurrency, ordering and backoff of ConcurrentEmbeddings'''
+
+    def test_concurrency_and_order(self):
+        stub = StubEmbeddings()
+        embeddings = ConcurrentEmbeddings(stub, max_concurrency=4, batch_size=2)
+        texts = ["x" * i for i in range(1, 17)]
+        start = time.monotonic()
+        vectors = embeddings.embed_documents(texts)
+        duration = time.monotonic() - start
+        self.assertEqual(vectors, stub.embed_documents(texts))
+        self.assertEqual(stub.max_in_flight, 4)
+        # 8 requests of 0.05 seconds, 4 at a time
+        self.assertLess(duration, 8 * stub.latency)
+
+    def test_backoff_on_rate_limit(self):
+        stub = StubEmbeddings(latency=0.0, rate_limited_requests=1)
+        embeddings = ConcurrentEmbeddings(stub, max_concurrency=1, batch_size=10, max_retries=2)
+        vectors = embeddings.embed_documents(["a", "bb"])
+        self.assertEqual(vectors, [[1.0, 1.0], [2.0, 1.0]])
+        self.assertEqual(stub.num_requests, 2)
+
+    def test_token_bucket_limits_rate(self):
+        async def take(bucket, times):
+            for _ in range(times):
+                await bucket.acquire(1)
+        # 600 per minute = 10 per second, the first 600 are available immediately
+        bucket = TokenBucket(600)
+        bucket.tokens = 0
+        start = time.monotonic()
+        asyncio.run(take(bucket, 3))
+        self.assertGreaterEqual(time.monotonic() - start, 0.25)
+
+    def test_rate_shared_across_calls(self):
+        '''the token budget of one call is not available again to the next calls, also not from other threads'''
+        stub = StubEmbeddings(latency=0.0)
+        # 6000 tokens per minute = 100 tokens per second, with a burst of 6000 tokens
+        embeddings = ConcurrentEmbeddings(stub, max_concurrency=4, batch_size=10, tokens_per_minute=6000)
+        # a text of 23996 characters is estimated at 6000 tokens, which uses up the complete burst
+        embeddings.embed_documents(["x" * 23996])
+        start = time.monotonic()
+        embeddings.embed_documents(["y" * 36])
+        # two more calls of 10 tokens each from other threads
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            list(executor.map(embeddings.embed_documents, [["z" * 36], ["w" * 36]]))
+        # 30 tokens at 100 tokens per second
+        self.assertGreaterEqual(time.monotonic() - start, 0.25)
+        self.assertEqual(stub.num_requests, 4)
+
+    def test_rate_limit_error(self):
+        '''only 429 responses are rate limit errors, not any message that contains 429'''
+        self.assertTrue(is_rate_limit_error(RateLimitError("Error code: 429")))
+        self.assertFalse(is_rate_limit_error(ValueError("document 429 could not be parsed")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+'''Unit testing for the ingest state of files in the document catalog'''
+
+# global imports
+import unittest
+import sys
+import tempfile
+from pathlib import Path
+
+# local imports
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from ingest.document_catalog import DocumentCatalog
+
+
+class DocumentCatalogTest(unittest.TestCase):
+    '''test the pending - embedding - committed life cycle of files in the catalog'''
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.catalog = DocumentCatalog(self.folder.name)
+        self.catalog.initialize()
+
+    def tearDown(self):
+        self.catalog.connection.close()
+        self.folder.cleanup()
+
+    def test_interrupted_ingest(self):
+        '''only committed files are in the vector store, the chunks of other files are known for rollback'''
+        self.catalog.set_pending(["a.pdf", "b.pdf", "c.pdf"])
+        self.catalog.add_chunks({"a.pdf": ["1", "2"], "b.pdf": ["3"]})
+        self.catalog.commit_file("a.pdf", {"filename": "a.pdf"})
+        # interruption: b.pdf is partly embedded, c.pdf was not started
+        self.assertEqual(self.catalog.get_files(), ["a.pdf"])
+        self.assertEqual(sorted(self.catalog.get_uncommitted_files()), ["b.pdf", "c.pdf"])
+        self.assertEqual(self.catalog.get_chunk_ids(self.catalog.get_uncommitted_files()), ["3"])
+        self.assertIsNone(self.catalog.get_metadata("b.pdf"))
+        self.assertEqual(self.catalog.get_metadata("a.pdf"), {"filename": "a.pdf"})
+        # rollback
+        self.catalog.remove_files(self.catalog.get_uncommitted_files())
+        self.assertEqual(self.catalog.get_uncommitted_files(), [])
+        self.assertEqual(self.catalog.get_chunk_ids(["a.pdf", "b.pdf"]), ["1", "2"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+'''Unit testing for the persistent cache of document embeddings'''
+
+# global imports
+import unittest
+import sys
+import itertools
+import tempfile
+from pathlib import Path
+from unittest import mock
+from langchain_core.embeddings import Embeddings
+
+# local imports
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from ingest.embeddings_cache import CachedEmbeddings
+
+
+class RecordingEmbeddings(Embeddings):
+    '''fake embeddings that record the texts sent to the provider'''
+
+    def __init__(self):
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts.extend(texts)
+        return [[float(len(text)), float(ord(text[0])), 0.5, 0.25] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class CachedEmbeddingsTest(unittest.TestCase):
+    '''test cache hits, the cache key and least recently used eviction'''
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.cache_path = str(Path(self.folder.name) / "embeddings_cache.sqlite")
+        # distinct last used times, also for calls within the clock resolution
+        mock.patch("ingest.embeddings_cache.time").start().time.side_effect = itertools.count()
+        self.caches = []
+
+    def tearDown(self):
+        mock.patch.stopall()
+        for cache in self.caches:
+            cache.connection.close()
+        self.folder.cleanup()
+
+    def get_cache(self, embeddings_provider="fake", embeddings_model="fake", max_size_mb=1):
+        cache = CachedEmbeddings(RecordingEmbeddings(), embeddings_provider, embeddings_model, self.cache_path,
+                                 max_size_mb)
+        self.caches.append(cache)
+        return cache
+
+    def test_hits(self):
+        '''only texts that are not in the cache are embedded, each once, the cached vectors are equal'''
+        cache = self.get_cache()
+        vectors = cache.embed_documents(["apple", "pear", "apple"])
+        self.assertEqual(cache.embeddings.texts, ["apple", "pear"])
+        self.assertEqual(cache.embed_documents(["pear", "plum"]), [vectors[1], [4.0, 112.0, 0.5, 0.25]])
+        self.assertEqual(cache.embeddings.texts, ["apple", "pear", "plum"])
+
+    def test_key(self):
+        '''the cache is persistent and keyed by provider and model'''
+        self.get_cache().embed_documents(["apple"])
+        same_model = self.get_cache()
+        same_model.embed_documents(["apple"])
+        self.assertEqual(same_model.embeddings.texts, [])
+        for other_model in (self.get_cache(embeddings_model="other"), self.get_cache(embeddings_provider="other")):
+            other_model.embed_documents(["apple"])
+            self.assertEqual(other_model.embeddings.texts, ["apple"])
+
+    def test_eviction(self):
+        '''when the cache is full, the least recently used vectors are removed first'''
+        cache = self.get_cache()
+        # room for 3 vectors of 4 float32 values
+        cache.max_size_bytes = 3 * 16
+        for text in ["apple", "banana", "cherry", "apple", "date"]:
+            cache.embed_documents([text])
+        self.assertEqual(cache.embeddings.texts, ["apple", "banana", "cherry", "date"])
+        cache.embed_documents(["apple", "date", "banana"])
+        self.assertEqual(cache.embeddings.texts[4:], ["banana"])
+
+
+if __name__ == "__main__":
+    unittest.main()
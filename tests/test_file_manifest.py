@@ -0,0 +1,81 @@
+'''Unit testing for the detection of modified files with the file manifest'''
+
+# global imports
+import unittest
+import os
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+# local imports
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import utils as ut
+from ingest.file_manifest import FileManifest
+
+
+class FileManifestTest(unittest.TestCase):
+    '''test that only files with changed content are reported as modified'''
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.content_folder = os.path.join(self.folder.name, "content")
+        os.makedirs(self.content_folder)
+        for filename in ["a.txt", "b.txt", "c.txt"]:
+            self.write_file(filename, f"contents of {filename}")
+        self.manifest = FileManifest(os.path.join(self.folder.name, "vecdb"))
+        for filename in ["a.txt", "b.txt", "c.txt"]:
+            self.manifest.update(self.content_folder, filename)
+        self.manifest.save()
+        # a new manifest object reads the saved manifest
+        self.manifest = FileManifest(os.path.join(self.folder.name, "vecdb"))
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def write_file(self, filename, contents):
+        file_path = os.path.join(self.content_folder, filename)
+        with open(file=file_path, mode="w", encoding="utf8") as f:
+            f.write(contents)
+
+    def touch(self, filename):
+        '''sets a later modification time'''
+        file_path = os.path.join(self.content_folder, filename)
+        os.utime(file_path, (os.stat(file_path).st_atime, os.stat(file_path).st_mtime + 10))
+
+    def test_unchanged(self):
+        '''unchanged files are not reported and not opened'''
+        with mock.patch.object(ut, "get_file_hash", wraps=ut.get_file_hash) as get_file_hash:
+            self.assertEqual(self.manifest.get_modified_files(self.content_folder, ["a.txt", "b.txt", "c.txt"]), [])
+        self.assertEqual(get_file_hash.call_count, 0)
+
+    def test_content_changed(self):
+        '''a file with other contents is reported, also when its size is the same'''
+        self.write_file("a.txt", "CONTENTS of a.txt")
+        self.touch("a.txt")
+        self.write_file("b.txt", "longer contents of b.txt")
+        self.assertEqual(self.manifest.get_modified_files(self.content_folder, ["a.txt", "b.txt", "c.txt"]),
+                         ["a.txt", "b.txt"])
+
+    def test_touched(self):
+        '''a touched file is not reported, its entry gets the new modification time so it is not hashed again'''
+        self.touch("a.txt")
+        self.assertEqual(self.manifest.get_modified_files(self.content_folder, ["a.txt"]), [])
+        self.assertEqual(self.manifest.entries["a.txt"]["mtime"],
+                         os.stat(os.path.join(self.content_folder, "a.txt")).st_mtime)
+        with mock.patch.object(ut, "get_file_hash", wraps=ut.get_file_hash) as get_file_hash:
+            self.assertEqual(self.manifest.get_modified_files(self.content_folder, ["a.txt"]), [])
+        self.assertEqual(get_file_hash.call_count, 0)
+
+    def test_removed(self):
+        '''a file removed from the manifest is recorded again as it is now, not reported as modified'''
+        self.manifest.remove(["a.txt"])
+        self.assertNotIn("a.txt", self.manifest.entries)
+        self.write_file("a.txt", "new contents of a.txt")
+        self.assertEqual(self.manifest.get_modified_files(self.content_folder, ["a.txt"]), [])
+        self.assertEqual(self.manifest.entries["a.txt"]["hash"],
+                         ut.get_file_hash(os.path.join(self.content_folder, "a.txt")))
+
+
+if __name__ == '__main__':
+    unittest.main()
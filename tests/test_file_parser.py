@@ -0,0 +1,61 @@
+'''Unit testing for the extraction of PDF pages, serially, with page worker processes and streaming'''
+
+# global imports
+import unittest
+import sys
+import tempfile
+from pathlib import Path
+import fitz
+
+# local imports
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from ingest.file_parser import FileParser
+
+NUM_PAGES = 7
+
+
+def write_pdf(file_path: str) -> None:
+    '''a PDF file with a paragraph header, two paragraphs and a page number on each page'''
+    doc = fitz.open()
+    for page_number in range(1, NUM_PAGES + 1):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Chapter {page_number}")
+        page.insert_text((72, 150), f"Page {page_number} describes air traffic at the airport in year "
+                         f"{2000 + page_number}.")
+        page.insert_text((72, 250), f"Noise complaints on page {page_number} were mostly about night flights.")
+        page.insert_text((300, 800), str(page_number))
+    doc.save(file_path)
+    doc.close()
+
+
+class FileParserTest(unittest.TestCase):
+    '''test that the way the pages of a PDF file are extracted does not change the outcome'''
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.file_path = str(Path(self.folder.name) / "airport.pdf")
+        write_pdf(self.file_path)
+        self.serial_pages, self.serial_metadata = FileParser(page_workers=1).parse_pymupdf(self.file_path)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_serial(self):
+        '''every page is extracted, the page numbers are left out'''
+        self.assertEqual(sorted({page_number for page_number, _ in self.serial_pages}), list(range(NUM_PAGES)))
+        self.assertTrue(any("year 2007" in text for _, text in self.serial_pages))
+        self.assertFalse(any(text.strip() == "3" for _, text in self.serial_pages))
+
+    def test_page_workers(self):
+        '''extraction with page worker processes gives the same pages in the same order'''
+        file_parser = FileParser(page_workers=2, page_workers_min_pages=2)
+        self.assertEqual(file_parser.parse_pymupdf(self.file_path), (self.serial_pages, self.serial_metadata))
+
+    def test_streaming(self):
+        '''streaming extraction gives the same pages in the same order and the same metadata'''
+        pages, metadata = FileParser(page_workers=1).iter_file(self.file_path)
+        self.assertEqual((list(pages), metadata), (self.serial_pages, self.serial_metadata))
+
+
+if __name__ == '__main__':
+    unittest.main()
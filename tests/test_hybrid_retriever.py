@@ -0,0 +1,40 @@
+'''Unit testing for the rank fusion of the hybrid retriever'''
+
+# global imports
+import unittest
+import sys
+from pathlib import Path
+from langchain_core.documents import Document
+
+# local imports
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from query.hybrid_retriever import fuse
+
+
+def chunk(text: str) -> Document:
+    return Document(page_content=text, metadata={"filename": "a.pdf"})
+
+
+class FuseTest(unittest.TestCase):
+    '''test reciprocal rank fusion and weighted score fusion'''
+
+    def setUp(self):
+        self.keyword_results = [(chunk("a"), 12.0), (chunk("b"), 3.0)]
+        self.vector_results = [(chunk("c"), 0.9), (chunk("b"), 0.8), (chunk("d"), 0.1)]
+
+    def test_rrf(self):
+        '''chunks found by both searches rank first, the weights decide between the other first ranks'''
+        fused = fuse([self.keyword_results, self.vector_results], [0.3, 0.7], "rrf", k=4)
+        self.assertEqual([document.page_content for document in fused], ["b", "c", "d", "a"])
+
+    def test_weighted(self):
+        '''scores are normalized per search, searches without scores are ranked by position'''
+        fused = fuse([self.keyword_results, self.vector_results], [0.6, 0.4], "weighted", k=4)
+        self.assertEqual([document.page_content for document in fused], ["a", "c", "b", "d"])
+        unscored_results = [(document, None) for document, _ in self.vector_results]
+        fused = fuse([self.keyword_results, unscored_results], [0.3, 0.7], "weighted", k=2)
+        self.assertEqual([document.page_content for document in fused], ["c", "b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+'''Unit testing for the ingest runs of the Ingester, with fake embeddings'''
+
+# global imports
+import unittest
+import os
+import sys
+import json
+import tempfile
+from pathlib import Path
+from unittest import mock
+from langchain_community.embeddings import DeterministicFakeEmbedding
+
+# local imports
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import utils as ut
+from ingest.ingester import Ingester
+from ingest.document_writer import DocumentWriter
+from ingest.document_catalog import DocumentCatalog
+from ingest.vectorstore_creator import VectorStoreCreator
+from tests.test_file_parser import write_pdf
+
+PARAGRAPHS = ["Air traffic at the airport grew by five percent last year.",
+              "The number of houses near the airport did not change.",
+              "Noise complaints were mostly about night flights.",
+              "A new runway is planned for the next decade.",
+              "Most passengers travel to destinations in Europe."]
+
+
+def write_content_folder(content_folder: Path) -> None:
+    '''three text files of three or more paragraphs'''
+    content_folder.mkdir()
+    for number, filename in enumerate(["a.txt", "b.txt", "c.txt"]):
+        paragraphs = [f"File {filename}: {paragraph}" for paragraph in PARAGRAPHS[number:]]
+        (content_folder / filename).write_text("\n\n".join(paragraphs) + "\n", encoding="utf-8")
+
+
+def get_chunks(vecdb_folder: str):
+    '''the texts and metadata of all chunks in the vector store, sorted'''
+    vector_store = VectorStoreCreator("chromadb").get_vectorstore(DeterministicFakeEmbedding(size=32), "ingest_test",
+                                                                  vecdb_folder)
+    collection = vector_store.get()
+    return sorted((text, json.dumps(metadata, sort_keys=True))
+                  for text, metadata in zip(collection["documents"], collection["metadatas"]))
+
+
+class IngesterTest(unittest.TestCase):
+    '''test ingest runs on a small folder of text files'''
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.content_folder = Path(self.folder.name) / "ingest_test"
+        write_content_folder(self.content_folder)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def get_ingester(self, vecdb_name: str, **kwargs) -> Ingester:
+        kwargs = {"num_workers": 1, "batch_size": 2, "streaming": False, **kwargs}
+        return Ingester("ingest_test", str(self.content_folder), str(Path(self.folder.name) / vecdb_name),
+                        retriever_type="vectorstore", vecdb_type="chromadb",
+                        text_splitter_method="RecursiveCharacterTextSplitter", chunk_size=80, chunk_overlap=0,
+                        embeddings=DeterministicFakeEmbedding(size=32), parse_cache=False, dedup_chunks=False,
+                        **kwargs)
+
+    def test_parallel(self):
+        '''ingesting with worker processes gives the same chunk texts and metadata as ingesting serially'''
+        serial_ingester = self.get_ingester("serial")
+        serial_ingester.ingest()
+        parallel_ingester = self.get_ingester("parallel", num_workers=2)
+        parallel_ingester.ingest()
+        self.assertGreater(len(get_chunks(serial_ingester.vecdb_folder)), 3)
+        self.assertEqual(get_chunks(parallel_ingester.vecdb_folder), get_chunks(serial_ingester.vecdb_folder))
+
+    def test_streaming(self):
+        '''streaming ingest gives the same chunk texts and metadata as ingesting whole files, also for a PDF file'''
+        write_pdf(str(self.content_folder / "airport.pdf"))
+        ingester = self.get_ingester("whole_files")
+        ingester.ingest()
+        streaming_ingester = self.get_ingester("streaming", streaming=True)
+        streaming_ingester.ingest()
+        self.assertEqual(get_chunks(streaming_ingester.vecdb_folder), get_chunks(ingester.vecdb_folder))
+
+    def test_resume(self):
+        '''a file that was partly written by an interrupted run is rolled back and ingested again'''
+        reference_ingester = self.get_ingester("reference")
+        reference_ingester.ingest()
+        ingester = self.get_ingester("interrupted")
+        original_flush = DocumentWriter.flush
+        num_flushes = []
+
+        def failing_flush(writer):
+            num_flushes.append(1)
+            if len(num_flushes) == 2:
+                raise RuntimeError("interrupted")
+            original_flush(writer)
+
+        with mock.patch.object(DocumentWriter, "flush", failing_flush):
+            self.assertRaises(RuntimeError, ingester.ingest)
+        # the first batch contains part of the chunks of the first file, which is not committed
+        catalog = DocumentCatalog(ingester.vecdb_folder)
+        self.assertEqual(catalog.get_files(), [])
+        uncommitted_files = catalog.get_uncommitted_files()
+        self.assertEqual(len(uncommitted_files), 3)
+        partly_written_files = [file for file in uncommitted_files if len(catalog.get_chunk_ids([file])) > 0]
+        self.assertEqual(len(partly_written_files), 1)
+        self.assertEqual(len(catalog.get_chunk_ids(partly_written_files)), 2)
+        self.assertEqual(len(get_chunks(ingester.vecdb_folder)), 2)
+        self.assertGreater(len([chunk for chunk in get_chunks(reference_ingester.vecdb_folder)
+                                if f'"filename": "{partly_written_files[0]}"' in chunk[1]]), 2)
+        catalog.connection.close()
+
+        statistics = self.get_ingester("interrupted").ingest()
+        self.assertEqual(statistics["files_rolled_back"], len(uncommitted_files))
+        self.assertEqual(statistics["files_added"], 3)
+        self.assertEqual(get_chunks(ingester.vecdb_folder), get_chunks(reference_ingester.vecdb_folder))
+        statistics = self.get_ingester("interrupted").ingest()
+        self.assertEqual(statistics, {"files_added": 0, "files_modified": 0, "files_deleted": 0,
+                                      "files_rolled_back": 0, "chunks_written": 0})
+
+    def test_modified_during_ingest(self):
+        '''each file is hashed once, a file that is modified after it was read is ingested again in the next run'''
+        ingester = self.get_ingester("modified")
+        original_file_to_docs = Ingester.file_to_docs
+        file_path = self.content_folder / "b.txt"
+
+        def file_to_docs_then_modify(ingester, file_parser, path, file_hash=None):
+            documents = original_file_to_docs(ingester, file_parser, path, file_hash)
+            if path == str(file_path):
+                file_path.write_text(file_path.read_text(encoding="utf-8") + "\nExtra paragraph about zebras.\n",
+                                     encoding="utf-8")
+                os.utime(file_path, (file_path.stat().st_atime, file_path.stat().st_mtime + 10))
+            return documents
+
+        with mock.patch.object(Ingester, "file_to_docs", file_to_docs_then_modify), \
+                mock.patch.object(ut, "get_file_hash", wraps=ut.get_file_hash) as get_file_hash:
+            ingester.ingest()
+        self.assertEqual(get_file_hash.call_count, 3)
+        self.assertFalse(any("zebras" in text for text, _ in get_chunks(ingester.vecdb_folder)))
+        statistics = self.get_ingester("modified").ingest()
+        self.assertEqual(statistics["files_modified"], 1)
+        self.assertTrue(any("zebras" in text for text, _ in get_chunks(ingester.vecdb_folder)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+'''Unit testing for the memory-mapped NumPy vector store'''
+
+# global imports
+import unittest
+import sys
+import tempfile
+from pathlib import Path
+from langchain_community.embeddings import DeterministicFakeEmbedding
+
+# local imports
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from ingest.numpy_vectorstore import NumpyVectorStore
+
+
+class NumpyVectorStoreTest(unittest.TestCase):
+    '''test search, filters and deletion against a second store object on the same folder'''
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.embeddings = DeterministicFakeEmbedding(size=16)
+        self.writer = NumpyVectorStore("test", self.embeddings, self.folder.name)
+        self.reader = NumpyVectorStore("test", self.embeddings, self.folder.name)
+        texts = [f"chunk {i}" for i in range(10)]
+        metadatas = [{"filename": f"file_{i % 3}.pdf", "page_number": i} for i in range(10)]
+        self.writer.add_texts(texts, metadatas, ids=[str(i) for i in range(10)])
+
+    def tearDown(self):
+        self.writer.connection.close()
+        self.reader.connection.close()
+        self.folder.cleanup()
+
+    def test_search(self):
+        '''the exact match is found first, with cosine distance 0, and filters restrict the results'''
+        document, distance = self.reader.similarity_search_with_score("chunk 4", k=3)[0]
+        self.assertEqual(document.page_content, "chunk 4")
+        self.assertAlmostEqual(distance, 0.0, places=5)
+        documents = self.reader.similarity_search("chunk 4", k=10, filter={"filename": {"$in": ["file_0.pdf"]}})
+        self.assertEqual(sorted(document.metadata["page_number"] for document in documents), [0, 3, 6, 9])
+        documents = self.reader.similarity_search("chunk 4", k=10, filter={"$and": [{"filename": "file_1.pdf"},
+                                                                                    {"page_number": {"$gt": 1}}]})
+        self.assertEqual(sorted(document.metadata["page_number"] for document in documents), [4, 7])
+
+    def test_delete(self):
+        '''deleted chunks are not returned, also after the matrix is compacted'''
+        self.writer.delete(["0", "1", "2"])
+        self.assertEqual(len(self.reader.get(include=[])["ids"]), 7)
+        self.writer.delete(["3", "4", "5"])
+        self.assertEqual(self.reader.get(where={"filename": "file_0.pdf"})["documents"], ["chunk 6", "chunk 9"])
+        self.assertEqual(self.reader.generation, 1)
+        self.assertEqual(self.reader.similarity_search("chunk 7", k=1)[0].page_content, "chunk 7")
+
+    def test_quantization(self):
+        '''with enough candidates, the re-scored quantized search returns the exact results and scores'''
+        exact = self.reader.similarity_search_with_score("chunk 4", k=3)
+        for quantization in ["int8", "binary"]:
+            quantized_store = NumpyVectorStore("test", self.embeddings, self.folder.name, quantization=quantization,
+                                               rescore_factor=4)
+            self.assertEqual(quantized_store.similarity_search_with_score("chunk 4", k=3), exact)
+            quantized_store.connection.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
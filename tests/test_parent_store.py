@@ -0,0 +1,104 @@
+'''Unit testing for the parent store and the parent retriever'''
+
+# global imports
+import unittest
+import sys
+import tempfile
+from pathlib import Path
+from langchain_community.embeddings import DeterministicFakeEmbedding
+
+# local imports
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from ingest.ingester import Ingester
+from ingest.parent_store import ParentStore
+from ingest.vectorstore_creator import VectorStoreCreator
+from query.retrieve_parent_chunks import ParentDocumentRetriever
+
+
+class ParentStoreTest(unittest.TestCase):
+    '''test storing, looking up and removing parent chunks'''
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.store = ParentStore(self.folder.name)
+        self.store.add_parents(["a.pdf_p0_c0", "a.pdf_p0_c1", "b.pdf_p3_c0"], ["a.pdf", "a.pdf", "b.pdf"],
+                               ["first parent of a", "second parent of a", "parent of b"],
+                               [[1.0, 0.5], [0.25, 2.0], None])
+
+    def tearDown(self):
+        self.store.connection.close()
+        self.folder.cleanup()
+
+    def test_lookup(self):
+        '''texts and float32 vectors are returned for known ids, unknown ids and missing vectors are left out'''
+        self.assertEqual(self.store.get_texts(["b.pdf_p3_c0", "a.pdf_p0_c0", "c.pdf_p0_c0"]),
+                         {"a.pdf_p0_c0": "first parent of a", "b.pdf_p3_c0": "parent of b"})
+        vectors = self.store.get_vectors(["a.pdf_p0_c1", "b.pdf_p3_c0"])
+        self.assertEqual(list(vectors.keys()), ["a.pdf_p0_c1"])
+        self.assertEqual(vectors["a.pdf_p0_c1"].dtype.name, "float32")
+        self.assertEqual(vectors["a.pdf_p0_c1"].tolist(), [0.25, 2.0])
+
+    def test_remove_files(self):
+        '''only the parent chunks of the removed files are removed, also for a second store object'''
+        self.store.remove_files(["a.pdf"])
+        other_store = ParentStore(self.folder.name)
+        self.assertEqual(other_store.get_texts(["a.pdf_p0_c0", "a.pdf_p0_c1", "b.pdf_p3_c0"]),
+                         {"b.pdf_p3_c0": "parent of b"})
+        other_store.connection.close()
+
+
+class ParentRetrieverTest(unittest.TestCase):
+    '''test that the parent retriever returns the parent chunks of the retrieved child chunks'''
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.content_folder = Path(self.folder.name) / "parent_test"
+        self.content_folder.mkdir()
+        for filename, subject in [("a.txt", "air traffic"), ("b.txt", "housing")]:
+            paragraphs = [f"The {subject} paragraph {number} starts here. The {subject} paragraph {number} ends here."
+                          for number in range(3)]
+            (self.content_folder / filename).write_text("\n\n".join(paragraphs) + "\n", encoding="utf-8")
+        self.vecdb_folder = str(Path(self.folder.name) / "vecdb")
+        self.embeddings = DeterministicFakeEmbedding(size=32)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def ingest(self):
+        Ingester("parent_test", str(self.content_folder), self.vecdb_folder, retriever_type="parent",
+                 vecdb_type="chromadb", text_splitter_method="RecursiveCharacterTextSplitter",
+                 text_splitter_method_child="RecursiveCharacterTextSplitter", chunk_size=100, chunk_overlap=0,
+                 chunk_size_child=40, chunk_overlap_child=0, num_workers=1, embeddings=self.embeddings,
+                 parse_cache=False, dedup_chunks=False).ingest()
+
+    def test_retrieve_and_remove(self):
+        '''children refer to their parent by filename, page and chunk number, parents are removed with their file'''
+        self.ingest()
+        vector_store = VectorStoreCreator("chromadb").get_vectorstore(self.embeddings, "parent_test",
+                                                                      self.vecdb_folder)
+        collection = vector_store.get()
+        parent_ids = {metadata["parent_chunk_id"] for metadata in collection["metadatas"]}
+        self.assertEqual(parent_ids, {f"{filename}_p1_c{number}" for filename in ["a.txt", "b.txt"]
+                                      for number in range(3)})
+        self.assertTrue(all("parent_chunk" not in metadata for metadata in collection["metadatas"]))
+        self.assertGreater(len(collection["ids"]), len(parent_ids))
+
+        parent_store = ParentStore(self.vecdb_folder)
+        retriever = ParentDocumentRetriever(vectorstore=vector_store, parent_store=parent_store,
+                                            search_type="similarity", search_kwargs={"k": 1})
+        for child_text, child_metadata in zip(collection["documents"], collection["metadatas"]):
+            parent_docs = retriever.invoke(child_text)
+            self.assertEqual(len(parent_docs), 1)
+            self.assertIn(child_text, parent_docs[0].page_content)
+            self.assertEqual(parent_docs[0].metadata["parent_chunk_id"], child_metadata["parent_chunk_id"])
+
+        (self.content_folder / "a.txt").unlink()
+        self.ingest()
+        self.assertEqual(set(parent_store.get_texts(sorted(parent_ids))),
+                         {f"b.txt_p1_c{number}" for number in range(3)})
+        self.assertEqual(len(parent_store.get_vectors(sorted(parent_ids))), 3)
+        parent_store.connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+'''Unit testing for the persistent cache of parsed and cleaned files'''
+
+# global imports
+import unittest
+import sys
+import itertools
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+# local imports
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from ingest.parse_cache import ParseCache
+
+
+class ParseCacheTest(unittest.TestCase):
+    '''test cache hits, the cache key and least recently used eviction'''
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.cache = ParseCache(str(Path(self.folder.name) / "parse_cache.sqlite"), max_size_mb=1)
+        # distinct last used times, also for calls within the clock resolution
+        mock.patch("ingest.parse_cache.time").start().time.side_effect = itertools.count()
+
+    def tearDown(self):
+        mock.patch.stopall()
+        self.cache.connection.close()
+        self.folder.cleanup()
+
+    def write_file(self, filename, contents):
+        file_path = Path(self.folder.name) / filename
+        file_path.write_text(contents, encoding="utf-8")
+        return str(file_path)
+
+    def put(self, filename, contents):
+        file_path = self.write_file(filename, contents)
+        self.cache.put(file_path, [(1, f"text of {contents}")], {"filename": filename, "Language": "en"})
+        return file_path
+
+    def test_identical_files(self):
+        '''files with identical contents share an entry, with the filename of the requested file'''
+        self.put("a.txt", "report")
+        pages, metadata = self.cache.get(self.write_file("b.txt", "report"))
+        self.assertEqual(pages, [(1, "text of report")])
+        self.assertEqual(metadata, {"filename": "b.txt", "Language": "en"})
+        self.assertIsNone(self.cache.get(self.write_file("c.txt", "other report")))
+
+    def test_parser_version(self):
+        '''texts parsed by another parser version are not used'''
+        file_path = self.put("a.txt", "report")
+        with mock.patch("ingest.parse_cache.PARSER_VERSION", "test"):
+            self.assertIsNone(self.cache.get(file_path))
+        self.assertIsNotNone(self.cache.get(file_path))
+
+    def test_eviction(self):
+        '''when the cache is full, the least recently used entries are removed first'''
+        file_paths = [self.put(f"{name}.txt", name) for name in ["one", "two", "six"]]
+        size = self.cache.connection.execute("SELECT SUM(LENGTH(pages)) FROM parsed_files").fetchone()[0]
+        self.cache.max_size_bytes = size
+        self.cache.get(file_paths[0])
+        file_paths.append(self.put("ten.txt", "ten"))
+        self.assertIsNotNone(self.cache.get(file_paths[0]))
+        self.assertIsNone(self.cache.get(file_paths[1]))
+        self.assertIsNotNone(self.cache.get(file_paths[3]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+'''Unit testing for the in-memory caches of question embeddings, retrieval results and answers'''
+
+# global imports
+import unittest
+import sys
+from pathlib import Path
+from unittest import mock
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_core.documents import Document
+
+# local imports
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import settings
+from query.query_cache import LRUCache, QueryEmbeddingsCache, SemanticAnswerCache
+from query.query_engine import Conversation, QueryEngine
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    '''fake embeddings that count the query embedding calls'''
+    calls: int = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return super().embed_query(text)
+
+
+class StubChain:
+    '''chain that answers every question with the same source document and counts its calls'''
+
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, inputs):
+        self.calls += 1
+        return {"question": inputs["question"],
+                "chat_history": inputs["chat_history"],
+                "answer": f"answer {self.calls}",
+                "source_documents": [Document(page_content="text", metadata={"filename": "a.pdf"})]}
+
+
+class QueryCacheTest(unittest.TestCase):
+    '''test LRU eviction and the reuse of question embeddings'''
+
+    def test_lru_eviction(self):
+        '''the least recently used entry is removed first'''
+        cache = LRUCache(max_size=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    def test_query_embeddings(self):
+        '''questions that only differ in whitespace are embedded once'''
+        counting_embeddings = CountingEmbeddings(size=8)
+        embeddings = QueryEmbeddingsCache(counting_embeddings, "fake", "fake", max_size=16)
+        vector = embeddings.embed_query("What is  her education? ")
+        self.assertEqual(embeddings.embed_query("What is her education?"), vector)
+        self.assertEqual(counting_embeddings.calls, 1)
+
+    def test_semantic_answers(self):
+        '''near-duplicate questions of the same key and generation get the stored answer'''
+        cache = SemanticAnswerCache(max_distance=0.05, max_size=10)
+        cache.store("key", 1, [1.0, 0.0], "yes", [], seconds=2.0)
+        self.assertEqual(cache.lookup("key", 1, [0.99, 0.05]), ("yes", []))
+        self.assertIsNone(cache.lookup("key", 1, [0.7, 0.7]))
+        self.assertIsNone(cache.lookup("other key", 1, [1.0, 0.0]))
+        self.assertIsNone(cache.lookup("key", 2, [1.0, 0.0]))
+        metrics = cache.get_metrics()
+        self.assertEqual((metrics["lookups"], metrics["hits"], metrics["hit_rate"]), (4, 1, 0.25))
+        self.assertGreater(metrics["seconds_saved"], 1.9)
+
+    def test_semantic_answer_keys(self):
+        '''the answers of the least recently used cache key are removed when there are more than max_keys keys'''
+        cache = SemanticAnswerCache(max_distance=0.05, max_size=10, max_keys=2)
+        for key in ["a", "b"]:
+            cache.store(key, 1, [1.0, 0.0], f"answer {key}", [], seconds=1.0)
+        self.assertEqual(cache.lookup("a", 1, [1.0, 0.0]), ("answer a", []))
+        cache.store("c", 1, [1.0, 0.0], "answer c", [], seconds=1.0)
+        self.assertEqual(len(cache.entries.entries), 2)
+        self.assertIsNone(cache.lookup("b", 1, [1.0, 0.0]))
+        self.assertEqual(cache.lookup("a", 1, [1.0, 0.0]), ("answer a", []))
+        self.assertEqual(cache.lookup("c", 1, [1.0, 0.0]), ("answer c", []))
+
+    def test_semantic_answer_copies(self):
+        '''changes to the stored or returned source documents do not change the cache'''
+        cache = SemanticAnswerCache(max_distance=0.05, max_size=10)
+        source_documents = [Document(page_content="text", metadata={"filename": "a.pdf"})]
+        cache.store("key", 1, [1.0, 0.0], "yes", source_documents, seconds=1.0)
+        source_documents[0].metadata["filename"] = "b.pdf"
+        _, cached_documents = cache.lookup("key", 1, [1.0, 0.0])
+        cached_documents[0].metadata["filename"] = "c.pdf"
+        self.assertEqual(cache.lookup("key", 1, [1.0, 0.0])[1][0].metadata["filename"], "a.pdf")
+
+    @mock.patch.object(settings, "SEMANTIC_CACHE", True)
+    def test_semantic_answer_sessions(self):
+        '''a cached answer carries the question and chat history of the asking conversation, not of the storing one'''
+        engine = QueryEngine.__new__(QueryEngine)
+        engine.embeddings = DeterministicFakeEmbedding(size=8)
+        chain = StubChain()
+        first, second = Conversation(engine), Conversation(engine)
+        for conversation in (first, second):
+            conversation.chain = chain
+            conversation.chain_key = ("test_semantic_answer_sessions",)
+        first.ask_question("What is her education?")
+        first.ask_question("And his?")
+        response = second.ask_question("What is her education?")
+        self.assertEqual(chain.calls, 2)
+        self.assertEqual(response["answer"], "answer 1")
+        self.assertIs(response["chat_history"], second.chat_history)
+        self.assertEqual(len(second.chat_history), 2)
+        self.assertEqual(len(first.chat_history), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
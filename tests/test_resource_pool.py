@@ -0,0 +1,37 @@
+'''Unit testing for the process-wide pool of LLM and embeddings objects'''
+
+# global imports
+import unittest
+import sys
+import time
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# local imports
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from query import resource_pool
+
+
+class ResourcePoolTest(unittest.TestCase):
+    '''test that pooled objects are created once and shared by all threads'''
+
+    def test_created_once(self):
+        '''concurrent requests for the same key wait for a single creation, other keys get their own object'''
+        created = []
+
+        def create():
+            time.sleep(0.05)
+            created.append(object())
+            return created[-1]
+
+        key = ("test", "provider", "model")
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            resources = list(executor.map(lambda _: resource_pool._get_resource(key, create), range(8)))
+        self.assertEqual(len(created), 1)
+        self.assertTrue(all(resource is created[0] for resource in resources))
+        other = resource_pool._get_resource(("test", "provider", "other model"), create)
+        self.assertIsNot(other, created[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
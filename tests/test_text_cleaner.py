@@ -0,0 +1,42 @@
+'''Unit testing for the combined text cleaning function'''
+
+# global imports
+import unittest
+import sys
+import random
+from pathlib import Path
+
+# local imports
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from ingest import text_cleaner
+
+
+def clean_separately(text: str) -> str:
+    '''reference: the three cleaning functions applied one after another'''
+    text = text_cleaner.merge_hyphenated_words(text)
+    text = text_cleaner.fix_newlines(text)
+
+    return text_cleaner.remove_multiple_newlines(text)
+
+
+class TextCleanerTest(unittest.TestCase):
+    '''test that clean_text gives the same result as the separate cleaning functions'''
+
+    def test_examples(self):
+        '''typical page texts'''
+        self.assertEqual(text_cleaner.clean_text("hyphen-\nated word\nnext line\n\n\nnew paragraph"),
+                         "hyphenated word next line\nnew paragraph")
+        self.assertEqual(text_cleaner.clean_text("a-\nb-\nc"), "ab- c")
+        self.assertEqual(text_cleaner.clean_text("no newlines"), "no newlines")
+
+    def test_random_texts(self):
+        '''random texts with hyphens, newlines, unicode and the internal placeholder character'''
+        alphabet = ["a", "é", "ß", "1", "_", "-", "\n", "\n", "\n", " ", ".", "\r", "\x00", "²"]
+        random_generator = random.Random(42)
+        for _ in range(20000):
+            text = "".join(random_generator.choice(alphabet) for _ in range(random_generator.randint(0, 20)))
+            self.assertEqual(text_cleaner.clean_text(text), clean_separately(text), repr(text))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,11 +4,14 @@ The utils module contains general functionality that can be used at various plac
 from typing import Any, Dict, List, Tuple
 import os
 import sys
+import sqlite3
+import hashlib
 import datetime as dt
 import pathlib
 import numpy as np
 from loguru import logger
 from langdetect import detect, LangDetectException
+from langdetect.detector_factory import init_factory
 # local imports
 import settings
 
@@ -32,6 +35,9 @@ LANGUAGE_MAP = {
     'tr': 'turkish'
 }  # languages supported by nltk
 
+# name of the file in a vector store folder that holds the number of ingest runs that changed the vector store
+INGEST_GENERATION_FILE = "ingest_generation.txt"
+
 
 def create_vectordb_folder() -> None:
     """ Creates subfolder for storage of vector databases if not existing
@@ -146,6 +152,113 @@ def get_relevant_files_in_folder(content_folder_path: str) -> List[str]:
     return [f for f in os.listdir(content_folder_path) if is_relevant_file(content_folder_path, f)]
 
 
+def get_file_hash(file_path: str, block_size: int = 1 << 20) -> str:
+    """ Determines the sha256 hash of the content of a file, reading the file in blocks
+
+    Parameters
+    ----------
+    file_path : str
+        path of the file
+    block_size : int, optional
+        number of bytes read at once, by default 1 MB
+
+    Returns
+    -------
+    str
+        hexadecimal sha256 hash of the file content
+    """
+    file_hash = hashlib.sha256()
+    with open(file=file_path, mode="rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            file_hash.update(block)
+
+    return file_hash.hexdigest()
+
+
+def get_ingest_generation(vecdb_folder: str) -> int:
+    """ Returns the ingest generation of a vector store, the number of ingest runs that changed its contents
+    Objects derived from the vector store contents, like query chains, are valid as long as the generation is equal
+
+    Parameters
+    ----------
+    vecdb_folder : str
+        folder of the vector store
+
+    Returns
+    -------
+    int
+        the ingest generation, 0 if the vector store was never changed by an ingest run that recorded it
+    """
+    try:
+        with open(file=os.path.join(vecdb_folder, INGEST_GENERATION_FILE), mode="r", encoding="utf-8") as file:
+            return int(file.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def bump_ingest_generation(vecdb_folder: str) -> int:
+    """ Increments the ingest generation of a vector store, to be called after its contents were changed
+    The file is replaced atomically, so readers in other processes never see a partially written generation
+
+    Parameters
+    ----------
+    vecdb_folder : str
+        folder of the vector store
+
+    Returns
+    -------
+    int
+        the new ingest generation
+    """
+    generation = get_ingest_generation(vecdb_folder) + 1
+    generation_path = os.path.join(vecdb_folder, INGEST_GENERATION_FILE)
+    temporary_path = f"{generation_path}.{os.getpid()}.tmp"
+    with open(file=temporary_path, mode="w", encoding="utf-8") as file:
+        file.write(str(generation))
+    os.replace(temporary_path, generation_path)
+
+    return generation
+
+
+def evict_least_recently_used(connection: sqlite3.Connection, table: str, size_column: str,
+                              max_size_bytes: int) -> int:
+    """ Removes the least recently used rows of a cache table until the cache is at most 90% of its maximum size,
+    if it exceeds its maximum size. The table must have a column last_used, the size of a row is the length of
+    size_column
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        connection to the cache database
+    table : str
+        name of the cache table
+    size_column : str
+        name of the column with the cached data
+    max_size_bytes : int
+        maximum total size of the cached data
+
+    Returns
+    -------
+    int
+        the number of removed rows
+    """
+    cache_size = connection.execute(f"SELECT COALESCE(SUM(LENGTH({size_column})), 0) FROM {table}").fetchone()[0]
+    if cache_size <= max_size_bytes:
+        return 0
+    target_size = int(max_size_bytes * 0.9)
+    rows = connection.execute(f"SELECT rowid, LENGTH({size_column}) FROM {table} ORDER BY last_used").fetchall()
+    rowids_to_delete = []
+    for rowid, row_size in rows:
+        if cache_size <= target_size:
+            break
+        rowids_to_delete.append((rowid,))
+        cache_size -= row_size
+    connection.executemany(f"DELETE FROM {table} WHERE rowid = ?", rowids_to_delete)
+    connection.commit()
+
+    return len(rowids_to_delete)
+
+
 def exit_program() -> None:
     """ Exits the Python process
     """
@@ -288,6 +401,29 @@ def detect_language(text: str, number_of_characters: int = 1000) -> str:
             return 'unknown'
 
 
+def warm_up(languages: List[str] = None) -> None:
+    """
+    Loads the language profiles of langdetect and, if the NLTKTextSplitter is used, the NLTK sentence tokenizers of
+    the given languages, so that these are not loaded on first use while ingesting or querying.
+    Call once at start-up of a process. Worker processes that are forked afterwards inherit the loaded models
+
+    Parameters
+    ----------
+    languages : List[str], optional
+        names of the languages of the NLTK sentence tokenizers to load, by default ["english"]
+    """
+    # langdetect loads its language profiles on the first call of detect
+    init_factory()
+    if "NLTKTextSplitter" in (settings.TEXT_SPLITTER_METHOD, settings.TEXT_SPLITTER_METHOD_CHILD):
+        from nltk.tokenize import sent_tokenize
+        for language in ["english"] if languages is None else languages:
+            try:
+                sent_tokenize("Warm up.", language=language)
+            except LookupError:
+                logger.warning(f"NLTK sentence tokenizer for {language} is not available")
+    logger.info("Warmed up language detection and sentence tokenizers")
+
+
 def get_relevant_models(private: bool) -> Tuple[str, str, str, str]:
     if private:
         return settings.PRIVATE_LLM_PROVIDER, settings.PRIVATE_LLM_MODEL, \